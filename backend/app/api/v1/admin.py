@@ -3,6 +3,7 @@ from app.database import engine
 from app.models.conversation import Base
 from app.models.tag import Tag
 from app.models.import_batch import ImportBatch
+from app.services.conversation_search import ensure_fts_index
 from sqlalchemy import text
 import os
 
@@ -15,6 +16,10 @@ async def init_database():
         # 创建所有表
         Base.metadata.create_all(bind=engine)
 
+        # 全文检索索引（FTS5虚拟表 + 同步触发器）
+        with engine.begin() as conn:
+            ensure_fts_index(conn)
+
         # 验证表是否创建成功
         with engine.connect() as conn:
             result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))
@@ -1,11 +1,12 @@
 """
 导入批次管理API
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
-from app.models import ImportBatch, Conversation
+from app.models import AIPreanalysis, ImportBatch, Conversation
+from app.services.rag.index_sync import remove_conversations_from_index
 
 router = APIRouter()
 
@@ -101,6 +102,7 @@ async def get_batch_detail(
 @router.delete("/batches/{batch_id}")
 async def delete_batch(
     batch_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -117,7 +119,19 @@ async def delete_batch(
         if not batch:
             raise HTTPException(status_code=404, detail="批次不存在")
 
-        # 删除该批次的所有对话
+        # 记录待删除的对话ID，用于同步向量索引
+        conversation_ids = [
+            row.id for row in db.query(Conversation.id).filter(
+                Conversation.batch_id == batch_id
+            ).all()
+        ]
+
+        # 删除该批次的所有对话（批量删除不经过ORM级联，先删除预分析结果）
+        db.query(AIPreanalysis).filter(
+            AIPreanalysis.conv_id.in_(
+                db.query(Conversation.id).filter(Conversation.batch_id == batch_id)
+            )
+        ).delete(synchronize_session=False)
         deleted_count = db.query(Conversation).filter(
             Conversation.batch_id == batch_id
         ).delete()
@@ -126,6 +140,8 @@ async def delete_batch(
         db.delete(batch)
         db.commit()
 
+        background_tasks.add_task(remove_conversations_from_index, conversation_ids)
+
         return {
             "success": True,
             "message": f"已删除批次 #{batch_id} 及其 {deleted_count} 条对话"
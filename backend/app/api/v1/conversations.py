@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional
 import json
 
 from app.database import get_db
-from app.models import Conversation
+from app.models import AIPreanalysis, Conversation
+from app.services.conversation_search import fts_index_exists, search_conversations
+from app.services.rag.index_sync import (
+    sync_conversation_index,
+    remove_conversations_from_index,
+    clear_index
+)
 from app.schemas.conversation import (
     ConversationResponse,
     ConversationListResponse,
+    ConversationSearchResponse,
     ConversationUpdate
 )
 
@@ -83,6 +90,43 @@ async def get_conversations(
     )
 
 
+@router.get("/conversations/search", response_model=ConversationSearchResponse)
+async def search_conversations_fulltext(
+    q: str = Query(..., min_length=1, max_length=200, description="关键词，空格分隔表示同时包含"),
+    status: Optional[str] = Query(None, description="状态过滤"),
+    batch_id: Optional[int] = Query(None, description="批次ID过滤"),
+    limit: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    db: Session = Depends(get_db)
+):
+    """
+    全文检索对话原文
+
+    - **q**: 关键词（3个字符以上走全文索引，更短的关键词按包含匹配）
+    - **status**: 状态过滤 (pending/approved/skipped)
+    - **batch_id**: 批次ID过滤
+    - **limit**: 每页数量，1-100
+    - **cursor**: 分页游标（结果按相关度排序）
+    """
+    if not fts_index_exists(db):
+        raise HTTPException(
+            status_code=503,
+            detail="全文索引未创建，请先运行 scripts/migrate_add_fts.py"
+        )
+
+    try:
+        return search_conversations(
+            db,
+            query=q,
+            status=status,
+            batch_id=batch_id,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
@@ -103,6 +147,7 @@ async def get_conversation(
 async def update_conversation(
     conversation_id: int,
     conversation_update: ConversationUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -140,12 +185,17 @@ async def update_conversation(
     db.commit()
     db.refresh(conversation)
 
+    # 审核状态或人工标签变化时，增量同步向量索引
+    if conversation_update.manual_tag is not None or conversation_update.status is not None:
+        background_tasks.add_task(sync_conversation_index, conversation_id)
+
     return conversation
 
 
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -163,6 +213,8 @@ async def delete_conversation(
     db.delete(conversation)
     db.commit()
 
+    background_tasks.add_task(remove_conversations_from_index, [conversation_id])
+
     return {
         "success": True,
         "message": f"对话 #{conversation_id} 已删除"
@@ -171,6 +223,7 @@ async def delete_conversation(
 
 @router.delete("/conversations")
 async def delete_all_conversations(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -182,10 +235,13 @@ async def delete_all_conversations(
         # 获取当前总数
         total = db.query(Conversation).count()
 
-        # 删除所有
+        # 删除所有（批量删除不经过ORM级联，先删除预分析结果）
+        db.query(AIPreanalysis).delete()
         db.query(Conversation).delete()
         db.commit()
 
+        background_tasks.add_task(clear_index)
+
         return {
             "success": True,
             "message": f"已清空 {total} 条对话"
@@ -201,6 +257,7 @@ async def delete_all_conversations(
 @router.post("/conversations/batch-delete")
 async def delete_conversations_batch(
     ids: list[int],
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -225,6 +282,11 @@ async def delete_conversations_batch(
 
         db.commit()
 
+        background_tasks.add_task(
+            remove_conversations_from_index,
+            [conv.id for conv in conversations]
+        )
+
         return {
             "success": True,
             "message": f"已删除 {deleted_count} 条对话"
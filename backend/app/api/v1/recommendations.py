@@ -2,117 +2,56 @@
 RAG推荐API路由
 """
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
-import os
-import httpx
+from app.config import settings
+from app.services.ai_analysis import get_preanalysis, load_conversation_for_analysis, run_ai_analysis
+from app.services.preanalysis_jobs import get_preanalysis_manager
+from app.services.tag_rules import extract_rule_tags
+from app.services.llm_cache import get_llm_response_cache
 from app.services.rag.rag_service import get_rag_recommender
+from app.services.rag.index_sync import reconcile_index, rollback_index
+from app.services.rag.index_jobs import get_index_build_manager
+from app.services.rag.warmup import get_warming_up_response
 from app.database import SessionLocal
-from app.models import Conversation
+from app.models import Conversation, ImportBatch
 
 router = APIRouter()
 
-# 完整的标准化标签定义（包含详细说明）
-TAG_DEFINITIONS = {
-    # 路线相关
-    "不走高速": "路线可经过高速，但货主要求不走高速，司机同意不走",
-    "无高速费": "货主不出高速费，司机同意，但走高速",
-    "部分过路/桥/船/高速费": "货主承担部分过路/桥/船/高速费，司机同意",
-    "过路/桥/船/高速费": "货主承担全部过路/桥/船/高速费",
-
-    # 车辆尺寸
-    "车厢长X米": "司机描述自己的车厢长度（如：车厢长4.2米、6.8米等）",
-    "车宽X米": "司机描述自己的车厢宽度（如：车宽2米、2.3米等）",
-    "车高X米": "司机描述自己的车厢高度（如：车高2.2米、2.5米等）",
-    "车容量X方": "司机描述自己的车可以装多少方。拼车场景下剩余空间不算",
-    "车载重X吨": "司机描述自己的车可以装多少吨",
-
-    # 车型分类
-    "面包车": "优先标注明确的车型，如无表述，再标注非XX。如：司机表达自己不是平板，是厢货，应该打标为厢货；司机表达自己不是平板，没有说具体是什么车型，应该打标为非平板",
-    "高栏": "高栏车型",
-    "厢货": "厢式货车",
-    "平板": "平板车型",
-    "依维柯": "依维柯车型",
-    "飞翼车": "飞翼车型（侧门像翅膀一样打开）",
-    "非平板": "司机明确表示不是平板车",
-    "非面包车": "司机明确表示不是面包车",
-    "非高栏": "司机明确表示不是高栏车",
-    "非厢货": "司机明确表示不是厢货车",
-
-    # 尾板相关
-    "尾板车": "车辆装有尾板",
-    "尾板费": "有尾板，且司货双方同意了尾板费",
-    "无尾板": "车辆没有尾板",
-
-    # 装卸相关
-    "装卸费": "需要司机装卸，且司机表示需要装卸费用",
-    "搬运装卸": "需要司机自己装卸（司机要了搬运费，但货主拒绝，司机认可不给也行）",
-    "搭把手": "有人装卸，司机需要帮忙，且无搬运费用，提到费用的归到装卸费",
-    "不搬运": "司机明确拒绝不帮忙搬运",
-
-    # 跟车要求
-    "跟车X人": "不能跟车、跟车1人、跟车2人及以上；按照司机描述可跟车的人数打标",
-
-    # 拼车
-    "拼车单": "司机自行拼车或者可接受拼车",
-
-    # 装卸要求
-    "X装X卸": "货源为X装X卸，司机接受，费用未谈拢也算",
-
-    # 侧门类型
-    "侧门单开": "至少有一侧可以开一扇门",
-    "侧门双开": "至少有一侧可以开两扇门",
-    "侧门全开": "侧边门可以全部打开",
-    "侧边栏，侧门全开": "侧边门可以全部打开，但是顶上有栏杆，无法拆卸",
-    "双边侧门全开": "两边的侧门都可以全开",
-    "非侧开门": "侧边门不能打开，或者司机不愿意打开也算",
-
-    # 时间要求
-    "明日卸": "明天卸货",
-    "明日装卸": "明天装卸货",
-    "固定/上班时间装卸": "在工作时间（8:00-18:00）装卸",
-    "夜间运输": "在夜间（18:00-次日8:00）运输或装卸",
-
-    # 车辆动力
-    "新能源": "电车也属于新能源",
-    "油车": "燃油车",
-
-    # 车门类型
-    "双开门": "区别于侧门双开，指尾部双开门",
-    "非双开门": "尾部不是双开门",
-
-    # 座位相关
-    "无座车": "货运版，本身没有座位；或者客运版，座位都拆了，折叠的不算",
-
-    # 辅助工具
-    "小推车": "司机当下有才算，如果说要回家取，那是无小推车",
-    "无小推车": "司机当下没有小推车",
-
-    # 车顶类型
-    "开顶车厢": "车顶可以全部打开",
-    "不可开顶": "车顶不能打开",
-    "不可全开顶": "高栏车，滑动雨布，雨布可不拆，因此有一部分无法打开",
-
-    # 雨布绳子
-    "雨布": "车上有雨布、雨棚都算",
-    "无雨布": "车上没有雨布",
-    "有绳子": "车上有绳子、网兜都算",
-    "无绳子": "车上没有绳子，或者车辆无法用绳子固定",
-
-    # 费用相关
-    "进出场费": "如有提及，且货主愿意出就算",
-    "等待费": "提及等待费用",
-    "停车费": "提及停车费用",
-}
-
-ALL_TAGS = list(TAG_DEFINITIONS.keys())
-
 
 class RecommendationRequest(BaseModel):
     """推荐请求模型"""
     conversation_id: Optional[int] = None
     text: Optional[str] = None
     top_k: int = Query(3, ge=1, le=10, description="返回最相似的K个对话")
+    use_precomputed: bool = True  # 智能分析是否优先使用后台预分析结果
+
+
+def _resolve_query_text(request: RecommendationRequest) -> str:
+    """
+    获取推荐请求的对话文本（未提供text时按conversation_id读取，在线程池中调用）
+
+    Raises:
+        HTTPException: 对话不存在(404)，或两者都未提供(400)
+    """
+    text = request.text
+    if request.conversation_id and not text:
+        db = SessionLocal()
+        try:
+            conversation = db.query(Conversation.raw_text).filter(
+                Conversation.id == request.conversation_id
+            ).first()
+        finally:
+            db.close()
+
+        if not conversation:
+            raise HTTPException(status_code=404, detail="对话不存在")
+        text = conversation.raw_text
+
+    if not text:
+        raise HTTPException(status_code=400, detail="必须提供conversation_id或text")
+    return text
 
 
 @router.post("/tags")
@@ -126,27 +65,17 @@ async def recommend_tags(request: RecommendationRequest):
     """
     try:
         # 获取对话文本
-        text = request.text
-        if request.conversation_id and not text:
-            db = SessionLocal()
-            try:
-                conversation = db.query(Conversation).filter(
-                    Conversation.id == request.conversation_id
-                ).first()
-                
-                if not conversation:
-                    raise HTTPException(status_code=404, detail="对话不存在")
-                
-                text = conversation.raw_text
-            finally:
-                db.close()
-        
-        if not text:
-            raise HTTPException(status_code=400, detail="必须提供conversation_id或text")
+        text = await run_in_threadpool(_resolve_query_text, request)
+
+        # 模型未就绪时快速返回，不阻塞请求
+        warming_up = get_warming_up_response()
+        if warming_up:
+            return warming_up
         
-        # 获取推荐
+        # 获取推荐（在线程池中执行，使并发请求能被微批处理器合并编码）
         recommender = get_rag_recommender()
-        result = recommender.recommend_tags(
+        result = await run_in_threadpool(
+            recommender.recommend_tags,
             conversation_text=text,
             top_k=request.top_k
         )
@@ -164,315 +93,350 @@ async def recommend_tags(request: RecommendationRequest):
         }
 
 
-@router.post("/index/build")
-async def build_index():
+class BatchRecommendationRequest(BaseModel):
+    """批量推荐请求模型（conversation_ids / batch_id / texts 三选一）"""
+    conversation_ids: Optional[List[int]] = None
+    batch_id: Optional[int] = None
+    texts: Optional[List[str]] = None
+    top_k: int = Query(3, ge=1, le=10, description="每条对话参考的相似对话数量")
+
+
+@router.post("/tags/batch")
+async def recommend_tags_batch(request: BatchRecommendationRequest):
     """
-    构建或重建向量索引
-    
-    从所有已审核的对话构建向量索引
+    批量基于相似对话推荐标签（一次请求完成整批预标注）
+
+    - **conversation_ids**: 对话ID列表
+    - **batch_id**: 导入批次ID（推荐该批次下所有待审核对话）
+    - **texts**: 对话文本列表（不提供ID时使用）
+    - **top_k**: 每条对话参考的相似对话数量
     """
-    try:
+    # 获取对话文本
+    items = []
+    if request.conversation_ids or request.batch_id is not None:
         db = SessionLocal()
         try:
-            # 获取所有已审核的对话
-            conversations = db.query(Conversation).filter(
-                Conversation.status == 'approved'
-            ).all()
-            
-            # 转换为字典列表
-            conv_list = []
-            for conv in conversations:
-                conv_dict = {
-                    'id': conv.id,
-                    'raw_text': conv.raw_text,
-                    'manual_tag': conv.manual_tag
-                }
-                conv_list.append(conv_dict)
-            
-            # 构建索引
-            recommender = get_rag_recommender()
-            result = recommender.build_vector_index(conv_list)
-            
-            return result
-            
+            query = db.query(Conversation.id, Conversation.raw_text)
+            if request.conversation_ids:
+                query = query.filter(Conversation.id.in_(request.conversation_ids))
+            else:
+                query = query.filter(
+                    Conversation.batch_id == request.batch_id,
+                    Conversation.status == 'pending'
+                )
+            rows = {row.id: row.raw_text for row in query.order_by(Conversation.id).all()}
         finally:
             db.close()
-            
-    except Exception as e:
-        return {
-            "success": False,
-            "message": f"构建索引失败: {str(e)}"
-        }
 
+        if request.conversation_ids:
+            missing = [conv_id for conv_id in request.conversation_ids if conv_id not in rows]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"对话不存在: {missing}")
+            items = [(conv_id, rows[conv_id]) for conv_id in request.conversation_ids]
+        else:
+            items = list(rows.items())
+    elif request.texts:
+        items = [(None, text) for text in request.texts]
+    else:
+        raise HTTPException(status_code=400, detail="必须提供conversation_ids、batch_id或texts")
+
+    # 模型未就绪时快速返回，不阻塞请求
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return {**warming_up, "results": []}
 
-@router.get("/index/stats")
-async def get_index_stats():
-    """获取向量索引统计信息"""
     try:
         recommender = get_rag_recommender()
-        stats = recommender.get_index_stats()
-        
-        # 获取数据库统计
-        db = SessionLocal()
-        try:
-            total_conv = db.query(Conversation).count()
-            approved_conv = db.query(Conversation).filter(
-                Conversation.status == 'approved'
-            ).count()
-            
-            stats['database'] = {
-                'total_conversations': total_conv,
-                'approved_conversations': approved_conv
-            }
-        finally:
-            db.close()
-        
-        return {
-            "success": True,
-            "data": stats
-        }
-        
+        texts = [text for _, text in items]
+        recommendations = []
+        # 每块一次编码、一次索引查询，限制超大批次的峰值内存
+        chunk_size = max(1, settings.RECOMMEND_BATCH_MAX_QUERIES)
+        for start in range(0, len(texts), chunk_size):
+            recommendations.extend(await run_in_threadpool(
+                recommender.recommend_tags_batch,
+                conversation_texts=texts[start:start + chunk_size],
+                top_k=request.top_k
+            ))
     except Exception as e:
         return {
             "success": False,
-            "message": f"获取统计失败: {str(e)}"
+            "message": f"批量推荐失败: {str(e)}",
+            "results": []
         }
 
+    return {
+        "success": True,
+        "message": f"已完成 {len(items)} 条对话的推荐",
+        "total": len(items),
+        "results": [
+            {"conversation_id": conv_id, **result}
+            for (conv_id, _), result in zip(items, recommendations)
+        ]
+    }
 
-async def call_glm_api(prompt: str, max_tokens: int = 2000) -> dict:
-    """
-    调用智谱GLM API进行AI分析
+
+@router.post("/centroid")
+async def recommend_tags_by_centroid(request: RecommendationRequest):
     """
-    from app.config import settings
+    标签质心模型推荐（不调用LLM，不检索索引）
 
-    api_key = settings.GLM_API_KEY or os.getenv("GLM_API_KEY") or os.getenv("ZHIPU_API_KEY")
-    if not api_key:
-        print("❌ [AI调用] 未配置GLM_API_KEY")
-        return {"success": False, "error": "未配置GLM_API_KEY"}
+    - **conversation_id**: 对话ID（如果提供，自动获取文本）
+    - **text**: 对话文本（如果不提供conversation_id，则必须提供text）
+    """
+    text = await run_in_threadpool(_resolve_query_text, request)
 
-    print(f"✅ [AI调用] 准备调用GLM API，prompt长度: {len(prompt)}字符")
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://open.bigmodel.cn/api/paas/v4/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "glm-4-flash",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": max_tokens
-                }
-            )
-
-            print(f"📡 [AI调用] API响应状态码: {response.status_code}")
-
-            if response.status_code == 200:
-                data = response.json()
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                print(f"✅ [AI调用] 成功获取AI响应，内容长度: {len(content)}字符")
-                print(f"📄 [AI响应] 前200字符: {content[:200]}...")
-                return {"success": True, "content": content}
-            else:
-                error_msg = f"API调用失败: {response.status_code} - {response.text}"
-                print(f"❌ [AI调用] {error_msg}")
-                return {
-                    "success": False,
-                    "error": error_msg
-                }
+        return await run_in_threadpool(get_rag_recommender().recommend_tags_by_centroid, text)
     except Exception as e:
-        print(f"❌ [AI调用] 异常: {str(e)}")
-        return {"success": False, "error": str(e)}
+        return {
+            "success": False,
+            "message": f"质心模型推荐失败: {str(e)}",
+            "recommendations": [],
+            "confidence": 0.0
+        }
 
 
-async def analyze_initial_tags_with_ai(conversation_text: str, initial_tags: list) -> dict:
+@router.post("/rules")
+async def recommend_tags_by_rules(request: RecommendationRequest):
     """
-    第一层AI分析：验证初始AI标签是否合适
+    规则抽取推荐：数值类（车厢长X米、车载重X吨、跟车X人、X装X卸等）和明确表述类标签（不调用LLM，不需要模型预热）
 
-    返回：{
-        "appropriate_tags": ["标签1", "标签2"],  # 合适的标签
-        "inappropriate_tags": ["标签3"],  # 不合适的标签
-        "reasons": {"标签1": "合适理由", "标签3": "不合适理由"}
-    }
+    - **conversation_id**: 对话ID（如果提供，自动获取文本）
+    - **text**: 对话文本（如果不提供conversation_id，则必须提供text）
     """
-    if not initial_tags:
-        print("⚠️ [第一层AI] 没有初始AI标签需要验证")
-        return {"appropriate_tags": [], "inappropriate_tags": [], "reasons": {}}
-
-    print(f"🔍 [第一层AI] 开始验证初始AI标签: {initial_tags}")
+    text = await run_in_threadpool(_resolve_query_text, request)
+
+    result = extract_rule_tags(text)
+    return {
+        "success": True,
+        "recommendations": result.pop("tags"),
+        "source": "tag_rules",
+        **result
+    }
 
-    # 构建标签定义说明
-    tag_definitions_str = "\n".join([
-        f"- {tag}: {TAG_DEFINITIONS.get(tag, '无说明')}"
-        for tag in initial_tags
-    ])
 
-    prompt = f"""你是一个专业的货运对话标注专家。请分析以下司机与货主的对话内容，验证初始AI推荐的标签是否合适。
+@router.post("/classifier")
+async def recommend_tags_by_classifier(request: RecommendationRequest):
+    """
+    多标签分类模型推荐（不调用LLM，不检索索引）
 
-## 对话内容：
-{conversation_text}
+    - **conversation_id**: 对话ID（如果提供，自动获取文本）
+    - **text**: 对话文本（如果不提供conversation_id，则必须提供text）
+    """
+    text = await run_in_threadpool(_resolve_query_text, request)
 
-## 初始AI推荐的标签：
-{tag_definitions_str}
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
-## 你的任务：
-请逐个分析每个初始AI标签，判断是否合适，并给出理由。
+    try:
+        return await run_in_threadpool(get_rag_recommender().recommend_tags_by_classifier, text)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"分类模型推荐失败: {str(e)}",
+            "recommendations": [],
+            "confidence": 0.0
+        }
 
-## 标签判断标准：
-- **合适**：对话内容明确提到或暗示该标签所描述的特征
-- **不合适**：对话内容未提及、相反、或不足以支持该标签
 
-## 输出格式（严格按照JSON格式输出）：
-{{
-    "appropriate_tags": ["标签1", "标签2"],
-    "inappropriate_tags": ["标签3"],
-    "reasons": {{
-        "标签1": "对话中提到xxx，符合该标签定义",
-        "标签3": "对话中未提及xxx，不符合该标签定义"
-    }}
-}}
+@router.post("/index/build")
+async def build_index():
+    """
+    构建或重建向量索引
+    
+    从所有已审核的对话构建向量索引。构建在后台任务中执行，立即返回任务ID，
+    通过 /index/jobs/{job_id} 查询进度；同一时间只运行一个构建任务。
+    """
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
-请只输出JSON，不要输出其他内容。"""
+    try:
+        job = get_index_build_manager().start()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {
+        "success": True,
+        "message": "索引构建任务已启动",
+        "job": job.to_dict()
+    }
 
-    result = await call_glm_api(prompt, max_tokens=1500)
 
-    if not result.get("success"):
-        print(f"❌ [第一层AI] AI调用失败: {result.get('error')}")
-        return {"appropriate_tags": [], "inappropriate_tags": initial_tags, "reasons": {}}
+@router.get("/index/jobs/current")
+async def get_current_index_job():
+    """获取当前（或最近一次）索引构建任务"""
+    job = get_index_build_manager().get_current()
+    if not job:
+        raise HTTPException(status_code=404, detail="没有索引构建任务")
+    return {"success": True, "job": job.to_dict()}
 
-    try:
-        import json
-        content = result["content"]
 
-        # 提取JSON部分（处理可能的markdown代码块）
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
+@router.get("/index/jobs/{job_id}")
+async def get_index_job(job_id: str):
+    """获取索引构建任务进度"""
+    job = get_index_build_manager().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"success": True, "job": job.to_dict()}
 
-        analysis = json.loads(content)
-        appropriate = analysis.get("appropriate_tags", [])
-        inappropriate = analysis.get("inappropriate_tags", [])
-        reasons = analysis.get("reasons", {})
 
-        print(f"✅ [第一层AI] 验证完成: {len(appropriate)}个合适, {len(inappropriate)}个不合适")
-        print(f"   ✓ 合适: {appropriate}")
-        print(f"   ✗ 不合适: {inappropriate}")
+@router.post("/index/jobs/{job_id}/cancel")
+async def cancel_index_job(job_id: str):
+    """取消索引构建任务（当前分块写完后停止，当前索引不受影响）"""
+    job = get_index_build_manager().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
 
+    if not job.cancel():
         return {
-            "appropriate_tags": appropriate,
-            "inappropriate_tags": inappropriate,
-            "reasons": reasons
-        }
-    except Exception as e:
-        print(f"❌ [第一层AI] JSON解析失败: {str(e)}")
-        # 如果解析失败，保留所有标签为不合适
-        return {
-            "appropriate_tags": [],
-            "inappropriate_tags": initial_tags,
-            "reasons": {},
-            "parse_error": str(e)
+            "success": False,
+            "message": f"任务已结束: {job.status}",
+            "job": job.to_dict()
         }
 
-
-async def recommend_tags_from_conversation_with_ai(conversation_text: str, exclude_tags: list = None) -> dict:
-    """
-    第二层AI分析：深入分析对话内容，推荐合适的标签
-
-    返回：{
-        "recommended_tags": ["标签1", "标签2"],
-        "reasons": {"标签1": "推荐理由1", "标签2": "推荐理由2"}
+    return {
+        "success": True,
+        "message": "已请求取消",
+        "job": job.to_dict()
     }
-    """
-    exclude_tags = exclude_tags or []
-    print(f"🔍 [第二层AI] 开始分析对话内容，排除标签: {exclude_tags}")
 
-    # 构建所有标签定义
-    all_tags_str = "\n".join([
-        f"- {tag}: {TAG_DEFINITIONS[tag]}"
-        for tag in TAG_DEFINITIONS.keys()
-    ])
 
-    exclude_tags_str = ", ".join(exclude_tags) if exclude_tags else "无"
+@router.post("/index/rollback")
+async def rollback_vector_index():
+    """回滚向量索引到上一个版本（回滚后对账，补齐上一个版本未收到的审核变更）"""
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
-    prompt = f"""你是一个专业的货运对话标注专家。请深入分析以下司机与货主的对话内容，推荐合适的标签。
-
-## 对话内容：
-{conversation_text}
-
-## 所有可用的标准化标签及其定义：
-{all_tags_str}
+    recommender = get_rag_recommender()
+    try:
+        reconciled = await run_in_threadpool(rollback_index)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"回滚后索引对账失败: {str(e)}"
+        }
+    if reconciled is None:
+        return {
+            "success": False,
+            "message": "没有可回滚的上一个索引版本"
+        }
 
-## 已排除的标签（不需要再次推荐）：
-{exclude_tags_str}
+    return {
+        "success": True,
+        "message": f"已回滚到索引版本 {recommender.vector_store.index_version}",
+        "reconcile": reconciled,
+        **recommender.vector_store.get_index_info()
+    }
 
-## 你的任务：
-根据对话内容，从上述标签列表中选择合适的标签。优先选择明确提及的特征。
 
-## 标签选择标准：
-1. 对话中明确提到的特征（如车型、尺寸、费用等）
-2. 双方达成一致的要求或约定
-3. 司机或货主明确表示的限制或条件
-4. 不要选择对话中未提及的标签
+@router.post("/index/reconcile")
+async def reconcile_vector_index():
+    """
+    向量索引对账
 
-## 输出格式（严格按照JSON格式输出）：
-{{
-    "recommended_tags": ["标签1", "标签2", "标签3"],
-    "reasons": {{
-        "标签1": "对话中司机明确说xxx，符合该标签定义",
-        "标签2": "货主要求xxx，司机同意，符合标签定义"
-    }}
-}}
+    比对数据库中已审核的对话与索引，补齐缺失、更新标签变化、删除多余文档
+    """
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
-请只输出JSON，不要输出其他内容。"""
+    try:
+        return await run_in_threadpool(reconcile_index)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"索引对账失败: {str(e)}"
+        }
 
-    result = await call_glm_api(prompt, max_tokens=2000)
 
-    if not result.get("success"):
-        print(f"❌ [第二层AI] AI调用失败: {result.get('error')}")
-        return {"recommended_tags": [], "reasons": {}}
+@router.get("/index/stats")
+async def get_index_stats():
+    """获取向量索引统计信息"""
+    warming_up = get_warming_up_response()
+    if warming_up:
+        return warming_up
 
     try:
-        import json
-        content = result["content"]
+        recommender = get_rag_recommender()
+        stats = recommender.get_index_stats()
+        
+        # 获取数据库统计
+        db = SessionLocal()
+        try:
+            total_conv = db.query(Conversation).count()
+            approved_conv = db.query(Conversation).filter(
+                Conversation.status == 'approved'
+            ).count()
+            
+            stats['database'] = {
+                'total_conversations': total_conv,
+                'approved_conversations': approved_conv
+            }
+        finally:
+            db.close()
+        
+        return {
+            "success": True,
+            "data": stats
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"获取统计失败: {str(e)}"
+        }
 
-        # 提取JSON部分
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
 
-        recommendation = json.loads(content)
-        recommended = recommendation.get("recommended_tags", [])
-        reasons = recommendation.get("reasons", {})
+@router.get("/ai/cache/stats")
+async def get_llm_cache_stats():
+    """获取LLM响应缓存统计（命中率、条数、淘汰数）"""
+    cache = get_llm_response_cache()
+    if cache is None:
+        return {
+            "success": False,
+            "message": "LLM响应缓存未启用"
+        }
+    return {
+        "success": True,
+        "data": await run_in_threadpool(cache.get_stats)
+    }
 
-        print(f"✅ [第二层AI] 分析完成，推荐了 {len(recommended)} 个标签: {recommended}")
 
+@router.delete("/ai/cache")
+async def clear_llm_cache(expired_only: bool = Query(False, description="只清除过期记录")):
+    """清空LLM响应缓存"""
+    cache = get_llm_response_cache()
+    if cache is None:
         return {
-            "recommended_tags": recommended,
-            "reasons": reasons
+            "success": False,
+            "message": "LLM响应缓存未启用"
         }
-    except Exception as e:
-        print(f"❌ [第二层AI] JSON解析失败: {str(e)}")
-        return {"recommended_tags": [], "reasons": {}, "parse_error": str(e)}
+    removed = await run_in_threadpool(cache.purge_expired if expired_only else cache.clear)
+    return {
+        "success": True,
+        "message": f"已清除 {removed} 条缓存",
+        "removed": removed
+    }
 
 
 @router.post("/ai/analyze")
 async def ai_analyze_tags(request: RecommendationRequest):
     """
-    三层AI深度分析推荐标签：
+    三层AI深度分析推荐标签（三层并发执行）：
 
     第一层：AI分析初始AI标签是否合适，给出详细理由
-    第二层：AI深入分析当前对话内容，推荐合适的标签
+    第二层：AI深入分析当前对话内容，推荐合适的标签（去掉第一层已确认合适的标签）
     第三层：参考历史相似对话作为补充
+
+    标签质心模型置信度达到 TAG_CENTROID_SKIP_LLM_CONFIDENCE 且没有不确定标签时跳过第二层，采用其判定结果。
+    按 conversation_id 分析时优先返回后台预分析的结果（use_precomputed=false 时重新分析）
     """
     try:
         # 获取对话文本和初始标签
@@ -481,192 +445,98 @@ async def ai_analyze_tags(request: RecommendationRequest):
         driver_tags = []
 
         if conversation_id and not text:
-            db = SessionLocal()
-            try:
-                conversation = db.query(Conversation).filter(
-                    Conversation.id == conversation_id
-                ).first()
-
-                if not conversation:
-                    raise HTTPException(status_code=404, detail="对话不存在")
-
-                text = conversation.raw_text
-
-                # 提取初始AI标签
-                if conversation.driver_tag:
-                    try:
-                        import json
-                        parsed = json.loads(conversation.driver_tag)
-                        driver_tags = parsed if isinstance(parsed, list) else [parsed]
-                        driver_tags = [t for t in driver_tags if t]
-                    except:
-                        if conversation.driver_tag:
-                            driver_tags = [conversation.driver_tag]
-            finally:
-                db.close()
+            loaded = await run_in_threadpool(load_conversation_for_analysis, conversation_id)
+            if not loaded:
+                raise HTTPException(status_code=404, detail="对话不存在")
+            text, driver_tags = loaded
+
+            if request.use_precomputed:
+                precomputed = await run_in_threadpool(get_preanalysis, conversation_id, text, driver_tags)
+                if precomputed:
+                    print(f"⚡ [智能分析] 对话 {conversation_id} 使用预分析结果")
+                    return precomputed
 
         if not text:
             raise HTTPException(status_code=400, detail="必须提供conversation_id或text")
 
-        # ========== 第一层：AI分析初始AI标签是否合适 ==========
-        initial_analysis = await analyze_initial_tags_with_ai(text, driver_tags)
+        return await run_ai_analysis(text, driver_tags)
 
-        # ========== 第二层：AI深入分析对话内容，推荐标签 ==========
-        # 排除第一层确认合适的标签，让AI推荐新标签
-        exclude_from_layer2 = initial_analysis.get("appropriate_tags", [])
-        conversation_analysis = await recommend_tags_from_conversation_with_ai(text, exclude_tags=exclude_from_layer2)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        return {
+            "success": False,
+            "message": f"智能分析失败: {str(e)}\n{traceback.format_exc()}",
+            "recommendations": [],
+            "confidence": 0.0
+        }
 
-        # ========== 第三层：参考历史相似对话 ==========
-        rag_recommender = get_rag_recommender()
-        rag_result = rag_recommender.recommend_tags(
-            conversation_text=text,
-            top_k=10,
-            min_similarity=0.3
-        )
 
-        rag_tags_with_reason = {}
-        similar_conversations_enhanced = []
-
-        if rag_result.get("success") and rag_result.get("similar_conversations"):
-            # 排除前两层已推荐的标签
-            existing_tags = set(initial_analysis.get("appropriate_tags", [])) | \
-                           set(conversation_analysis.get("recommended_tags", []))
-
-            for conv in rag_result["similar_conversations"]:
-                conv_id = conv.get("conversation_id")
-                similarity = conv.get("similarity", 0)
-
-                db = SessionLocal()
-                try:
-                    conv_detail = db.query(Conversation).filter(
-                        Conversation.id == conv_id
-                    ).first()
-
-                    if conv_detail and conv_detail.batch_id:
-                        from app.models.import_batch import ImportBatch
-                        batch = db.query(ImportBatch).filter(
-                            ImportBatch.id == conv_detail.batch_id
-                        ).first()
-
-                        if conv.get("tags"):
-                            for tag in conv["tags"]:
-                                # 只推荐尚未推荐的标签
-                                if tag not in existing_tags and tag in TAG_DEFINITIONS:
-                                    if tag not in rag_tags_with_reason:
-                                        rag_tags_with_reason[tag] = []
-
-                                    reason = f"相似度{round(similarity*100)}%"
-                                    if batch:
-                                        reason += f" - 来自批次: {batch.file_name}"
-                                    reason += f" (对话#{conv_id})"
-
-                                    rag_tags_with_reason[tag].append({
-                                        "reason": reason,
-                                        "similarity": similarity,
-                                        "conversation_id": conv_id,
-                                        "file_name": batch.file_name if batch else "未知",
-                                        "conversation_snippet": conv.get("text", "")[:100] + "..."
-                                    })
-                                    existing_tags.add(tag)  # 避免重复添加
-                finally:
-                    db.close()
-
-        # ========== 合并三层推荐结果 ==========
-        all_recommendations = {}
-        tag_details = {}
-
-        # 第一层：验证合适的初始AI标签（最高优先级）
-        for tag in initial_analysis.get("appropriate_tags", []):
-            reason = initial_analysis.get("reasons", {}).get(tag, "初始AI推荐，AI验证合适")
-            all_recommendations[tag] = {
-                "score": 10,
-                "source": "initial_ai_verified",
-                "reason": f"✓ {reason}"
-            }
-            tag_details[tag] = all_recommendations[tag]
-
-        # 第二层：从对话内容AI推荐的标签
-        for tag in conversation_analysis.get("recommended_tags", []):
-            reason = conversation_analysis.get("reasons", {}).get(tag, "AI从对话内容分析推荐")
-            all_recommendations[tag] = {
-                "score": 8,
-                "source": "conversation_ai",
-                "reason": reason
-            }
-            tag_details[tag] = all_recommendations[tag]
-
-        # 第三层：历史相似对话推荐
-        for tag, reasons_list in rag_tags_with_reason.items():
-            if reasons_list and isinstance(reasons_list, list):
-                all_recommendations[tag] = {
-                    "score": 5,
-                    "source": "historical_similar",
-                    "reason": reasons_list[0]["reason"]
-                }
-                tag_details[tag] = all_recommendations[tag]
-
-        # 按权重排序
-        sorted_recommendations = sorted(
-            all_recommendations.items(),
-            key=lambda x: x[1]["score"],
-            reverse=True
-        )
+@router.post("/preanalysis/batches/{batch_id}/start")
+async def start_batch_preanalysis(batch_id: int):
+    """
+    启动批次的后台AI预分析（已暂停的任务再次启动会继续执行）
 
-        final_tags = [tag for tag, details in sorted_recommendations]
+    对批次中待审核的对话执行三层AI分析并保存结果，审核时 /ai/analyze 直接返回预分析结果。
+    通过 /preanalysis/batches/{batch_id} 查询进度
+    """
+    db = SessionLocal()
+    try:
+        batch = db.query(ImportBatch.id).filter(ImportBatch.id == batch_id).first()
+    finally:
+        db.close()
+    if not batch:
+        raise HTTPException(status_code=404, detail="批次不存在")
 
-        # ========== 智能自动选择逻辑 ==========
-        auto_select_tags = []
-        appropriate_initial_tags = initial_analysis.get("appropriate_tags", [])
+    try:
+        job = get_preanalysis_manager().start(batch_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "success": True,
+        "message": "预分析任务已启动",
+        "job": job.to_dict()
+    }
 
-        if appropriate_initial_tags:
-            # 如果有验证合适的初始AI标签，自动选中这些
-            auto_select_tags = appropriate_initial_tags
-            print(f"✅ [自动选择] 使用验证合适的初始标签: {auto_select_tags}")
-        else:
-            # 如果初始AI标签都不合适，使用第二层AI推荐的标签
-            recommended_conversation_tags = conversation_analysis.get("recommended_tags", [])
-            if recommended_conversation_tags:
-                auto_select_tags = recommended_conversation_tags
-                print(f"✅ [自动选择] 初始标签不合适，使用第二层AI推荐: {auto_select_tags}")
-            else:
-                print(f"⚠️ [自动选择] 没有可自动选择的标签")
 
-        # 构建相似对话详细信息
-        similar_convs_details = []
-        for tag, reasons_list in rag_tags_with_reason.items():
-            if reasons_list and isinstance(reasons_list, list):
-                similar_convs_details.extend(reasons_list[:1])
+@router.post("/preanalysis/batches/{batch_id}/pause")
+async def pause_batch_preanalysis(batch_id: int):
+    """暂停批次预分析（进行中的对话分析完成后停止）"""
+    job = get_preanalysis_manager().pause(batch_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="该批次没有运行中的预分析任务")
+    return {
+        "success": True,
+        "message": "已请求暂停",
+        "job": job.to_dict()
+    }
 
-        print(f"📊 [最终结果] 总共推荐 {len(final_tags)} 个标签，自动选择 {len(auto_select_tags)} 个")
 
-        # 构建响应
-        return {
-            "success": True,
-            "recommendations": final_tags,
-            "tag_details": tag_details,
-            "auto_select_tags": auto_select_tags,  # 新增：自动选择的标签
-            "confidence": min(0.98, 0.7 + len(final_tags) * 0.03),
-            "message": f"三层AI分析：验证初始标签({len(initial_analysis.get('appropriate_tags', []))}个合适) + 对话内容分析({len(conversation_analysis.get('recommended_tags', []))}个) + 历史相似({len(rag_tags_with_reason)}个)",
-            "similar_conversations": similar_convs_details[:5],
-            "initial_ai_tags": driver_tags,
-            "initial_ai_analysis": {
-                "appropriate": initial_analysis.get("appropriate_tags", []),
-                "inappropriate": initial_analysis.get("inappropriate_tags", []),
-                "reasons": initial_analysis.get("reasons", {})
-            },
-            "conversation_analysis": {
-                "recommended": conversation_analysis.get("recommended_tags", []),
-                "reasons": conversation_analysis.get("reasons", {})
-            }
-        }
+@router.get("/preanalysis/batches/{batch_id}")
+async def get_batch_preanalysis(batch_id: int):
+    """获取批次预分析进度"""
+    job = get_preanalysis_manager().get(batch_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="该批次没有预分析任务")
+    return {"success": True, "job": job.to_dict()}
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
+
+@router.get("/preanalysis/conversations/{conversation_id}")
+async def get_conversation_preanalysis(conversation_id: int):
+    """读取对话的预分析结果（不存在或已失效时 success 为 false，不会触发分析）"""
+    loaded = await run_in_threadpool(load_conversation_for_analysis, conversation_id)
+    if not loaded:
+        raise HTTPException(status_code=404, detail="对话不存在")
+
+    text, driver_tags = loaded
+    result = await run_in_threadpool(get_preanalysis, conversation_id, text, driver_tags)
+    if not result:
         return {
             "success": False,
-            "message": f"智能分析失败: {str(e)}\n{traceback.format_exc()}",
-            "recommendations": [],
-            "confidence": 0.0
+            "message": "没有有效的预分析结果"
         }
+    return result
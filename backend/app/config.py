@@ -12,11 +12,80 @@ class Settings(BaseSettings):
     GLM_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
 
+    # GLM调用（应用内共享一个连接池）
+    GLM_API_BASE_URL: str = "https://open.bigmodel.cn/api/paas/v4"  # 测试时可指向本地桩服务
+    GLM_MODEL: str = "glm-4-flash"
+    GLM_HTTP2: bool = False  # 需要安装 h2（httpx[http2]），未安装时退回 HTTP/1.1
+    GLM_MAX_CONNECTIONS: int = 20  # 同时打开的最大连接数
+    GLM_MAX_KEEPALIVE_CONNECTIONS: int = 10  # 保持复用的空闲连接数
+    GLM_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保持时间（秒）
+    GLM_CONNECT_TIMEOUT: float = 5.0  # 建立连接超时（秒）
+    GLM_READ_TIMEOUT: float = 30.0  # 等待响应超时（秒）
+    GLM_WRITE_TIMEOUT: float = 10.0  # 发送请求超时（秒）
+    GLM_POOL_TIMEOUT: float = 10.0  # 等待空闲连接超时（秒）
+    LLM_CACHE_ENABLED: bool = True  # 缓存GLM响应（标签定义变化时自动失效）
+    LLM_CACHE_PATH: Optional[str] = "./data/llm_cache.db"
+    LLM_CACHE_TTL_SECONDS: float = 7 * 24 * 3600.0  # 有效期（秒），<=0 表示不过期
+    LLM_CACHE_MAX_ITEMS: int = 20000  # 超出后淘汰最久未使用的记录
+    TAG_RULES_ENABLED: bool = True  # 智能分析先用规则抽取数值类和明确表述类标签，已判定的标签不再交给LLM
+    TAG_RULES_SKIP_LLM: bool = True  # 规则完整覆盖对话（无其他线索、问句和矛盾）时跳过第二层AI分析
+    PREANALYSIS_CONCURRENCY: int = 4  # 批量预分析同时分析的对话数
+    PREANALYSIS_RATE_PER_SECOND: float = 2.0  # 批量预分析的LLM请求速率上限（次/秒），<=0 表示不限速
+    PREANALYSIS_BURST: float = 4.0  # 令牌桶容量（允许的突发请求数）
+    PREANALYSIS_MAX_RETRIES: int = 3  # LLM调用失败后的重试次数
+    PREANALYSIS_BACKOFF_BASE_SECONDS: float = 1.0  # 指数退避的初始等待（秒）
+    PREANALYSIS_BACKOFF_MAX_SECONDS: float = 30.0  # 指数退避的最长等待（秒）
+
     # 应用配置
     APP_NAME: str = "智能打标便捷器"
     VERSION: str = "0.1.0"
     DEBUG: bool = True
 
+    # 嵌入模型
+    EMBEDDING_MODEL_NAME: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_MODEL_DIR: Optional[str] = None  # 本地模型目录（scripts/fetch_embedding_model.py 生成），设置后完全离线加载
+    EMBEDDING_MODEL_REVISION: Optional[str] = None  # 模型在 huggingface 上的 commit（40位），下载模型时按此固定版本
+    EMBEDDING_MODEL_VERIFY_HASH: bool = False  # 加载前校验清单中的SHA-256（构建镜像时已校验），默认只校验文件大小
+    EMBEDDING_BACKEND: str = "torch"  # 推理后端: torch / onnx
+    EMBEDDING_ONNX_DIR: Optional[str] = None  # ONNX模型目录（scripts/export_onnx_model.py 生成）
+    EMBEDDING_ONNX_QUANTIZED: bool = False  # 使用int8动态量化模型
+    EMBEDDING_ONNX_THREADS: int = 0  # onnxruntime 线程数，0为默认
+    EMBEDDING_CACHE_PATH: Optional[str] = "./data/embedding_cache.db"  # 为空则只使用内存缓存
+    EMBEDDING_CACHE_MAX_ITEMS: int = 10000  # 内存LRU容量
+    EMBEDDING_WORKERS: int = 0  # 批量重建索引时的编码进程数，<=1 表示单进程（每个进程各自加载一份模型）
+    EMBEDDING_WORKER_THREADS: int = 1  # 每个编码进程的推理线程数
+    EMBEDDING_WORKER_SHARD_SIZE: int = 64  # 每个分片的文本数量
+    EMBEDDING_PARALLEL_MIN_TEXTS: int = 256  # 未命中缓存的文本少于该数量时不启用多进程
+    VECTOR_STORE_BACKEND: str = "chroma"  # 向量库后端: chroma / numpy（进程内精确检索）
+    VECTOR_STORE_NUMPY_DIR: str = "/app/data/numpy_index"  # NumPy后端的存储目录
+    VECTOR_STORE_PRECISION: str = "float32"  # NumPy后端检索用的向量精度: float32 / float16 / int8（每向量一个缩放系数）
+    VECTOR_STORE_RERANK_FACTOR: int = 4  # 低精度检索取 top_k×该倍数 的候选，再用float32原始向量重排；0 表示不重排
+    VECTOR_INDEX_WRITE_BATCH: int = 512  # 批量写入向量库的分块大小
+    EMBEDDING_WARMUP_ON_STARTUP: bool = True  # 启动时后台加载并预热模型
+    VECTOR_INDEX_RECONCILE_ON_STARTUP: bool = True  # 预热完成后对账数据库与向量索引
+    EMBEDDING_MICRO_BATCHING: bool = True  # 合并并发的单条查询编码
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    RECOMMEND_BATCH_MAX_QUERIES: int = 512  # 批量推荐时单次编码+检索的最大查询数（超出则分块）
+    RECOMMEND_CACHE_MAX_ITEMS: int = 2048  # 推荐结果缓存条数，0 表示禁用（索引变化时自动失效）
+    RECOMMEND_CACHE_TTL_SECONDS: float = 600.0  # 推荐结果缓存有效期（秒）
+    RAG_RETRIEVAL_MODE: str = "dense"  # 相似对话检索方式: dense（向量）/ hybrid（向量+BM25融合）/ lexical（仅BM25，不做嵌入）
+    RAG_HYBRID_DENSE_WEIGHT: float = 0.7  # 混合检索中向量相似度的权重（其余为BM25相似度）
+    RAG_HYBRID_CANDIDATE_FACTOR: int = 4  # 混合检索每一路召回 top_k×该倍数 个候选
+    RAG_TAG_WEIGHT_TEMPERATURE: float = 0.05  # 近邻投票的softmax温度，越小越偏向最相似的对话，<=0 为等权
+    RAG_TAG_RANK_DECAY: float = 1.0  # 近邻投票按排名的衰减系数（第r名乘以该值的r次方），1.0 不衰减
+    RAG_TAG_SCORE_SHRINKAGE: float = 1.0  # 标签得分收缩强度，有效近邻数越少得分越低，0 不收缩
+    RAG_TAG_MIN_SCORE: float = 0.0  # 推荐标签的最低得分（0~1），0 表示有近邻支持即推荐
+    TAG_VOCABULARY_PATH: str = "./data/tag_vocabulary.json"  # 标签词表（标签名↔整数ID），为空则只在内存中维护
+    TAG_CENTROID_ENABLED: bool = True  # 标签质心分类器（不调用LLM的快速推荐），随审核增量更新，对账/重建索引后全量训练
+    TAG_CENTROID_MODEL_PATH: str = "./data/tag_centroids.npz"  # 质心模型文件，为空则只在内存中维护
+    TAG_CENTROID_MIN_EXAMPLES: int = 5  # 标签至少有这么多条训练样本才参与判定
+    TAG_CENTROID_SKIP_LLM_CONFIDENCE: float = 1.01  # /ai/analyze 中质心模型置信度达到该值且没有阈值附近的标签时跳过第二层AI分析（初始标签仍由第一层验证），>1 表示从不跳过；在自己的数据上评估后再调低
+    TAG_CENTROID_UNCERTAIN_MARGIN: float = 0.05  # 得分低于阈值不超过该值的标签视为不确定，有不确定标签时不跳过第二层
+    TAG_CLASSIFIER_ENABLED: bool = True  # 一对多逻辑回归标签分类模型（scripts/train_tag_classifier.py 训练）
+    TAG_CLASSIFIER_DIR: str = "./data/tag_classifier"  # 分类模型版本目录（model_v{N}.npz + current.json 指针）
+    TAG_CLASSIFIER_KEEP_VERSIONS: int = 3  # 保留的历史版本数（用于回退）
+
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = [
         "http://localhost:3000",
@@ -1,19 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import settings
 from app.api.v1 import conversations, tags, export, recommendations, batches, admin
+from app.services.rag.warmup import start_background_warmup, get_readiness
+from app.services.rag.parallel_embedding import shutdown_parallel_embedding_engine
+from app.services.llm_client import start_llm_client, close_llm_client
+from app.services.preanalysis_jobs import get_preanalysis_manager
 import importlib
 
 # 导入import模块（import是Python关键字，需要使用importlib）
 import_api = importlib.import_module('app.api.v1.import')
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时在后台线程加载嵌入模型，不阻塞服务启动；创建共享的LLM连接池"""
+    if settings.EMBEDDING_WARMUP_ON_STARTUP:
+        start_background_warmup()
+    await start_llm_client()
+    yield
+    await get_preanalysis_manager().shutdown()
+    await close_llm_client()
+    shutdown_parallel_embedding_engine()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     debug=settings.DEBUG,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -49,3 +69,13 @@ async def root():
 async def health():
     """健康检查"""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：嵌入模型、向量库、数据库是否可用"""
+    readiness = get_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content=readiness
+    )
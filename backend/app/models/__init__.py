@@ -2,5 +2,6 @@ from app.models.conversation import Conversation
 from app.models.tag import Tag
 from app.models.audit_log import AuditLog
 from app.models.import_batch import ImportBatch
+from app.models.ai_preanalysis import AIPreanalysis
 
-__all__ = ["Conversation", "Tag", "AuditLog", "ImportBatch"]
+__all__ = ["Conversation", "Tag", "AuditLog", "ImportBatch", "AIPreanalysis"]
@@ -0,0 +1,34 @@
+"""
+AI预分析结果模型
+每条对话最多保留一条后台三层AI分析的结果
+"""
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship, backref
+from app.database import Base
+
+
+class AIPreanalysis(Base):
+    """AI预分析结果表"""
+
+    __tablename__ = "ai_preanalysis"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conv_id = Column(
+        Integer, ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False, unique=True, index=True
+    )
+    fingerprint = Column(String(32), nullable=False, comment="对话文本、初始标签和标签定义的指纹")
+    driver_tags = Column(Text, comment="分析时的初始AI标签，JSON")
+    confidence = Column(Float, comment="置信度")
+    result = Column(Text, nullable=False, comment="智能分析结果，JSON")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 关系：删除对话时一并删除预分析结果（批量 query.delete() 不经过ORM，需要另外删除）
+    conversation = relationship(
+        "Conversation",
+        backref=backref("preanalysis", uselist=False, cascade="all, delete-orphan")
+    )
+
+    def __repr__(self):
+        return f"<AIPreanalysis(id={self.id}, conv_id={self.conv_id})>"
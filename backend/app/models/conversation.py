@@ -16,7 +16,7 @@ class Conversation(Base):
     field_length = Column(Integer, comment="对话长度")
     is_difficult = Column(Boolean, default=False, comment="是否为疑难案例")
     difficult_note = Column(Text, comment="疑难案例备注")
-    batch_id = Column(Integer, ForeignKey('import_batches.id'), index=True, comment="导入批次ID")
+    batch_id = Column(Integer, ForeignKey('import_batches.id'), comment="导入批次ID")
     auditor = Column(String(100), comment="审核人")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
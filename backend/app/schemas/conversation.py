@@ -44,3 +44,20 @@ class ConversationListResponse(BaseModel):
     page: int
     limit: int
     items: List[ConversationResponse]
+
+
+class ConversationSearchItem(BaseModel):
+    """全文检索结果项"""
+    id: int
+    status: Optional[str] = None
+    batch_id: Optional[int] = None
+    manual_tag: Optional[str] = None
+    score: Optional[float] = None
+    snippet: str
+
+
+class ConversationSearchResponse(BaseModel):
+    """全文检索响应"""
+    items: List[ConversationSearchItem]
+    next_cursor: Optional[str] = None
+    mode: str
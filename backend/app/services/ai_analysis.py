@@ -0,0 +1,657 @@
+"""
+三层AI标签分析 - 智能分析接口和后台批量预分析共用
+
+第一层：AI验证初始AI标签是否合适
+第二层：AI分析对话内容推荐标签
+第三层：参考历史相似对话
+预分析结果保存在 ai_preanalysis 表（每条对话一条），按对话文本、初始标签和标签定义的指纹校验是否仍然有效。
+"""
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import AIPreanalysis, Conversation
+from app.services.llm_cache import definitions_fingerprint
+from app.services.llm_client import call_glm_api
+from app.services.rag.rag_service import get_rag_recommender
+from app.services.rag.warmup import is_rag_ready, start_background_warmup
+from app.services.tag_definitions import TAG_DEFINITIONS
+from app.services.tag_rules import extract_rule_tags
+
+
+def parse_driver_tags(driver_tag: Optional[str]) -> List[str]:
+    """解析对话的初始AI标签（JSON列表或单个标签字符串）"""
+    if not driver_tag:
+        return []
+    try:
+        parsed = json.loads(driver_tag)
+        tags = parsed if isinstance(parsed, list) else [parsed]
+        return [t for t in tags if t]
+    except (ValueError, TypeError):
+        return [driver_tag]
+
+
+def load_conversation_for_analysis(conversation_id: int) -> Optional[Tuple[str, List[str]]]:
+    """
+    读取对话文本和初始AI标签
+
+    Returns:
+        (对话文本, 初始AI标签)，对话不存在返回None
+    """
+    db = SessionLocal()
+    try:
+        conversation = db.query(Conversation.raw_text, Conversation.driver_tag).filter(
+            Conversation.id == conversation_id
+        ).first()
+    finally:
+        db.close()
+    if not conversation:
+        return None
+    return conversation.raw_text, parse_driver_tags(conversation.driver_tag)
+
+
+async def analyze_initial_tags_with_ai(conversation_text: str, initial_tags: list) -> dict:
+    """
+    第一层AI分析：验证初始AI标签是否合适
+
+    返回：{
+        "appropriate_tags": ["标签1", "标签2"],  # 合适的标签
+        "inappropriate_tags": ["标签3"],  # 不合适的标签
+        "reasons": {"标签1": "合适理由", "标签3": "不合适理由"}
+    }
+    LLM调用失败时额外返回 "llm_error"
+    """
+    if not initial_tags:
+        print("⚠️ [第一层AI] 没有初始AI标签需要验证")
+        return {"appropriate_tags": [], "inappropriate_tags": [], "reasons": {}}
+
+    print(f"🔍 [第一层AI] 开始验证初始AI标签: {initial_tags}")
+
+    # 构建标签定义说明
+    tag_definitions_str = "\n".join([
+        f"- {tag}: {TAG_DEFINITIONS.get(tag, '无说明')}"
+        for tag in initial_tags
+    ])
+
+    prompt = f"""你是一个专业的货运对话标注专家。请分析以下司机与货主的对话内容，验证初始AI推荐的标签是否合适。
+
+## 对话内容：
+{conversation_text}
+
+## 初始AI推荐的标签：
+{tag_definitions_str}
+
+## 你的任务：
+请逐个分析每个初始AI标签，判断是否合适，并给出理由。
+
+## 标签判断标准：
+- **合适**：对话内容明确提到或暗示该标签所描述的特征
+- **不合适**：对话内容未提及、相反、或不足以支持该标签
+
+## 输出格式（严格按照JSON格式输出）：
+{{
+    "appropriate_tags": ["标签1", "标签2"],
+    "inappropriate_tags": ["标签3"],
+    "reasons": {{
+        "标签1": "对话中提到xxx，符合该标签定义",
+        "标签3": "对话中未提及xxx，不符合该标签定义"
+    }}
+}}
+
+请只输出JSON，不要输出其他内容。"""
+
+    result = await call_glm_api(prompt, max_tokens=1500)
+
+    if not result.get("success"):
+        print(f"❌ [第一层AI] AI调用失败: {result.get('error')}")
+        return {"appropriate_tags": [], "inappropriate_tags": initial_tags, "reasons": {}, "llm_error": result.get("error")}
+
+    try:
+        content = result["content"]
+
+        # 提取JSON部分（处理可能的markdown代码块）
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        analysis = json.loads(content)
+        appropriate = analysis.get("appropriate_tags", [])
+        inappropriate = analysis.get("inappropriate_tags", [])
+        reasons = analysis.get("reasons", {})
+
+        print(f"✅ [第一层AI] 验证完成: {len(appropriate)}个合适, {len(inappropriate)}个不合适")
+        print(f"   ✓ 合适: {appropriate}")
+        print(f"   ✗ 不合适: {inappropriate}")
+
+        return {
+            "appropriate_tags": appropriate,
+            "inappropriate_tags": inappropriate,
+            "reasons": reasons
+        }
+    except Exception as e:
+        print(f"❌ [第一层AI] JSON解析失败: {str(e)}")
+        # 如果解析失败，保留所有标签为不合适
+        return {
+            "appropriate_tags": [],
+            "inappropriate_tags": initial_tags,
+            "reasons": {},
+            "parse_error": str(e)
+        }
+
+
+async def recommend_tags_from_conversation_with_ai(conversation_text: str, exclude_tags: list = None) -> dict:
+    """
+    第二层AI分析：深入分析对话内容，推荐合适的标签
+
+    返回：{
+        "recommended_tags": ["标签1", "标签2"],
+        "reasons": {"标签1": "推荐理由1", "标签2": "推荐理由2"}
+    }
+    LLM调用失败时额外返回 "llm_error"
+    """
+    exclude_tags = exclude_tags or []
+    print(f"🔍 [第二层AI] 开始分析对话内容，排除标签: {exclude_tags}")
+
+    # 构建标签定义（已排除的标签不再列出定义，缩短提示词）
+    all_tags_str = "\n".join([
+        f"- {tag}: {TAG_DEFINITIONS[tag]}"
+        for tag in TAG_DEFINITIONS.keys()
+        if tag not in exclude_tags
+    ])
+
+    exclude_tags_str = ", ".join(exclude_tags) if exclude_tags else "无"
+
+    prompt = f"""你是一个专业的货运对话标注专家。请深入分析以下司机与货主的对话内容，推荐合适的标签。
+
+## 对话内容：
+{conversation_text}
+
+## 所有可用的标准化标签及其定义：
+{all_tags_str}
+
+## 已排除的标签（不需要再次推荐）：
+{exclude_tags_str}
+
+## 你的任务：
+根据对话内容，从上述标签列表中选择合适的标签。优先选择明确提及的特征。
+
+## 标签选择标准：
+1. 对话中明确提到的特征（如车型、尺寸、费用等）
+2. 双方达成一致的要求或约定
+3. 司机或货主明确表示的限制或条件
+4. 不要选择对话中未提及的标签
+
+## 输出格式（严格按照JSON格式输出）：
+{{
+    "recommended_tags": ["标签1", "标签2", "标签3"],
+    "reasons": {{
+        "标签1": "对话中司机明确说xxx，符合该标签定义",
+        "标签2": "货主要求xxx，司机同意，符合标签定义"
+    }}
+}}
+
+请只输出JSON，不要输出其他内容。"""
+
+    result = await call_glm_api(prompt, max_tokens=2000)
+
+    if not result.get("success"):
+        print(f"❌ [第二层AI] AI调用失败: {result.get('error')}")
+        return {"recommended_tags": [], "reasons": {}, "llm_error": result.get("error")}
+
+    try:
+        content = result["content"]
+
+        # 提取JSON部分
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        recommendation = json.loads(content)
+        recommended = recommendation.get("recommended_tags", [])
+        reasons = recommendation.get("reasons", {})
+
+        print(f"✅ [第二层AI] 分析完成，推荐了 {len(recommended)} 个标签: {recommended}")
+
+        return {
+            "recommended_tags": recommended,
+            "reasons": reasons
+        }
+    except Exception as e:
+        print(f"❌ [第二层AI] JSON解析失败: {str(e)}")
+        return {"recommended_tags": [], "reasons": {}, "parse_error": str(e)}
+
+
+def _lookup_conversation_batches(conversation_ids: List[int]) -> Dict[int, Optional[str]]:
+    """
+    一次查询多条对话所属导入批次的文件名
+
+    Args:
+        conversation_ids: 对话ID列表
+
+    Returns:
+        {对话ID: 批次文件名}，只包含有批次的对话；批次记录已不存在时文件名为 None
+    """
+    from app.models.import_batch import ImportBatch
+
+    if not conversation_ids:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(Conversation.id, ImportBatch.file_name).outerjoin(
+            ImportBatch, ImportBatch.id == Conversation.batch_id
+        ).filter(
+            Conversation.id.in_(conversation_ids),
+            Conversation.batch_id.isnot(None)
+        ).all()
+    finally:
+        db.close()
+    return {row.id: row.file_name for row in rows}
+
+
+def _search_similar_for_analysis(text: str) -> Tuple[dict, Dict[int, Optional[str]]]:
+    """第三层的同步部分：检索相似对话并查询其批次（在线程池中执行）"""
+    rag_result = get_rag_recommender().recommend_tags(
+        conversation_text=text,
+        top_k=10,
+        min_similarity=0.3
+    )
+    conversation_ids = [conv.get("conversation_id") for conv in rag_result.get("similar_conversations", [])]
+    return rag_result, _lookup_conversation_batches(conversation_ids)
+
+
+async def search_similar_conversations_for_analysis(text: str) -> Tuple[dict, Dict[int, Optional[str]]]:
+    """
+    第三层：检索历史相似对话（在线程池中执行，不阻塞事件循环）
+
+    返回：(推荐结果, {相似对话ID: 批次文件名})
+    """
+    # 模型预热未完成时跳过本层，不让请求等待模型加载
+    if not is_rag_ready():
+        start_background_warmup()
+        print("⚠️ [第三层] 推荐模型预热中，跳过历史相似对话")
+        return {"success": False, "similar_conversations": []}, {}
+
+    try:
+        return await run_in_threadpool(_search_similar_for_analysis, text)
+    except Exception as e:
+        print(f"❌ [第三层] 历史相似对话检索失败: {str(e)}")
+        return {"success": False, "similar_conversations": []}, {}
+
+
+async def _skipped_conversation_analysis() -> dict:
+    """规则或质心模型完整覆盖对话时代替第二层AI分析"""
+    return {"recommended_tags": [], "reasons": {}}
+
+
+def _rule_reason(rule_result: dict, tag: str) -> str:
+    """规则匹配的理由：抽取到的数值，否则为匹配的原文"""
+    return "、".join(rule_result["values"].get(tag) or rule_result["evidence"].get(tag, [])[:2])
+
+
+def _rule_decided_driver_tags(rule_result: dict, driver_tags: List[str]) -> List[str]:
+    """
+    由规则代替第一层判定的初始标签
+
+    规则结果有矛盾或带否定词但含义不确定的表述时不代替，初始标签照常交给第一层验证
+    """
+    if rule_result["conflicts"] or rule_result["uncertain"]:
+        return []
+    decided = set(rule_result["decided_tags"])
+    return [tag for tag in driver_tags if tag in decided]
+
+
+def _extract_rules(text: str) -> dict:
+    """规则抽取（TAG_RULES_ENABLED 关闭时返回空结果）"""
+    if not settings.TAG_RULES_ENABLED:
+        return {
+            "tags": [], "values": {}, "evidence": {}, "decided_tags": [], "conflicts": [],
+            "questions": [], "uncertain": [], "uncovered_cues": [], "fully_covered": False
+        }
+    return extract_rule_tags(text)
+
+
+def _skips_conversation_llm(rule_result: dict) -> bool:
+    """规则完整覆盖对话时跳过第二层"""
+    return rule_result["fully_covered"] and settings.TAG_RULES_SKIP_LLM
+
+
+def estimate_llm_calls(text: str, driver_tags: List[str]) -> int:
+    """
+    run_ai_analysis 将发起的LLM调用次数
+
+    按规则抽取结果计算：仍有初始标签需要验证时调用第一层，规则未完整覆盖对话时调用第二层。
+    质心模型跳过第二层或命中响应缓存时实际调用更少
+    """
+    rule_result = _extract_rules(text)
+    rule_initial = set(_rule_decided_driver_tags(rule_result, driver_tags))
+    calls = 1 if any(tag not in rule_initial for tag in driver_tags) else 0
+    if not _skips_conversation_llm(rule_result):
+        calls += 1
+    return calls
+
+
+async def run_ai_analysis(text: str, driver_tags: List[str]) -> dict:
+    """
+    执行三层AI分析（三层并发执行）
+
+    标签质心模型置信度达到 TAG_CENTROID_SKIP_LLM_CONFIDENCE 且没有阈值附近的不确定标签时
+    跳过第二层，采用其判定结果（初始标签仍由第一层验证）；
+    规则抽取已判定的标签不再交给LLM，规则完整覆盖对话时跳过第二层
+
+    Args:
+        text: 对话文本
+        driver_tags: 初始AI标签
+
+    Returns:
+        智能分析结果；"llm_errors" 记录调用失败的LLM层 {层: 错误信息}
+    """
+    # ========== 快速通道：规则抽取数值类和明确表述类标签（不调用LLM） ==========
+    rule_result = _extract_rules(text)
+    rule_tags = rule_result["tags"]
+    rule_decided = set(rule_result["decided_tags"])
+    rule_initial = set(_rule_decided_driver_tags(rule_result, driver_tags))
+    skip_conversation_llm = _skips_conversation_llm(rule_result)
+
+    # ========== 快速通道：标签质心模型（不调用LLM） ==========
+    # 置信度足够高且没有阈值附近的不确定标签时跳过第二层；初始标签仍由第一层验证
+    centroid_result = {"success": False, "recommendations": [], "confidence": 0.0}
+    if settings.TAG_CENTROID_ENABLED and is_rag_ready():
+        centroid_result = await run_in_threadpool(
+            get_rag_recommender().recommend_tags_by_centroid, text
+        )
+    centroid_covers = bool(
+        centroid_result.get("success")
+        and centroid_result.get("recommendations")
+        and not centroid_result.get("uncertain_tags")
+        and centroid_result.get("confidence", 0.0) >= settings.TAG_CENTROID_SKIP_LLM_CONFIDENCE
+    )
+    if centroid_covers and not skip_conversation_llm:
+        print(f"⚡ [质心模型] 置信度 {centroid_result['confidence']}，跳过第二层AI: {centroid_result['recommendations']}")
+    elif skip_conversation_llm:
+        print(f"⚡ [规则抽取] 规则完整覆盖对话，跳过第二层AI: {rule_tags}")
+
+    # 三层并发执行：第一层验证初始标签、第二层分析对话内容、第三层检索历史相似对话
+    # 第二层不再等待第一层的结论，结束后再去掉第一层已确认合适的标签
+    # 规则可代替第一层判定的初始标签不交给第一层；第二层提示词去掉规则已判定的标签，规则或质心模型完整覆盖时不调用
+    initial_analysis, conversation_analysis, (rag_result, similar_batches) = await asyncio.gather(
+        analyze_initial_tags_with_ai(text, [tag for tag in driver_tags if tag not in rule_initial]),
+        _skipped_conversation_analysis() if skip_conversation_llm or centroid_covers else
+        recommend_tags_from_conversation_with_ai(text, rule_result["decided_tags"]),
+        search_similar_conversations_for_analysis(text)
+    )
+    confirmed = set(initial_analysis.get("appropriate_tags", [])) | rule_decided
+    conversation_analysis["recommended_tags"] = [
+        tag for tag in conversation_analysis.get("recommended_tags", []) if tag not in confirmed
+    ]
+    conversation_analysis["reasons"] = {
+        tag: reason for tag, reason in conversation_analysis.get("reasons", {}).items() if tag not in confirmed
+    }
+
+    # 规则对初始标签的结论并入第一层
+    for tag in driver_tags:
+        if tag not in rule_initial:
+            continue
+        if tag in rule_tags:
+            initial_analysis.setdefault("appropriate_tags", []).append(tag)
+            initial_analysis.setdefault("reasons", {})[tag] = f"规则匹配: {_rule_reason(rule_result, tag)}"
+        else:
+            initial_analysis.setdefault("inappropriate_tags", []).append(tag)
+            initial_analysis.setdefault("reasons", {})[tag] = "规则判定与该标签相反"
+
+    centroid_tags = centroid_result.get("recommendations", []) if centroid_result.get("success") else []
+    # 质心模型的结论与规则相反时以规则为准
+    centroid_tags = [tag for tag in centroid_tags if tag not in rule_decided or tag in rule_tags]
+    llm_errors = {
+        layer: analysis["llm_error"]
+        for layer, analysis in (("initial", initial_analysis), ("conversation", conversation_analysis))
+        if analysis.get("llm_error")
+    }
+
+    # ========== 第三层：参考历史相似对话 ==========
+    rag_tags_with_reason = {}
+
+    if rag_result.get("success") and rag_result.get("similar_conversations"):
+        # 排除前两层已推荐的标签
+        existing_tags = set(initial_analysis.get("appropriate_tags", [])) | \
+                       set(conversation_analysis.get("recommended_tags", [])) | \
+                       set(centroid_tags) | rule_decided
+
+        for conv in rag_result["similar_conversations"]:
+            conv_id = conv.get("conversation_id")
+            similarity = conv.get("similarity", 0)
+
+            # 只参考有导入批次的对话
+            if conv_id not in similar_batches or not conv.get("tags"):
+                continue
+            file_name = similar_batches[conv_id]
+
+            for tag in conv["tags"]:
+                # 只推荐尚未推荐的标签
+                if tag not in existing_tags and tag in TAG_DEFINITIONS:
+                    if tag not in rag_tags_with_reason:
+                        rag_tags_with_reason[tag] = []
+
+                    reason = f"相似度{round(similarity*100)}%"
+                    if file_name:
+                        reason += f" - 来自批次: {file_name}"
+                    reason += f" (对话#{conv_id})"
+
+                    rag_tags_with_reason[tag].append({
+                        "reason": reason,
+                        "similarity": similarity,
+                        "conversation_id": conv_id,
+                        "file_name": file_name or "未知",
+                        "conversation_snippet": conv.get("text", "")[:100] + "..."
+                    })
+                    existing_tags.add(tag)  # 避免重复添加
+
+    # ========== 合并三层推荐结果 ==========
+    all_recommendations = {}
+    tag_details = {}
+
+    # 第一层：验证合适的初始AI标签（最高优先级）
+    for tag in initial_analysis.get("appropriate_tags", []):
+        reason = initial_analysis.get("reasons", {}).get(tag, "初始AI推荐，AI验证合适")
+        all_recommendations[tag] = {
+            "score": 10,
+            "source": "initial_ai_verified",
+            "reason": f"✓ {reason}"
+        }
+        tag_details[tag] = all_recommendations[tag]
+
+    # 规则抽取：数值类和明确表述类标签
+    for tag in rule_tags:
+        if tag in all_recommendations:
+            continue
+        all_recommendations[tag] = {
+            "score": 9,
+            "source": "tag_rules",
+            "reason": f"规则匹配: {_rule_reason(rule_result, tag)}"
+        }
+        tag_details[tag] = all_recommendations[tag]
+
+    # 第二层：从对话内容AI推荐的标签
+    for tag in conversation_analysis.get("recommended_tags", []):
+        reason = conversation_analysis.get("reasons", {}).get(tag, "AI从对话内容分析推荐")
+        all_recommendations[tag] = {
+            "score": 8,
+            "source": "conversation_ai",
+            "reason": reason
+        }
+        tag_details[tag] = all_recommendations[tag]
+
+    # 质心模型：代替第二层时作为主要来源，否则作为补充（不覆盖LLM的结论）
+    for tag in centroid_tags:
+        if tag in all_recommendations:
+            continue
+        all_recommendations[tag] = {
+            "score": 9 if centroid_covers else 6,
+            "source": "tag_centroid",
+            "reason": f"标签质心模型判定（得分 {centroid_result['tag_scores'].get(tag)}）"
+        }
+        tag_details[tag] = all_recommendations[tag]
+
+    # 第三层：历史相似对话推荐
+    for tag, reasons_list in rag_tags_with_reason.items():
+        if reasons_list and isinstance(reasons_list, list):
+            all_recommendations[tag] = {
+                "score": 5,
+                "source": "historical_similar",
+                "reason": reasons_list[0]["reason"]
+            }
+            tag_details[tag] = all_recommendations[tag]
+
+    # 按权重排序
+    sorted_recommendations = sorted(
+        all_recommendations.items(),
+        key=lambda x: x[1]["score"],
+        reverse=True
+    )
+
+    final_tags = [tag for tag, details in sorted_recommendations]
+
+    # ========== 智能自动选择逻辑 ==========
+    auto_select_tags = []
+    appropriate_initial_tags = initial_analysis.get("appropriate_tags", [])
+
+    if centroid_covers:
+        auto_select_tags = list(dict.fromkeys(appropriate_initial_tags + centroid_tags))
+        print(f"✅ [自动选择] 使用验证合适的初始标签和质心模型判定的标签: {auto_select_tags}")
+    elif appropriate_initial_tags:
+        # 如果有验证合适的初始AI标签，自动选中这些
+        auto_select_tags = appropriate_initial_tags
+        print(f"✅ [自动选择] 使用验证合适的初始标签: {auto_select_tags}")
+    else:
+        # 如果初始AI标签都不合适，使用第二层AI推荐的标签
+        recommended_conversation_tags = conversation_analysis.get("recommended_tags", [])
+        if recommended_conversation_tags:
+            auto_select_tags = recommended_conversation_tags
+            print(f"✅ [自动选择] 初始标签不合适，使用第二层AI推荐: {auto_select_tags}")
+        else:
+            print("⚠️ [自动选择] 没有可自动选择的标签")
+
+    # 规则抽取的标签精确度高，始终自动选中
+    auto_select_tags = list(dict.fromkeys(rule_tags + auto_select_tags))
+
+    # 构建相似对话详细信息
+    similar_convs_details = []
+    for tag, reasons_list in rag_tags_with_reason.items():
+        if reasons_list and isinstance(reasons_list, list):
+            similar_convs_details.extend(reasons_list[:1])
+
+    print(f"📊 [最终结果] 总共推荐 {len(final_tags)} 个标签，自动选择 {len(auto_select_tags)} 个")
+
+    # 构建响应
+    return {
+        "success": True,
+        "recommendations": final_tags,
+        "tag_details": tag_details,
+        "auto_select_tags": auto_select_tags,  # 新增：自动选择的标签
+        "confidence": min(0.98, 0.7 + len(final_tags) * 0.03),
+        "message": (f"规则抽取({len(rule_tags)}个) + " if rule_tags else "") + (
+            f"验证初始标签({len(initial_analysis.get('appropriate_tags', []))}个合适) + 质心模型快速判定({len(centroid_tags)}个，置信度{centroid_result['confidence']}，已跳过对话内容分析) + 历史相似({len(rag_tags_with_reason)}个)"
+            if centroid_covers else
+            f"三层AI分析：验证初始标签({len(initial_analysis.get('appropriate_tags', []))}个合适) + 对话内容分析({len(conversation_analysis.get('recommended_tags', []))}个) + 历史相似({len(rag_tags_with_reason)}个)"
+        ),
+        "similar_conversations": similar_convs_details[:5],
+        "initial_ai_tags": driver_tags,
+        "initial_ai_analysis": {
+            "appropriate": initial_analysis.get("appropriate_tags", []),
+            "inappropriate": initial_analysis.get("inappropriate_tags", []),
+            "reasons": initial_analysis.get("reasons", {})
+        },
+        "conversation_analysis": {
+            "recommended": conversation_analysis.get("recommended_tags", []),
+            "reasons": conversation_analysis.get("reasons", {})
+        },
+        "centroid_analysis": {
+            "recommended": centroid_tags,
+            "tag_scores": centroid_result.get("tag_scores", {}),
+            "confidence": centroid_result.get("confidence", 0.0),
+            "uncertain": centroid_result.get("uncertain_tags", []),
+            "conversation_llm_skipped": centroid_covers
+        },
+        "rule_analysis": {
+            "recommended": rule_tags,
+            "values": rule_result["values"],
+            "evidence": rule_result["evidence"],
+            "fully_covered": rule_result["fully_covered"],
+            "uncovered_cues": rule_result["uncovered_cues"],
+            "questions": rule_result["questions"],
+            "uncertain": rule_result["uncertain"],
+            "conflicts": rule_result["conflicts"],
+            "conversation_llm_skipped": skip_conversation_llm
+        },
+        "llm_errors": llm_errors
+    }
+
+
+def analysis_fingerprint(text: str, driver_tags: List[str]) -> str:
+    """预分析结果的有效性指纹：对话文本、初始标签或标签定义变化后失效"""
+    payload = json.dumps(
+        [definitions_fingerprint(), text, driver_tags], ensure_ascii=False
+    ).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def save_preanalysis(conversation_id: int, driver_tags: List[str], fingerprint: str, result: dict) -> None:
+    """
+    保存预分析结果（替换该对话之前的预分析记录）
+
+    Args:
+        conversation_id: 对话ID
+        driver_tags: 分析时的初始AI标签
+        fingerprint: analysis_fingerprint 计算的指纹
+        result: run_ai_analysis 的结果
+    """
+    db = SessionLocal()
+    try:
+        db.query(AIPreanalysis).filter(
+            AIPreanalysis.conv_id == conversation_id
+        ).delete(synchronize_session=False)
+        db.add(AIPreanalysis(
+            conv_id=conversation_id,
+            fingerprint=fingerprint,
+            driver_tags=json.dumps(driver_tags, ensure_ascii=False),
+            confidence=result.get("confidence"),
+            result=json.dumps(result, ensure_ascii=False)
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_preanalysis(conversation_id: int, text: str, driver_tags: List[str]) -> Optional[dict]:
+    """
+    读取仍然有效的预分析结果
+
+    Returns:
+        智能分析结果（带 precomputed/precomputed_at 字段），没有或已失效返回None
+    """
+    db = SessionLocal()
+    try:
+        stored = db.query(AIPreanalysis).filter(
+            AIPreanalysis.conv_id == conversation_id
+        ).first()
+    finally:
+        db.close()
+    if not stored or stored.fingerprint != analysis_fingerprint(text, driver_tags):
+        return None
+
+    try:
+        result = json.loads(stored.result)
+    except ValueError:
+        return None
+    result["precomputed"] = True
+    result["precomputed_at"] = stored.created_at.isoformat() if stored.created_at else None
+    return result
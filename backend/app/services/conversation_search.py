@@ -0,0 +1,247 @@
+"""
+对话全文检索 - SQLite FTS5（trigram分词）
+
+conversations_fts 是 conversations.raw_text 的外部内容（external content）索引，
+由触发器随插入/删除/修改原文自动同步，只修改审核状态不会触碰索引。
+trigram 分词按连续3个字符建索引，适合不分词的中文；少于3个字符的关键词无法走索引，
+改用 LIKE 在过滤后的结果上匹配。
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+FTS_TABLE = "conversations_fts"
+
+# 片段高亮标记与长度
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_CHARS = 32
+
+FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        raw_text,
+        content='conversations',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, raw_text) VALUES (new.id, new.raw_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, raw_text) VALUES ('delete', old.id, old.raw_text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE OF raw_text ON conversations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, raw_text) VALUES ('delete', old.id, old.raw_text);
+        INSERT INTO {FTS_TABLE}(rowid, raw_text) VALUES (new.id, new.raw_text);
+    END
+    """,
+]
+
+
+def ensure_fts_index(connection, rebuild: bool = False) -> bool:
+    """
+    创建全文索引表和同步触发器（已存在时跳过）
+
+    Args:
+        connection: SQLAlchemy 连接（调用方负责提交）
+        rebuild: 是否从 conversations 表重建索引内容（回填已有数据）
+
+    Returns:
+        索引表是否为本次新建
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first() is not None
+
+    for statement in FTS_DDL:
+        connection.execute(text(statement))
+
+    if rebuild or not exists:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+    return not exists
+
+
+def fts_index_exists(db: Session) -> bool:
+    """全文索引表是否存在"""
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE}
+    ).first() is not None
+
+
+def encode_cursor(score: Optional[float], conversation_id: int) -> str:
+    """把 (排名分数, 对话ID) 编码为不透明的游标"""
+    payload = json.dumps({"s": score, "i": conversation_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[float], int]:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        score = payload["s"]
+        return (float(score) if score is not None else None), int(payload["i"])
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def _split_terms(query: str) -> Tuple[List[str], List[str]]:
+    """
+    拆分关键词
+
+    Returns:
+        (可以走trigram索引的关键词, 少于3个字符、需要LIKE匹配的关键词)
+    """
+    terms = [term for term in query.split() if term]
+    return [term for term in terms if len(term) >= 3], [term for term in terms if len(term) < 3]
+
+
+def _fts_query(terms: List[str]) -> str:
+    """构造FTS5查询：每个关键词作为短语（转义双引号），多个关键词为AND"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _make_snippet(raw_text: str, terms: List[str]) -> str:
+    """LIKE 路径的片段：第一个命中关键词前后各截取一段并高亮"""
+    for term in terms:
+        position = raw_text.find(term)
+        if position >= 0:
+            start = max(0, position - SNIPPET_CHARS)
+            end = min(len(raw_text), position + len(term) + SNIPPET_CHARS)
+            return (
+                ("…" if start > 0 else "")
+                + raw_text[start:position]
+                + SNIPPET_OPEN + term + SNIPPET_CLOSE
+                + raw_text[position + len(term):end]
+                + ("…" if end < len(raw_text) else "")
+            )
+    return raw_text[:SNIPPET_CHARS * 2] + ("…" if len(raw_text) > SNIPPET_CHARS * 2 else "")
+
+
+def search_conversations(
+    db: Session,
+    query: str,
+    status: Optional[str] = None,
+    batch_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    全文检索对话
+
+    有3个字符以上的关键词时走FTS5索引，按 bm25 排名（越小越相关）+ 对话ID 做键集分页；
+    全部关键词都少于3个字符时退化为按对话ID分页的 LIKE 扫描。
+
+    Args:
+        db: 数据库会话
+        query: 关键词（空格分隔，全部命中）
+        status: 状态过滤
+        batch_id: 批次ID过滤
+        limit: 每页数量
+        cursor: 上一页返回的游标
+
+    Returns:
+        {items, next_cursor, mode}
+
+    Raises:
+        ValueError: 关键词为空或游标无效
+    """
+    fts_terms, like_terms = _split_terms(query)
+    if not fts_terms and not like_terms:
+        raise ValueError("搜索关键词不能为空")
+
+    after_score, after_id = decode_cursor(cursor) if cursor else (None, None)
+
+    filters = []
+    params: Dict[str, Any] = {"limit": limit + 1}
+    if status:
+        filters.append("c.status = :status")
+        params["status"] = status
+    if batch_id is not None:
+        filters.append("c.batch_id = :batch_id")
+        params["batch_id"] = batch_id
+    for i, term in enumerate(like_terms):
+        filters.append(f"c.raw_text LIKE :like_{i} ESCAPE '\\'")
+        params[f"like_{i}"] = f"%{_escape_like(term)}%"
+
+    if fts_terms:
+        mode = "fts"
+        params["match"] = _fts_query(fts_terms)
+        inner_where = " AND ".join([f"{FTS_TABLE} MATCH :match"] + filters)
+        page_filter = ""
+        if after_id is not None:
+            page_filter = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+            params["after_score"] = after_score if after_score is not None else float("-inf")
+            params["after_id"] = after_id
+        sql = f"""
+            SELECT * FROM (
+                SELECT c.id AS id, c.status AS status, c.batch_id AS batch_id,
+                       c.manual_tag AS manual_tag,
+                       bm25({FTS_TABLE}) AS score,
+                       snippet({FTS_TABLE}, 0, :open, :close, '…', :tokens) AS snippet
+                FROM {FTS_TABLE}
+                JOIN conversations c ON c.id = {FTS_TABLE}.rowid
+                WHERE {inner_where}
+            )
+            {page_filter}
+            ORDER BY score, id
+            LIMIT :limit
+        """
+        params.update({"open": SNIPPET_OPEN, "close": SNIPPET_CLOSE, "tokens": SNIPPET_CHARS})
+    else:
+        mode = "like"
+        if after_id is not None:
+            filters.append("c.id > :after_id")
+            params["after_id"] = after_id
+        sql = f"""
+            SELECT c.id AS id, c.status AS status, c.batch_id AS batch_id,
+                   c.manual_tag AS manual_tag, NULL AS score, c.raw_text AS snippet
+            FROM conversations c
+            WHERE {" AND ".join(filters)}
+            ORDER BY c.id
+            LIMIT :limit
+        """
+
+    rows = db.execute(text(sql), params).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        snippet = row["snippet"] if mode == "fts" else _make_snippet(row["snippet"] or "", like_terms)
+        items.append({
+            "id": row["id"],
+            "status": row["status"],
+            "batch_id": row["batch_id"],
+            "manual_tag": row["manual_tag"],
+            "score": row["score"],
+            "snippet": snippet
+        })
+
+    next_cursor = None
+    if has_more and items:
+        next_cursor = encode_cursor(items[-1]["score"], items[-1]["id"])
+
+    return {"items": items, "next_cursor": next_cursor, "mode": mode}
@@ -0,0 +1,227 @@
+"""
+LLM响应缓存 - SQLite持久化，带有效期和容量淘汰
+
+智能分析的提示词对同一段对话、同一组标签和同一份标签定义是确定的，
+缓存键为 (模型, 温度, 最大长度, 提示词) 的SHA-256摘要，重新打开或刷新页面后重试
+直接返回上次的结果。每行记录标签定义指纹，定义变化后旧记录在启动时整体清除。
+读写都是同步的SQLite操作，异步代码中应放到线程池执行；命中时的访问时间先记在内存中，
+攒够一批或写入时再批量更新，条数在内存中计数，写入时不需要 COUNT(*)。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.tag_definitions import TAG_DEFINITIONS
+
+
+ACCESS_FLUSH_SIZE = 64  # 攒够多少条命中记录后批量更新访问时间
+
+
+def definitions_fingerprint() -> str:
+    """标签定义指纹：TAG_DEFINITIONS 任意改动都会改变该值"""
+    payload = json.dumps(TAG_DEFINITIONS, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def make_llm_cache_key(model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """生成缓存键"""
+    payload = f"{model}\x00{temperature:.4f}\x00{max_tokens}\x00{prompt}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM响应缓存（线程安全）"""
+
+    def __init__(self, db_path: str, ttl_seconds: float, max_items: int):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite文件路径
+            ttl_seconds: 有效期（秒），<=0 表示不过期
+            max_items: 最多保留的条数，超出时淘汰最久未使用的记录
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self.fingerprint = definitions_fingerprint()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.writes = 0
+        self._pending_access: Dict[str, float] = {}  # 尚未写入的访问时间 {缓存键: 时间}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                definitions TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+
+        # 标签定义已变化：提示词不同，旧记录不会再命中，直接清除
+        stale = self._conn.execute(
+            "DELETE FROM llm_cache WHERE definitions != ?", (self.fingerprint,)
+        ).rowcount
+        self._conn.commit()
+        if stale:
+            print(f"🧹 [LLM缓存] 标签定义已变化，清除 {stale} 条旧记录")
+        self._items = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def _flush_access(self) -> None:
+        """批量写入命中的访问时间（调用方持有锁，不提交）"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的响应内容，未命中或已过期返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            content, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._pending_access.pop(key, None)
+                self._items -= 1
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._pending_access[key] = now
+            if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+            return content
+
+    def put(self, key: str, model: str, content: str) -> None:
+        """
+        写入缓存并按容量淘汰
+
+        Args:
+            key: 缓存键
+            model: 模型名称
+            content: 响应内容
+        """
+        now = time.time()
+        with self._lock:
+            # 淘汰前先写入命中的访问时间，保证按最近使用顺序淘汰
+            self._flush_access()
+            exists = self._conn.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, definitions, content, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, self.fingerprint, content, now, now)
+            )
+            self.writes += 1
+            if not exists:
+                self._items += 1
+
+            overflow = self._items - self.max_items
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+                self._items -= evicted
+                self.evictions += evicted
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """删除所有过期记录，返回删除条数"""
+        if self.ttl_seconds <= 0:
+            return 0
+        with self._lock:
+            self._flush_access()
+            removed = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            self._conn.commit()
+            self._items -= removed
+            self.expired += removed
+            return removed
+
+    def clear(self) -> int:
+        """清空缓存，返回删除条数"""
+        with self._lock:
+            self._pending_access.clear()
+            removed = self._conn.execute("DELETE FROM llm_cache").rowcount
+            self._conn.commit()
+            self._items = 0
+            return removed
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": self._items,
+                "max_items": self.max_items,
+                "ttl_seconds": self.ttl_seconds,
+                "definitions_fingerprint": self.fingerprint,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "writes": self.writes
+            }
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    """获取LLM响应缓存单例，未启用时返回None"""
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED or not settings.LLM_CACHE_PATH:
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(
+                    db_path=settings.LLM_CACHE_PATH,
+                    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                    max_items=settings.LLM_CACHE_MAX_ITEMS
+                )
+    return _llm_cache
@@ -0,0 +1,184 @@
+"""
+LLM调用客户端 - 应用生命周期内共享的HTTP连接池
+
+所有GLM调用共用一个 httpx.AsyncClient：keep-alive 复用TCP/TLS连接，连接数上限
+防止并发分析压垮上游，超时按连接/读取/写入/等待连接池四个阶段分别配置。
+客户端在 FastAPI lifespan 中创建和关闭；没有 lifespan 的场景（脚本）首次调用时自动创建。
+成功的响应写入 LLM响应缓存（app/services/llm_cache.py），相同提示词并发到达时只请求一次；
+缓存的SQLite读写在线程池中执行，不阻塞事件循环。
+"""
+import asyncio
+import os
+from typing import Dict, Optional
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services.llm_cache import get_llm_response_cache, make_llm_cache_key
+
+
+GLM_TEMPERATURE = 0.3
+
+_client: Optional[httpx.AsyncClient] = None
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+
+def _create_client() -> httpx.AsyncClient:
+    """按配置创建客户端（未安装 h2 时 HTTP/2 退回 HTTP/1.1）"""
+    http2 = settings.GLM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️ [LLM客户端] 未安装 h2（pip install httpx[http2]），退回 HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        base_url=settings.GLM_API_BASE_URL,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.GLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.GLM_CONNECT_TIMEOUT,
+            read=settings.GLM_READ_TIMEOUT,
+            write=settings.GLM_WRITE_TIMEOUT,
+            pool=settings.GLM_POOL_TIMEOUT
+        )
+    )
+
+
+async def start_llm_client() -> None:
+    """创建共享客户端并打开响应缓存（在 lifespan 启动阶段调用）"""
+    global _client
+    await run_in_threadpool(get_llm_response_cache)
+    if _client is None:
+        _client = _create_client()
+        print(f"✅ [LLM客户端] 已创建连接池: {settings.GLM_API_BASE_URL}"
+              f"（最大连接 {settings.GLM_MAX_CONNECTIONS}，保持连接 {settings.GLM_MAX_KEEPALIVE_CONNECTIONS}）")
+
+
+async def close_llm_client() -> None:
+    """关闭共享客户端，释放保持的连接（在 lifespan 关闭阶段调用）"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+        print("🔌 [LLM客户端] 连接池已关闭")
+
+
+def get_glm_api_key() -> Optional[str]:
+    """GLM API Key（优先使用配置，其次环境变量 GLM_API_KEY / ZHIPU_API_KEY），未配置返回None"""
+    return settings.GLM_API_KEY or os.getenv("GLM_API_KEY") or os.getenv("ZHIPU_API_KEY")
+
+
+def get_llm_client() -> httpx.AsyncClient:
+    """
+    获取共享客户端（未创建时自动创建）
+
+    连接绑定在创建它的事件循环上，同一客户端只能在一个事件循环中使用。
+    """
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+async def call_glm_api(prompt: str, max_tokens: int = 2000, temperature: float = GLM_TEMPERATURE,
+                       use_cache: bool = True) -> dict:
+    """
+    调用智谱GLM API进行AI分析（优先读取响应缓存）
+
+    Args:
+        prompt: 提示词
+        max_tokens: 最大生成长度
+        temperature: 采样温度
+        use_cache: 是否读写响应缓存
+
+    Returns:
+        {"success": True, "content": ..., "cached": bool} 或 {"success": False, "error": ...}
+    """
+    cache = get_llm_response_cache() if use_cache else None
+    if cache is None:
+        return await _request_glm(prompt, max_tokens, temperature)
+
+    key = make_llm_cache_key(settings.GLM_MODEL, prompt, temperature, max_tokens)
+    content = await run_in_threadpool(cache.get, key)
+    if content is not None:
+        print(f"⚡ [AI调用] 命中响应缓存，内容长度: {len(content)}字符")
+        return {"success": True, "content": content, "cached": True}
+
+    # 相同提示词的请求正在进行（如刷新页面后重试）：等待同一个结果
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_request_and_store(key, prompt, max_tokens, temperature))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        print("🔁 [AI调用] 复用进行中的相同请求")
+    return await asyncio.shield(task)
+
+
+async def _request_and_store(key: str, prompt: str, max_tokens: int, temperature: float) -> dict:
+    """请求GLM并缓存成功的响应（空响应不缓存）"""
+    result = await _request_glm(prompt, max_tokens, temperature)
+    if result["success"] and result["content"]:
+        cache = get_llm_response_cache()
+        if cache is not None:
+            await run_in_threadpool(cache.put, key, settings.GLM_MODEL, result["content"])
+    return result
+
+
+async def _request_glm(prompt: str, max_tokens: int, temperature: float) -> dict:
+    """通过共享客户端请求GLM（不经过缓存）"""
+    api_key = get_glm_api_key()
+    if not api_key:
+        print("❌ [AI调用] 未配置GLM_API_KEY")
+        return {"success": False, "error": "未配置GLM_API_KEY"}
+
+    print(f"✅ [AI调用] 准备调用GLM API，prompt长度: {len(prompt)}字符")
+
+    try:
+        response = await get_llm_client().post(
+            "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": settings.GLM_MODEL,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+        )
+
+        print(f"📡 [AI调用] API响应状态码: {response.status_code}")
+
+        if response.status_code == 200:
+            data = response.json()
+            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            print(f"✅ [AI调用] 成功获取AI响应，内容长度: {len(content)}字符")
+            print(f"📄 [AI响应] 前200字符: {content[:200]}...")
+            return {"success": True, "content": content, "cached": False}
+        else:
+            error_msg = f"API调用失败: {response.status_code} - {response.text}"
+            print(f"❌ [AI调用] {error_msg}")
+            return {
+                "success": False,
+                "error": error_msg
+            }
+    except httpx.TimeoutException as e:
+        print(f"❌ [AI调用] 超时（{type(e).__name__}）: {str(e)}")
+        return {"success": False, "error": f"调用超时: {type(e).__name__}"}
+    except Exception as e:
+        print(f"❌ [AI调用] 异常: {str(e)}")
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,281 @@
+"""
+后台批量AI预分析 - 逐批次对待审核对话执行三层AI分析并保存结果
+
+审核页面打开对话时直接读取预分析结果（见 app/services/ai_analysis.py），不再等待GLM。
+任务在服务的事件循环中运行：固定数量的worker并发分析，令牌桶限制LLM请求速率，
+LLM调用失败时指数退避重试；可暂停，再次启动时跳过已有有效结果的对话继续执行。
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.ai_analysis import (
+    analysis_fingerprint,
+    estimate_llm_calls,
+    get_preanalysis,
+    load_conversation_for_analysis,
+    run_ai_analysis,
+    save_preanalysis,
+)
+from app.services.llm_client import get_glm_api_key
+
+
+class TokenBucket:
+    """异步令牌桶：平均速率 rate 个/秒，最多积攒 capacity 个"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """取出令牌，不足时等待；rate<=0 表示不限速"""
+        if self.rate <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """第 attempt 次重试前的等待时间：指数退避 + 随机抖动"""
+    delay = min(maximum, base * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+def list_pending_conversation_ids(batch_id: int) -> List[int]:
+    """批次中待审核的对话ID"""
+    db = SessionLocal()
+    try:
+        rows = db.query(Conversation.id).filter(
+            Conversation.batch_id == batch_id,
+            Conversation.status == 'pending'
+        ).order_by(Conversation.id).all()
+    finally:
+        db.close()
+    return [row.id for row in rows]
+
+
+class PreanalysisJob:
+    """单个批次的预分析任务"""
+
+    def __init__(self, batch_id: int):
+        self.batch_id = batch_id
+        self.status = "pending"  # pending / running / pausing / paused / completed / failed
+        self.total = 0
+        self.analyzed = 0
+        self.skipped = 0  # 已有有效预分析结果
+        self.failed = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.message = ""
+        self.errors: deque = deque(maxlen=20)
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._pause_requested = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("pending", "running", "pausing")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态（含吞吐量和预计剩余时间）"""
+        done = self.analyzed + self.skipped + self.failed
+        elapsed = None
+        throughput = None
+        eta = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+            if elapsed > 0 and self.analyzed:
+                throughput = self.analyzed / elapsed
+                if self.is_active and self.total:
+                    eta = max(0.0, (self.total - done) / throughput)
+
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "total": self.total,
+            "analyzed": self.analyzed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "in_flight": self.in_flight,
+            "progress": round(min(1.0, done / self.total), 4) if self.total else 0.0,
+            "throughput_per_second": round(throughput, 2) if throughput else None,
+            "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "message": self.message,
+            "recent_errors": list(self.errors),
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class PreanalysisManager:
+    """预分析任务管理：每个批次同一时间只运行一个任务，所有任务共用一个令牌桶"""
+
+    def __init__(self):
+        self._jobs: Dict[int, PreanalysisJob] = {}
+        self._bucket: Optional[TokenBucket] = None
+
+    def _get_bucket(self) -> TokenBucket:
+        if self._bucket is None:
+            self._bucket = TokenBucket(
+                rate=settings.PREANALYSIS_RATE_PER_SECOND,
+                capacity=settings.PREANALYSIS_BURST
+            )
+        return self._bucket
+
+    def start(self, batch_id: int) -> PreanalysisJob:
+        """
+        启动（或继续已暂停的）批次预分析，需在事件循环中调用
+
+        Raises:
+            RuntimeError: 该批次的任务正在运行
+            ValueError: 未配置GLM API Key（否则每条对话都会退避重试后才失败）
+        """
+        job = self._jobs.get(batch_id)
+        if job is not None and job.is_active:
+            raise RuntimeError(f"批次 {batch_id} 的预分析任务正在运行")
+        if not get_glm_api_key():
+            raise ValueError("未配置GLM_API_KEY，无法启动预分析")
+
+        job = PreanalysisJob(batch_id)
+        self._jobs[batch_id] = job
+        job._task = asyncio.create_task(self._run(job))
+        return job
+
+    def pause(self, batch_id: int) -> Optional[PreanalysisJob]:
+        """请求暂停（进行中的对话分析完成后停止）"""
+        job = self._jobs.get(batch_id)
+        if job is None or not job.is_active:
+            return None
+        job._pause_requested = True
+        job.status = "pausing"
+        return job
+
+    def get(self, batch_id: int) -> Optional[PreanalysisJob]:
+        return self._jobs.get(batch_id)
+
+    def list_jobs(self) -> List[PreanalysisJob]:
+        return list(self._jobs.values())
+
+    async def shutdown(self) -> None:
+        """服务关闭时取消所有运行中的任务"""
+        tasks = [job._task for job in self._jobs.values() if job._task and not job._task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: PreanalysisJob) -> None:
+        job.status = "running"
+        job.started_at = time.monotonic()
+        try:
+            conversation_ids = await run_in_threadpool(list_pending_conversation_ids, job.batch_id)
+            job.total = len(conversation_ids)
+            print(f"🚀 [预分析] 批次 {job.batch_id} 开始: {job.total} 条待审核对话，并发 {settings.PREANALYSIS_CONCURRENCY}")
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for conversation_id in conversation_ids:
+                queue.put_nowait(conversation_id)
+
+            workers = [
+                asyncio.create_task(self._worker(job, queue))
+                for _ in range(max(1, settings.PREANALYSIS_CONCURRENCY))
+            ]
+            await asyncio.gather(*workers)
+
+            if job._pause_requested:
+                job.status = "paused"
+                job.message = f"已暂停，剩余 {queue.qsize()} 条"
+            else:
+                job.status = "completed"
+                job.message = f"完成: 分析 {job.analyzed} 条，跳过 {job.skipped} 条，失败 {job.failed} 条"
+        except asyncio.CancelledError:
+            job.status = "paused"
+            job.message = "服务关闭，任务已中断"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.message = f"预分析失败: {str(e)}"
+        finally:
+            job.finished_at = time.monotonic()
+            print(f"📦 [预分析] 批次 {job.batch_id} 结束: {job.status} {job.message}")
+
+    async def _worker(self, job: PreanalysisJob, queue: asyncio.Queue) -> None:
+        while not job._pause_requested:
+            try:
+                conversation_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            job.in_flight += 1
+            try:
+                await self._analyze_one(job, conversation_id)
+            except Exception as e:
+                job.failed += 1
+                job.errors.append({"conversation_id": conversation_id, "error": str(e)})
+            finally:
+                job.in_flight -= 1
+
+    async def _analyze_one(self, job: PreanalysisJob, conversation_id: int) -> None:
+        """分析单条对话：已有有效结果则跳过，LLM调用失败时指数退避重试"""
+        loaded = await run_in_threadpool(load_conversation_for_analysis, conversation_id)
+        if not loaded:
+            job.skipped += 1
+            return
+        text, driver_tags = loaded
+        if await run_in_threadpool(get_preanalysis, conversation_id, text, driver_tags):
+            job.skipped += 1
+            return
+
+        # 按规则抽取结果计算LLM调用次数（规则可代替第一层、完整覆盖时跳过第二层）
+        llm_calls = estimate_llm_calls(text, driver_tags)
+        bucket = self._get_bucket()
+        max_retries = settings.PREANALYSIS_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            if llm_calls:
+                await bucket.acquire(llm_calls)
+            result = await run_ai_analysis(text, driver_tags)
+            # 已成功的层在LLM响应缓存中，重试时只有失败的层会重新请求
+            if not result.get("llm_errors"):
+                await run_in_threadpool(
+                    save_preanalysis, conversation_id, driver_tags,
+                    analysis_fingerprint(text, driver_tags), result
+                )
+                job.analyzed += 1
+                return
+            if attempt < max_retries:
+                job.retries += 1
+                await asyncio.sleep(backoff_delay(
+                    attempt, settings.PREANALYSIS_BACKOFF_BASE_SECONDS, settings.PREANALYSIS_BACKOFF_MAX_SECONDS
+                ))
+
+        job.failed += 1
+        job.errors.append({"conversation_id": conversation_id, "error": result["llm_errors"]})
+
+
+# 全局单例
+_preanalysis_manager = PreanalysisManager()
+
+def get_preanalysis_manager() -> PreanalysisManager:
+    """获取预分析任务管理器"""
+    return _preanalysis_manager
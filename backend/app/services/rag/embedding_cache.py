@@ -0,0 +1,152 @@
+"""
+嵌入向量缓存 - 内存LRU + SQLite持久化
+
+缓存键为 (模型名, 归一化文本) 的SHA-256摘要，同一段对话无论来自
+推荐、智能分析还是索引重建，只会被编码一次，重启后依然有效。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """文本归一化：Unicode NFC + 去除首尾空白"""
+    return unicodedata.normalize("NFC", text or "").strip()
+
+
+def make_cache_key(text: str, model_name: str) -> str:
+    """生成内容寻址的缓存键"""
+    payload = f"{model_name}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """两级嵌入缓存：内存LRU（有容量上限）+ 磁盘SQLite表"""
+
+    def __init__(self, db_path: Optional[str], max_memory_items: int = 10000):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite文件路径，为空则只使用内存缓存
+            max_memory_items: 内存LRU最多缓存的向量数量
+        """
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        批量查询缓存
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            命中的 {键: 向量}
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                elif key not in found:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                # SQLite 单条语句的参数个数有限制，分块查询
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+                        chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def put_many(self, model_name: str, items: Dict[str, np.ndarray]) -> None:
+        """
+        批量写入缓存
+
+        Args:
+            model_name: 模型名称
+            items: {键: 向量}
+        """
+        if not items:
+            return
+        with self._lock:
+            rows = []
+            for key, vector in items.items():
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model_name, vector.shape[-1], vector.tobytes()))
+
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """写入内存LRU并按容量淘汰（调用方需持有锁）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        with self._lock:
+            disk_items = 0
+            if self._conn is not None:
+                disk_items = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            return {
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
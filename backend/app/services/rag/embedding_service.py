@@ -2,22 +2,106 @@
 文本嵌入服务 - 使用OpenAI或本地模型
 """
 import os
-from typing import List
-from sentence_transformers import SentenceTransformer
+import threading
+from typing import List, Tuple
+import numpy as np
 from app.config import settings
 
+# 从本地目录加载模型时禁止 huggingface 访问网络（需在导入 sentence_transformers 之前设置）
+if settings.EMBEDDING_MODEL_DIR or settings.EMBEDDING_BACKEND == "onnx":
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from app.services.rag.embedding_cache import EmbeddingCache, make_cache_key
+from app.services.rag.model_manifest import manifest_model_id, verify_manifest
+from app.services.rag.parallel_embedding import get_parallel_embedding_engine
+
+
+class TorchEmbeddingBackend:
+    """PyTorch推理后端（SentenceTransformer）"""
+
+    def __init__(self, model_name_or_path: str, device: str = None, revision: str = None):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name_or_path, device=device, revision=revision)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """批量编码，返回float32矩阵"""
+        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+def create_embedding_backend(backend: str = None) -> Tuple[object, str]:
+    """
+    按配置创建推理后端
+
+    Args:
+        backend: torch / onnx，默认取 settings.EMBEDDING_BACKEND
+
+    Returns:
+        (推理后端, 模型标识)，模型标识用作嵌入缓存键的一部分（包含清单摘要或hub commit，
+        模型文件或推理后端变化时标识随之变化）
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+
+    if backend == "onnx":
+        from app.services.rag.onnx_backend import OnnxEmbeddingBackend
+
+        if not settings.EMBEDDING_ONNX_DIR:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx 需要配置 EMBEDDING_ONNX_DIR（scripts/export_onnx_model.py 生成）")
+        manifest = verify_manifest(
+            settings.EMBEDDING_ONNX_DIR,
+            check_hash=settings.EMBEDDING_MODEL_VERIFY_HASH
+        )
+        onnx_backend = OnnxEmbeddingBackend(
+            settings.EMBEDDING_ONNX_DIR,
+            quantized=settings.EMBEDDING_ONNX_QUANTIZED,
+            num_threads=settings.EMBEDDING_ONNX_THREADS
+        )
+        # ONNX（尤其是int8量化）与torch的输出有细微差异，缓存键需区分
+        suffix = "onnx-int8" if settings.EMBEDDING_ONNX_QUANTIZED else "onnx"
+        return onnx_backend, f"{manifest_model_id(manifest)}+{suffix}"
+
+    if backend != "torch":
+        raise ValueError(f"不支持的嵌入推理后端: {backend}")
+
+    if settings.EMBEDDING_MODEL_DIR:
+        # 离线模式：从镜像内预置的模型目录加载，加载前按清单校验
+        manifest = verify_manifest(
+            settings.EMBEDDING_MODEL_DIR,
+            check_hash=settings.EMBEDDING_MODEL_VERIFY_HASH
+        )
+        return TorchEmbeddingBackend(settings.EMBEDDING_MODEL_DIR, device="cpu"), manifest_model_id(manifest)
+
+    model_id = settings.EMBEDDING_MODEL_NAME
+    if settings.EMBEDDING_MODEL_REVISION:
+        model_id = f"{model_id}@{settings.EMBEDDING_MODEL_REVISION[:12]}"
+    backend_model = TorchEmbeddingBackend(settings.EMBEDDING_MODEL_NAME, revision=settings.EMBEDDING_MODEL_REVISION)
+    return backend_model, model_id
+
 
 class EmbeddingService:
     """文本嵌入服务"""
     
-    def __init__(self):
-        """初始化嵌入服务"""
+    def __init__(self, backend: str = None):
+        """
+        初始化嵌入服务
+
+        Args:
+            backend: 推理后端 torch / onnx，默认取配置
+        """
         # 使用本地多语言模型（支持中文）
         # 使用 paraphrase-multilingual-MiniLM-L12-v2，这是一个轻量级的多语言模型
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        self.backend, self.model_name = create_embedding_backend(backend)
         self.dimension = 384  # 该模型的嵌入维度
+
+        # 嵌入缓存：相同文本只编码一次
+        self.cache = EmbeddingCache(
+            db_path=settings.EMBEDDING_CACHE_PATH,
+            max_memory_items=settings.EMBEDDING_CACHE_MAX_ITEMS
+        )
     
-    def embed_text(self, text: str) -> List[float]:
+    def embed_text(self, text: str) -> np.ndarray:
         """
         将文本转换为嵌入向量
         
@@ -25,13 +109,11 @@ class EmbeddingService:
             text: 输入文本
             
         Returns:
-            嵌入向量
+            形状为 (dimension,) 的float32向量
         """
-        # 生成嵌入
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+        return self._embed_with_cache([text])[0]
     
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
         """
         批量将文本转换为嵌入向量
         
@@ -39,11 +121,69 @@ class EmbeddingService:
             texts: 输入文本列表
             
         Returns:
-            嵌入向量列表
+            形状为 (len(texts), dimension) 的float32矩阵（C连续）
         """
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._embed_with_cache(texts)
+
+    def embed_texts_bulk(self, texts: List[str]) -> np.ndarray:
+        """
+        批量编码大量文本（用于重建索引）
+
+        未命中缓存的文本足够多且配置了多进程引擎时，分发到进程池并行编码。
+
+        Args:
+            texts: 输入文本列表
+
+        Returns:
+            形状为 (len(texts), dimension) 的float32矩阵（C连续）
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self._embed_with_cache(texts, bulk=True)
+
+    def _embed_with_cache(self, texts: List[str], bulk: bool = False) -> np.ndarray:
+        """
+        先查缓存，只对未命中的文本调用模型编码
+
+        Args:
+            texts: 输入文本列表
+            bulk: 是否允许使用多进程引擎
+
+        Returns:
+            形状为 (len(texts), dimension) 的float32矩阵
+        """
+        keys = [make_cache_key(text, self.model_name) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # 未命中的文本去重后统一编码
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending[key] = text
+
+        if pending:
+            engine = get_parallel_embedding_engine() if bulk else None
+            if engine is not None and len(pending) >= settings.EMBEDDING_PARALLEL_MIN_TEXTS:
+                encoded = engine.encode(list(pending.values()))
+            else:
+                encoded = self.backend.encode(list(pending.values()))
+            new_items = dict(zip(pending.keys(), encoded))
+            self.cache.put_many(self.model_name, new_items)
+            cached.update(new_items)
+
+        # 直接写入预分配的矩阵，保证float32且C连续，下游无需再复制
+        dimension = cached[keys[0]].shape[-1]
+        result = np.empty((len(keys), dimension), dtype=np.float32)
+        for i, key in enumerate(keys):
+            result[i] = cached[key]
+        return result
     
+    def warm_up(self) -> None:
+        """预热模型：绕过缓存执行一次编码，完成首次推理的初始化开销"""
+        self.backend.encode(["预热：司机你好，车厢长4.2米，有尾板"])
+
     def get_dimension(self) -> int:
         """获取嵌入向量维度"""
         return self.dimension
@@ -51,10 +191,13 @@ class EmbeddingService:
 
 # 全局单例
 _embedding_service = None
+_embedding_service_lock = threading.Lock()
 
 def get_embedding_service() -> EmbeddingService:
-    """获取嵌入服务单例"""
+    """获取嵌入服务单例（线程安全，后台预热与请求线程可能同时调用）"""
     global _embedding_service
     if _embedding_service is None:
-        _embedding_service = EmbeddingService()
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
     return _embedding_service
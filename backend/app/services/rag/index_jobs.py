@@ -0,0 +1,203 @@
+"""
+后台索引构建任务 - 在独立线程中重建向量索引，提供进度、吞吐、ETA和取消
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.rag.rag_service import IndexBuildCancelled, get_rag_recommender
+from app.services.rag.tag_centroids import is_tag_centroid_enabled, train_tag_centroids
+
+
+def iter_approved_conversations(chunk_size: int) -> Iterator[Dict[str, Any]]:
+    """
+    分块流式读取已审核的对话
+
+    使用按ID的键集分页，每块一个短查询：不会一次性加载全部对话，
+    也不会在整个构建期间持有SQLite读事务而阻塞审核写入。
+
+    Args:
+        chunk_size: 每次读取的行数
+
+    Yields:
+        对话字典 {id, raw_text, manual_tag}
+    """
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Conversation.id, Conversation.raw_text, Conversation.manual_tag
+            ).filter(
+                Conversation.status == 'approved',
+                Conversation.id > last_id
+            ).order_by(Conversation.id).limit(chunk_size).all()
+        finally:
+            db.close()
+
+        if not rows:
+            return
+        for row in rows:
+            yield {'id': row.id, 'raw_text': row.raw_text, 'manual_tag': row.manual_tag}
+        last_id = rows[-1].id
+
+
+class IndexBuildJob:
+    """索引构建任务"""
+
+    def __init__(self):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.status = "pending"  # pending / running / completed / failed / cancelled
+        self.total = 0
+        self.scanned = 0
+        self.embedded = 0
+        self.written = 0
+        self.message = ""
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_progress(self, stage: str, count: int) -> None:
+        """构建过程中的进度回调；已请求取消时抛出 IndexBuildCancelled 中断构建"""
+        with self._lock:
+            if stage == "total":
+                self.total = count
+            elif stage == "scanned":
+                self.scanned += count
+            elif stage == "embedded":
+                self.embedded += count
+            elif stage == "written":
+                self.written += count
+        if self._cancel_event.is_set():
+            raise IndexBuildCancelled()
+
+    def cancel(self) -> bool:
+        """请求取消（在下一个分块边界生效）"""
+        if self.status in ("completed", "failed", "cancelled"):
+            return False
+        self._cancel_event.set()
+        return True
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态（含吞吐量和预计剩余时间）"""
+        with self._lock:
+            elapsed = None
+            throughput = None
+            eta = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.monotonic()) - self.started_at
+                if elapsed > 0 and self.scanned:
+                    throughput = self.scanned / elapsed
+                    if not self.is_finished and self.total:
+                        eta = max(0.0, (self.total - self.scanned) / throughput)
+
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "total": self.total,
+                "scanned": self.scanned,
+                "embedded": self.embedded,
+                "written": self.written,
+                "progress": round(min(1.0, self.scanned / self.total), 4) if self.total else 0.0,
+                "throughput_per_second": round(throughput, 2) if throughput else None,
+                "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "cancel_requested": self._cancel_event.is_set(),
+                "message": self.message,
+                "result": self.result,
+                "created_at": self.created_at.isoformat()
+            }
+
+
+class IndexBuildManager:
+    """索引构建任务管理：同一时间只运行一个构建任务"""
+
+    def __init__(self, max_history: int = 20):
+        self._jobs: "OrderedDict[str, IndexBuildJob]" = OrderedDict()
+        self._current: Optional[IndexBuildJob] = None
+        self._lock = threading.Lock()
+        self.max_history = max_history
+
+    def start(self) -> IndexBuildJob:
+        """
+        启动新的构建任务
+
+        Raises:
+            RuntimeError: 已有构建任务在运行
+        """
+        with self._lock:
+            if self._current is not None and not self._current.is_finished:
+                raise RuntimeError(f"已有索引构建任务正在运行: {self._current.job_id}")
+
+            job = IndexBuildJob()
+            self._current = job
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_history:
+                self._jobs.popitem(last=False)
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"index-build-{job.job_id}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexBuildJob]:
+        return self._jobs.get(job_id)
+
+    def get_current(self) -> Optional[IndexBuildJob]:
+        """当前（或最近一次）构建任务"""
+        return self._current
+
+    def _run(self, job: IndexBuildJob) -> None:
+        job.status = "running"
+        job.started_at = time.monotonic()
+        try:
+            # 已审核对话总数（用于进度和ETA）
+            db = SessionLocal()
+            try:
+                job.total = db.query(Conversation).filter(
+                    Conversation.status == 'approved'
+                ).count()
+            finally:
+                db.close()
+
+            result = get_rag_recommender().build_vector_index(
+                iter_approved_conversations(settings.VECTOR_INDEX_WRITE_BATCH),
+                progress_callback=job.on_progress
+            )
+            job.result = result
+            job.message = result.get("message", "")
+            if result.get("cancelled"):
+                job.status = "cancelled"
+            elif result.get("success"):
+                job.status = "completed"
+                if is_tag_centroid_enabled():
+                    # 新版本索引生效后重新训练质心模型
+                    job.result["tag_centroids"] = train_tag_centroids()
+            else:
+                job.status = "failed"
+        except Exception as e:
+            job.status = "failed"
+            job.message = f"构建索引失败: {str(e)}"
+        finally:
+            job.finished_at = time.monotonic()
+            print(f"📦 [索引构建] 任务 {job.job_id} 结束: {job.status} {job.message}")
+
+
+# 全局单例
+_index_build_manager = IndexBuildManager()
+
+def get_index_build_manager() -> IndexBuildManager:
+    """获取索引构建任务管理器"""
+    return _index_build_manager
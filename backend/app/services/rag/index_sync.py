@@ -0,0 +1,260 @@
+"""
+向量索引增量同步 - 随对话审核状态变化维护索引
+
+- 对话审核通过（或已审核对话的人工标签变化）: upsert 一条向量
+- 对话被删除或取消审核: 删除其向量
+- 对账任务: 比对数据库与索引中的对话ID和标签，补齐差异（重建切换前对新版本、回滚后对当前版本各执行一次）
+
+启用混合/词法检索时，词法索引随同一批变更增量更新，对账时从数据库整体重建。
+标签质心模型按索引中向量的新旧状态增量更新，对账后全量重新训练。
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.rag.lexical_index import (
+    abort_lexical_rebuild,
+    begin_lexical_rebuild,
+    clear_lexical_index,
+    finish_lexical_rebuild,
+    is_lexical_enabled,
+    update_lexical_index,
+)
+from app.services.rag.tag_centroids import (
+    get_tag_centroid_classifier,
+    is_tag_centroid_enabled,
+    train_tag_centroids,
+    update_tag_centroids,
+)
+from app.services.rag.warmup import is_rag_ready
+
+
+def parse_manual_tags(manual_tag: Optional[str]) -> List[str]:
+    """
+    解析人工标签JSON
+
+    Args:
+        manual_tag: 人工标签JSON字符串
+
+    Returns:
+        标签列表（解析失败或为空时返回空列表）
+    """
+    if not manual_tag:
+        return []
+    try:
+        tags = json.loads(manual_tag)
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(tags, list):
+        return []
+    return [tag for tag in tags if tag]
+
+
+def sync_conversation_index(conversation_id: int) -> None:
+    """
+    按对话当前状态同步其向量（在后台任务中调用）
+
+    Args:
+        conversation_id: 对话ID
+    """
+    if not is_rag_ready():
+        # 模型未就绪时跳过，预热完成后的对账会补齐
+        print(f"⚠️ [索引同步] 推荐模型未就绪，跳过对话 #{conversation_id}")
+        return
+
+    from app.services.rag.vector_store import get_vector_store
+
+    db = SessionLocal()
+    try:
+        conversation = db.query(Conversation).filter(
+            Conversation.id == conversation_id
+        ).first()
+
+        vector_store = get_vector_store()
+        tags = parse_manual_tags(conversation.manual_tag) if conversation else []
+
+        # 质心模型需要减去旧向量的贡献，先读取变更前的状态
+        previous = vector_store.get_embeddings([conversation_id]) if is_tag_centroid_enabled() else {}
+
+        if conversation and conversation.status == 'approved' and tags:
+            vector_store.upsert_conversation(conversation.id, conversation.raw_text, tags)
+            if is_lexical_enabled():
+                update_lexical_index(upserts=[(conversation.id, conversation.raw_text, tags)])
+            if is_tag_centroid_enabled():
+                update_tag_centroids(previous, vector_store.get_embeddings([conversation_id]))
+        else:
+            vector_store.delete_conversations([conversation_id])
+            if is_lexical_enabled():
+                update_lexical_index(deletes=[conversation_id])
+            if is_tag_centroid_enabled():
+                update_tag_centroids(previous, {})
+    except Exception as e:
+        print(f"❌ [索引同步] 对话 #{conversation_id} 同步失败: {e}")
+    finally:
+        db.close()
+
+
+def remove_conversations_from_index(conversation_ids: List[int]) -> None:
+    """
+    从索引中删除对话（在后台任务中调用）
+
+    Args:
+        conversation_ids: 对话ID列表
+    """
+    if not conversation_ids:
+        return
+    if not is_rag_ready():
+        print(f"⚠️ [索引同步] 推荐模型未就绪，跳过删除 {len(conversation_ids)} 条向量")
+        return
+
+    from app.services.rag.vector_store import get_vector_store
+
+    try:
+        vector_store = get_vector_store()
+        previous = vector_store.get_embeddings(conversation_ids) if is_tag_centroid_enabled() else {}
+        vector_store.delete_conversations(conversation_ids)
+        if is_lexical_enabled():
+            update_lexical_index(deletes=conversation_ids)
+        if is_tag_centroid_enabled():
+            update_tag_centroids(previous, {})
+    except Exception as e:
+        print(f"❌ [索引同步] 删除向量失败: {e}")
+
+
+def clear_index() -> None:
+    """清空索引（清空所有对话后调用）"""
+    if not is_rag_ready():
+        return
+
+    from app.services.rag.vector_store import get_vector_store
+
+    get_vector_store().clear_collection()
+    if is_lexical_enabled():
+        clear_lexical_index()
+    if is_tag_centroid_enabled():
+        get_tag_centroid_classifier().reset()
+
+
+def rebuild_lexical_index() -> int:
+    """
+    从数据库重建词法索引（流式读取已审核对话，完成后原子替换）
+
+    Returns:
+        索引中的对话数量
+    """
+    from app.services.rag.index_jobs import iter_approved_conversations
+
+    staging = begin_lexical_rebuild()
+    try:
+        for conv in iter_approved_conversations(settings.VECTOR_INDEX_WRITE_BATCH):
+            tags = parse_manual_tags(conv['manual_tag'])
+            if tags:
+                staging.upsert(conv['id'], conv['raw_text'], tags)
+    except Exception:
+        abort_lexical_rebuild()
+        raise
+    finish_lexical_rebuild(staging)
+
+    print(f"✅ [词法索引] 重建完成，共 {staging.count()} 条对话")
+    return staging.count()
+
+
+def reconcile_vectors(collection=None) -> Dict[str, int]:
+    """
+    以数据库为准修正向量
+
+    比对已审核且有标签的对话与集合中的文档，补齐缺失、更新标签变化、删除多余。
+
+    Args:
+        collection: 对账的集合，默认为当前版本（重建期间同时写入新版本）
+
+    Returns:
+        {"upserted": 新增/更新数, "deleted": 删除数, "expected": 应在索引中的对话数}
+    """
+    from app.services.rag.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+    indexed = vector_store.get_indexed_tags(collection)
+
+    db = SessionLocal()
+    try:
+        # 先只读取ID和标签做比对，需要写入时再读取文本
+        expected = {}
+        rows = db.query(Conversation.id, Conversation.manual_tag).filter(
+            Conversation.status == 'approved'
+        ).all()
+        for conversation_id, manual_tag in rows:
+            tags = parse_manual_tags(manual_tag)
+            if tags:
+                expected[conversation_id] = tags
+
+        to_upsert = [
+            conversation_id for conversation_id, tags in expected.items()
+            if indexed.get(conversation_id) != ",".join(tags)
+        ]
+        to_delete = [conversation_id for conversation_id in indexed if conversation_id not in expected]
+
+        upserted = 0
+        for start in range(0, len(to_upsert), 500):
+            chunk_ids = to_upsert[start:start + 500]
+            chunk = db.query(Conversation.id, Conversation.raw_text).filter(
+                Conversation.id.in_(chunk_ids)
+            ).all()
+            upserted += len(vector_store.add_conversations_batch(
+                [{"id": row.id, "text": row.raw_text, "tags": expected[row.id]} for row in chunk],
+                upsert=True,
+                collection=collection
+            ))
+    finally:
+        db.close()
+
+    deleted = vector_store.delete_conversations(to_delete, collection=collection)
+    return {"upserted": upserted, "deleted": deleted, "expected": len(expected)}
+
+
+def reconcile_index() -> Dict[str, Any]:
+    """
+    对账：以数据库为准修正索引
+
+    比对已审核且有标签的对话与索引中的文档，补齐缺失、更新标签变化、删除多余。
+
+    Returns:
+        对账结果统计
+    """
+    from app.services.rag.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+    reconciled = reconcile_vectors()
+
+    print(f"✅ [索引对账] 新增/更新 {reconciled['upserted']} 条，删除 {reconciled['deleted']} 条")
+    result = {
+        "success": True,
+        "upserted": reconciled["upserted"],
+        "deleted": reconciled["deleted"],
+        "indexed": vector_store.get_collection_count(),
+        "expected": reconciled["expected"]
+    }
+    if is_lexical_enabled():
+        result["lexical_indexed"] = rebuild_lexical_index()
+    if is_tag_centroid_enabled():
+        result["tag_centroids"] = train_tag_centroids()
+    return result
+
+
+def rollback_index() -> Optional[Dict[str, Any]]:
+    """
+    回滚向量索引到上一个版本并对账
+
+    上一个版本在切换后不再接收增量写入，回滚后以数据库为准补齐这期间的审核变更
+    （对账同时重新训练质心模型）。
+
+    Returns:
+        对账结果统计，没有可回滚的上一个版本时返回None
+    """
+    from app.services.rag.vector_store import get_vector_store
+
+    if not get_vector_store().rollback():
+        return None
+    return reconcile_index()
@@ -0,0 +1,383 @@
+"""
+词法倒排索引 - 基于字符二元组（bigram）的BM25检索
+
+"4.2米"、"尾板"、"跟车1人" 这类精确线索决定了大部分标签，向量检索容易漏掉；
+词法索引直接按字面重叠打分，也不需要对查询做嵌入编码。
+
+- 倒排表: 词项 -> (文档槽位 int32, 词频 uint16)，用 array.array 紧凑存储，
+  检索时零拷贝转为NumPy数组按词项向量化累加BM25分数
+- 删除/更新只标记旧槽位失效，失效槽位过多时整体压缩
+- 只在内存中维护：启动对账时从数据库重建，之后随审核变更增量更新
+"""
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+
+# 连续的数字/字母/汉字视为一段，小数点只在数字之间保留（"4.2米" -> 4. .2 2米）
+_TOKEN_RUN = re.compile(r"(?:\d+\.\d+|[0-9a-z\u3400-\u9fff])+")
+
+# 保存在索引中的文本预览长度（推荐结果只展示前200字）
+_PREVIEW_CHARS = 201
+
+
+def char_bigrams(text: str) -> List[str]:
+    """
+    把文本切分为字符二元组
+
+    Args:
+        text: 原始文本（全角数字字母会先归一化为半角）
+
+    Returns:
+        二元组列表（只有一个字符的片段保留该字符）
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    grams = []
+    for run in _TOKEN_RUN.findall(text):
+        if len(run) == 1:
+            grams.append(run)
+        else:
+            grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+class LexicalIndex:
+    """BM25字符二元组倒排索引"""
+
+    COMPACT_MIN_DEAD = 1000  # 失效槽位至少达到该数量且超过有效文档的30%时压缩
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        初始化空索引
+
+        Args:
+            k1: BM25词频饱和参数
+            b: BM25文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._slot_of: Dict[int, int] = {}  # 对话ID -> 槽位
+        self._doc_ids = array("q")  # 槽位 -> 对话ID
+        self._doc_len = array("I")
+        self._valid = bytearray()
+        self._tags: List[str] = []
+        self._previews: List[str] = []
+        self._total_len = 0  # 有效文档的总长度（用于平均文档长度）
+        self._dead = 0
+        self._lock = threading.RLock()
+
+    # ---------- 写入 ----------
+
+    def upsert(self, conversation_id: int, text: str, tags: List[str]) -> None:
+        """
+        新增或更新一条对话
+
+        Args:
+            conversation_id: 对话ID
+            text: 对话文本
+            tags: 标签列表
+        """
+        grams = char_bigrams(text)
+        counts = Counter(grams)
+        with self._lock:
+            self._remove(conversation_id)
+
+            slot = len(self._doc_ids)
+            self._doc_ids.append(conversation_id)
+            self._doc_len.append(len(grams))
+            self._valid.append(1)
+            self._tags.append(",".join(tags))
+            self._previews.append((text or "")[:_PREVIEW_CHARS])
+            self._slot_of[conversation_id] = slot
+            self._total_len += len(grams)
+
+            for term, tf in counts.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = (array("i"), array("H"))
+                    self._postings[term] = posting
+                posting[0].append(slot)
+                posting[1].append(min(tf, 65535))
+
+            self._maybe_compact()
+
+    def delete(self, conversation_ids: Iterable[int]) -> int:
+        """
+        删除对话（不存在的ID被忽略）
+
+        Returns:
+            实际删除的数量
+        """
+        with self._lock:
+            removed = sum(1 for conversation_id in conversation_ids if self._remove(conversation_id))
+            self._maybe_compact()
+        return removed
+
+    def _remove(self, conversation_id: int) -> bool:
+        """标记对话的槽位失效（调用方持有锁）"""
+        slot = self._slot_of.pop(conversation_id, None)
+        if slot is None:
+            return False
+        self._valid[slot] = 0
+        self._total_len -= self._doc_len[slot]
+        self._tags[slot] = ""
+        self._previews[slot] = ""
+        self._dead += 1
+        return True
+
+    def _maybe_compact(self) -> None:
+        """失效槽位过多时压缩（调用方持有锁）"""
+        if self._dead >= self.COMPACT_MIN_DEAD and self._dead > 0.3 * len(self._slot_of):
+            self._compact()
+
+    def _compact(self) -> None:
+        """丢弃失效槽位并重新编号（调用方持有锁）"""
+        valid = np.frombuffer(self._valid, dtype=np.bool_).copy()
+        new_slot = (np.cumsum(valid) - 1).astype(np.int32)
+
+        for term in list(self._postings):
+            slots_buffer, tfs_buffer = self._postings[term]
+            slots = np.frombuffer(slots_buffer, dtype=np.int32)
+            keep = valid[slots]
+            if not keep.any():
+                del self._postings[term]
+                continue
+            new_slots = array("i")
+            new_slots.frombytes(new_slot[slots[keep]].tobytes())
+            new_tfs = array("H")
+            new_tfs.frombytes(np.frombuffer(tfs_buffer, dtype=np.uint16)[keep].tobytes())
+            self._postings[term] = (new_slots, new_tfs)
+
+        live = np.flatnonzero(valid)
+        self._doc_ids = array("q", [self._doc_ids[slot] for slot in live])
+        self._doc_len = array("I", [self._doc_len[slot] for slot in live])
+        self._tags = [self._tags[slot] for slot in live]
+        self._previews = [self._previews[slot] for slot in live]
+        self._valid = bytearray(b"\x01" * len(live))
+        self._slot_of = {conversation_id: slot for slot, conversation_id in enumerate(self._doc_ids)}
+        self._dead = 0
+
+    # ---------- 检索 ----------
+
+    def _score(self, counts: Counter) -> Tuple[np.ndarray, float]:
+        """
+        计算查询对所有槽位的BM25分数（调用方持有锁）
+
+        Returns:
+            (每个槽位的分数, 查询自身作为文档时的分数 —— 用于把分数归一化到[0, 1])
+        """
+        total_docs = len(self._slot_of)
+        avg_len = self._total_len / total_docs if total_docs else 1.0
+        avg_len = avg_len or 1.0
+
+        valid = np.frombuffer(self._valid, dtype=np.bool_)
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+        norm = (self.k1 * (1 - self.b + self.b * doc_len / avg_len)).astype(np.float32)
+        scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+
+        query_len = sum(counts.values())
+        query_norm = self.k1 * (1 - self.b + self.b * query_len / avg_len)
+        self_score = 0.0
+
+        for term, query_tf in counts.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            slots = np.frombuffer(posting[0], dtype=np.int32)
+            df = int(valid[slots].sum())
+            if df == 0:
+                continue
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            tf = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            # 同一词项的槽位互不重复，可以直接按索引累加
+            scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm[slots])
+            self_score += idf * query_tf * (self.k1 + 1) / (query_tf + query_norm)
+
+        scores[~valid] = 0.0
+        return scores, self_score
+
+    def search(self, text: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25检索
+
+        Args:
+            text: 查询文本
+            top_k: 返回结果数量
+
+        Returns:
+            相似对话列表，包含 id, text, score, similarity（自身归一化的BM25，[0, 1]）, metadata
+        """
+        return self.search_with_scores(text, top_k)[0]
+
+    def score_documents(self, text: str, conversation_ids: List[int]) -> Dict[int, float]:
+        """
+        计算查询与指定对话的归一化BM25相似度
+
+        Args:
+            text: 查询文本
+            conversation_ids: 对话ID列表
+
+        Returns:
+            {对话ID: 相似度}，不在索引中的对话不返回
+        """
+        return self.search_with_scores(text, 0, conversation_ids)[1]
+
+    def search_with_scores(
+        self,
+        text: str,
+        top_k: int,
+        conversation_ids: Optional[List[int]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[int, float]]:
+        """
+        一次打分同时完成检索和指定对话的相似度计算（混合检索用）
+
+        Args:
+            text: 查询文本
+            top_k: 返回结果数量（0 表示只计算指定对话）
+            conversation_ids: 需要额外返回相似度的对话ID
+
+        Returns:
+            (检索结果, {对话ID: 相似度})
+        """
+        counts = Counter(char_bigrams(text))
+        with self._lock:
+            slots = {
+                conversation_id: self._slot_of[conversation_id]
+                for conversation_id in (conversation_ids or []) if conversation_id in self._slot_of
+            }
+            if not counts or not self._slot_of:
+                return [], {conversation_id: 0.0 for conversation_id in slots}
+
+            scores, self_score = self._score(counts)
+            if self_score <= 0:
+                return [], {conversation_id: 0.0 for conversation_id in slots}
+            similarities = {
+                conversation_id: min(1.0, float(scores[slot]) / self_score)
+                for conversation_id, slot in slots.items()
+            }
+
+            k = min(top_k, int(np.count_nonzero(scores)))
+            if k <= 0:
+                return [], similarities
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = [
+                {
+                    "id": f"conv_{self._doc_ids[slot]}",
+                    "text": self._previews[slot],
+                    "score": float(scores[slot]),
+                    "similarity": min(1.0, float(scores[slot]) / self_score),
+                    "metadata": {
+                        "conversation_id": self._doc_ids[slot],
+                        "tags": self._tags[slot]
+                    }
+                }
+                for slot in top
+            ]
+            return results, similarities
+
+    def count(self) -> int:
+        return len(self._slot_of)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            postings = sum(len(slots) for slots, _ in self._postings.values())
+            return {
+                "documents": len(self._slot_of),
+                "terms": len(self._postings),
+                "postings": postings,
+                "dead_slots": self._dead,
+                "posting_bytes": postings * 6
+            }
+
+
+# 当前索引与重建中的索引；增量更新同时写入两者，重建完成后原子替换
+_index: Optional[LexicalIndex] = None
+_staging: Optional[LexicalIndex] = None
+_revision = 0
+_lock = threading.Lock()
+
+
+def is_lexical_enabled() -> bool:
+    """当前检索模式是否需要词法索引"""
+    return settings.RAG_RETRIEVAL_MODE in ("hybrid", "lexical")
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """获取当前词法索引（尚未构建时返回None）"""
+    return _index
+
+
+def get_lexical_revision() -> int:
+    """词法索引修订号：每次变更后递增，用于推荐结果缓存失效"""
+    return _revision
+
+
+def update_lexical_index(
+    upserts: Iterable[Tuple[int, str, List[str]]] = (),
+    deletes: Iterable[int] = ()
+) -> None:
+    """
+    增量更新词法索引（当前索引和重建中的索引）
+
+    Args:
+        upserts: (对话ID, 文本, 标签列表) 列表
+        deletes: 要删除的对话ID列表
+    """
+    global _revision
+    upserts = list(upserts)
+    deletes = list(deletes)
+    with _lock:
+        targets = [index for index in (_index, _staging) if index is not None]
+    for index in targets:
+        if deletes:
+            index.delete(deletes)
+        for conversation_id, text, tags in upserts:
+            index.upsert(conversation_id, text, tags)
+    with _lock:
+        _revision += 1
+
+
+def clear_lexical_index() -> None:
+    """清空词法索引"""
+    global _index, _revision
+    with _lock:
+        if _index is not None:
+            _index = LexicalIndex()
+        _revision += 1
+
+
+def begin_lexical_rebuild() -> LexicalIndex:
+    """开始重建：返回新的空索引，重建期间的增量更新也会写入它"""
+    global _staging
+    with _lock:
+        _staging = LexicalIndex()
+        return _staging
+
+
+def finish_lexical_rebuild(staging: LexicalIndex) -> None:
+    """重建完成：原子替换当前索引"""
+    global _index, _staging, _revision
+    with _lock:
+        _index = staging
+        if _staging is staging:
+            _staging = None
+        _revision += 1
+
+
+def abort_lexical_rebuild() -> None:
+    """放弃重建，当前索引不受影响"""
+    global _staging
+    with _lock:
+        _staging = None
@@ -0,0 +1,122 @@
+"""
+嵌入微批处理 - 将并发的单条文本编码请求合并为一次批量编码
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.rag.embedding_service import EmbeddingService, get_embedding_service
+
+
+class EmbeddingMicroBatcher:
+    """
+    嵌入微批处理器
+
+    并发请求各自调用 embed_text，后台线程在 max_wait_ms 内（或凑满
+    max_batch_size 条后）把收集到的文本一次性交给 embed_texts 编码，
+    再把对应的向量分发给每个调用方。
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        初始化微批处理器
+
+        Args:
+            embedding_service: 嵌入服务
+            max_batch_size: 单批最多文本数量
+            max_wait_ms: 收集一批的最长等待时间（毫秒）
+        """
+        self.embedding_service = embedding_service
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run,
+            name="embedding-micro-batcher",
+            daemon=True
+        )
+        self._worker.start()
+
+        self.batches = 0
+        self.requests = 0
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """
+        提交单条文本并等待其嵌入向量
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            形状为 (dimension,) 的float32向量
+        """
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self) -> None:
+        """后台线程：收集请求并批量编码"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.embedding_service.embed_texts(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def get_stats(self) -> dict:
+        """获取微批统计信息"""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+
+# 全局单例
+_micro_batcher: Optional[EmbeddingMicroBatcher] = None
+_micro_batcher_lock = threading.Lock()
+
+def get_embedding_batcher() -> EmbeddingMicroBatcher:
+    """获取嵌入微批处理器单例"""
+    global _micro_batcher
+    if _micro_batcher is None:
+        with _micro_batcher_lock:
+            if _micro_batcher is None:
+                _micro_batcher = EmbeddingMicroBatcher(
+                    get_embedding_service(),
+                    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+                )
+    return _micro_batcher
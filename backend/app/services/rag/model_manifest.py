@@ -0,0 +1,118 @@
+"""
+本地模型清单 - 固定模型文件并在加载前校验完整性
+
+清单记录模型名称、hub上的 commit（revision）和每个文件的大小与SHA-256。
+构建镜像时完整校验SHA-256，运行期默认只校验文件大小；嵌入缓存使用的模型标识
+带上清单摘要，模型文件变化后旧的缓存向量不会再被命中。
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_manifest(model_dir: str, model_name: str, revision: Optional[str] = None) -> Dict[str, Any]:
+    """
+    为模型目录生成清单（记录每个文件的大小和SHA-256）
+
+    Args:
+        model_dir: 模型目录
+        model_name: 模型名称
+        revision: 下载时固定的 hub commit
+
+    Returns:
+        清单字典
+    """
+    files = {}
+    for root, _, names in os.walk(model_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, model_dir).replace(os.sep, "/")
+            if rel_path == MANIFEST_FILE:
+                continue
+            files[rel_path] = {
+                "size": os.path.getsize(path),
+                "sha256": _sha256(path)
+            }
+
+    return {
+        "model_name": model_name,
+        "revision": revision,
+        "created_at": datetime.utcnow().isoformat(),
+        "files": dict(sorted(files.items()))
+    }
+
+
+def write_manifest(model_dir: str, model_name: str, revision: Optional[str] = None) -> Dict[str, Any]:
+    """生成并写入清单文件"""
+    manifest = build_manifest(model_dir, model_name, revision)
+    with open(os.path.join(model_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def verify_manifest(model_dir: str, check_hash: bool = True) -> Dict[str, Any]:
+    """
+    按清单校验模型目录
+
+    Args:
+        model_dir: 模型目录
+        check_hash: 是否校验SHA-256（否则只校验文件大小，用于运行期快速启动）
+
+    Returns:
+        清单字典
+
+    Raises:
+        RuntimeError: 目录或清单缺失、文件缺失或内容不一致
+    """
+    manifest_path = os.path.join(model_dir, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        raise RuntimeError(f"模型清单不存在: {manifest_path}，请先运行 scripts/fetch_embedding_model.py")
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    problems = []
+    for rel_path, expected in manifest.get("files", {}).items():
+        path = os.path.join(model_dir, rel_path)
+        if not os.path.isfile(path):
+            problems.append(f"缺失 {rel_path}")
+        elif os.path.getsize(path) != expected["size"]:
+            problems.append(f"大小不一致 {rel_path}")
+        elif check_hash and _sha256(path) != expected["sha256"]:
+            problems.append(f"校验和不一致 {rel_path}")
+
+    if problems:
+        raise RuntimeError(f"模型文件校验失败 ({model_dir}): {'; '.join(problems)}")
+
+    return manifest
+
+
+def manifest_digest(manifest: Dict[str, Any]) -> str:
+    """清单摘要：由各文件的SHA-256得出，任一文件变化都会改变该值（不读取模型文件）"""
+    payload = json.dumps(
+        {path: item["sha256"] for path, item in manifest.get("files", {}).items()},
+        sort_keys=True
+    ).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+def manifest_model_id(manifest: Dict[str, Any]) -> str:
+    """
+    清单对应的模型标识，用作嵌入缓存键的一部分
+
+    Returns:
+        如 "paraphrase-multilingual-MiniLM-L12-v2@3f2a9c1d0b7e"
+    """
+    return f"{manifest['model_name']}@{manifest_digest(manifest)}"
@@ -0,0 +1,524 @@
+"""
+进程内NumPy精确检索向量库 - Chroma的轻量替代
+
+每个集合是一个目录：
+- vectors.npy: 归一化后的float32向量矩阵（内存映射，按容量预分配，行可复用）
+- vectors.float16.npy / vectors.int8.npy + scales.npy: 可选的低精度副本（检索用）
+- meta.sqlite: 行号 -> 文档ID/文本/元数据（JSON）的旁路表
+
+检索为向量化的余弦相似度 + argpartition 取top-k，结果格式与Chroma一致，
+距离为余弦距离 1 - cos。客户端/集合只实现 VectorStore 用到的 Chroma 接口子集。
+
+低精度模式下全量扫描只读取 float16（或 int8 + 每向量缩放系数）副本，常驻内存约为
+float32 的 1/2（或 1/4）；float32 原始向量留在磁盘上，只在重排时按候选行读取。
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """按行L2归一化"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _quantize(vectors: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    把float32向量转换为低精度表示
+
+    Args:
+        vectors: 归一化后的float32矩阵
+        precision: float16 / int8
+
+    Returns:
+        (低精度矩阵, 每向量缩放系数)；float16 没有缩放系数
+    """
+    if precision == "float16":
+        return vectors.astype(np.float16), None
+
+    # int8 对称量化：每个向量按其最大绝对值缩放到 [-127, 127]
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _resize_memmap(path: str, old: Optional[np.ndarray], capacity: int, dtype, width: Optional[int]) -> np.ndarray:
+    """创建（或扩容）.npy 内存映射文件：写入临时文件后原子替换"""
+    shape = (capacity, width) if width else (capacity,)
+    tmp_path = f"{path}.tmp.npy"
+    grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    if old is not None:
+        grown[:old.shape[0]] = old
+    grown.flush()
+    del grown
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r+")
+
+
+class NumpyCollection:
+    """NumPy向量集合"""
+
+    INITIAL_CAPACITY = 1024
+    SCAN_BLOCK_ROWS = 8192  # 低精度扫描时每块转换为float32的行数（限制临时内存）
+
+    def __init__(self, name: str, directory: str, precision: str = "float32", rerank_factor: int = 0):
+        """
+        打开（或创建）集合
+
+        Args:
+            name: 集合名称
+            directory: 集合目录
+            precision: 检索使用的向量精度 float32 / float16 / int8
+            rerank_factor: 低精度检索时取 top_k×该倍数 的候选用float32重排，0 表示不重排
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"不支持的向量精度: {precision}，可选 {PRECISIONS}")
+
+        self.name = name
+        self.directory = directory
+        self.precision = precision
+        self.rerank_factor = max(0, rerank_factor)
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(directory, "vectors.npy")
+        self._compact_path = os.path.join(directory, f"vectors.{precision}.npy")
+        self._scales_path = os.path.join(directory, "scales.npy")
+        self._db = sqlite3.connect(os.path.join(directory, "meta.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT
+            )
+            """
+        )
+        self._db.commit()
+
+        self._vectors: Optional[np.ndarray] = None
+        if os.path.exists(self._vectors_path):
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+        # 行号映射与有效行掩码（由旁路表重建）
+        self._row_of: Dict[str, int] = {}
+        for row, doc_id in self._db.execute("SELECT row, doc_id FROM rows"):
+            self._row_of[doc_id] = row
+        capacity = self._vectors.shape[0] if self._vectors is not None else 0
+        self._valid = np.zeros(capacity, dtype=bool)
+        if self._row_of:
+            self._valid[list(self._row_of.values())] = True
+        self._size = max(self._row_of.values()) + 1 if self._row_of else 0
+        self._free = [row for row in range(self._size - 1, -1, -1) if not self._valid[row]]
+
+        # 其他精度的副本不会随写入更新，删除以免切换回去时读到过期数据
+        for other in PRECISIONS[1:]:
+            if other != precision:
+                self._remove_file(os.path.join(directory, f"vectors.{other}.npy"))
+        if precision != "int8":
+            self._remove_file(self._scales_path)
+
+        # 低精度副本（float32 模式下检索直接使用原始向量）
+        self._compact: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        if precision != "float32" and self._vectors is not None:
+            self._load_compact()
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _load_compact(self) -> None:
+        """打开低精度副本；缺失或与原始向量不一致（如切换了精度配置）时由float32向量重新生成"""
+        capacity, dimension = self._vectors.shape
+        if os.path.exists(self._compact_path):
+            self._compact = np.load(self._compact_path, mmap_mode="r+")
+            if self.precision == "int8" and os.path.exists(self._scales_path):
+                self._scales = np.load(self._scales_path, mmap_mode="r+")
+            if self._compact.shape == (capacity, dimension) and (
+                self.precision != "int8" or (self._scales is not None and self._scales.shape == (capacity,))
+            ):
+                return
+
+        print(f"🔄 [NumPy向量库] 集合 {self.name} 生成 {self.precision} 副本...")
+        self._compact = _resize_memmap(self._compact_path, None, capacity, self.precision, dimension)
+        if self.precision == "int8":
+            self._scales = _resize_memmap(self._scales_path, None, capacity, np.float32, None)
+        for start in range(0, self._size, self.SCAN_BLOCK_ROWS):
+            end = min(self._size, start + self.SCAN_BLOCK_ROWS)
+            compact, scales = _quantize(np.asarray(self._vectors[start:end]), self.precision)
+            self._compact[start:end] = compact
+            if scales is not None:
+                self._scales[start:end] = scales
+        self._compact.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    # ---------- 写入 ----------
+
+    def _ensure_capacity(self, rows_needed: int, dimension: int) -> None:
+        """确保向量矩阵至少有 rows_needed 行（按倍数扩容并原子替换文件）"""
+        if self._vectors is not None and self._vectors.shape[1] != dimension:
+            raise ValueError(f"向量维度不一致: 集合为 {self._vectors.shape[1]}，写入为 {dimension}")
+
+        if self._vectors is None or rows_needed > self._vectors.shape[0]:
+            if self._vectors is None:
+                capacity = max(self.INITIAL_CAPACITY, rows_needed)
+            else:
+                capacity = max(rows_needed, self._vectors.shape[0] * 2)
+            self._vectors = _resize_memmap(self._vectors_path, self._vectors, capacity, np.float32, dimension)
+            if self.precision != "float32":
+                self._compact = _resize_memmap(self._compact_path, self._compact, capacity, self.precision, dimension)
+                if self.precision == "int8":
+                    self._scales = _resize_memmap(self._scales_path, self._scales, capacity, np.float32, None)
+
+        if self._valid.shape[0] < self._vectors.shape[0]:
+            valid = np.zeros(self._vectors.shape[0], dtype=bool)
+            valid[:self._valid.shape[0]] = self._valid
+            self._valid = valid
+
+    def _write(self, ids, embeddings, documents, metadatas, upsert: bool) -> None:
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock:
+            # 同一批内重复的ID以最后一条为准；add 模式下忽略已存在的ID（与Chroma一致）
+            latest = {}
+            for position, doc_id in enumerate(ids):
+                if upsert or doc_id not in self._row_of:
+                    latest[doc_id] = position
+            if not latest:
+                return
+
+            rows = []
+            for doc_id in latest:
+                row = self._row_of.get(doc_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._size
+                    self._size = max(self._size, row + 1)
+                rows.append(row)
+
+            self._ensure_capacity(self._size, vectors.shape[1])
+            positions = list(latest.values())
+            self._vectors[rows] = vectors[positions]
+            self._vectors.flush()
+            if self._compact is not None:
+                compact, scales = _quantize(vectors[positions], self.precision)
+                self._compact[rows] = compact
+                self._compact.flush()
+                if scales is not None:
+                    self._scales[rows] = scales
+                    self._scales.flush()
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rows (row, doc_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (row, doc_id, documents[position], json.dumps(metadatas[position], ensure_ascii=False))
+                    for row, (doc_id, position) in zip(rows, latest.items())
+                ]
+            )
+            self._db.commit()
+
+            for row, doc_id in zip(rows, latest):
+                self._row_of[doc_id] = row
+            self._valid[rows] = True
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        """添加文档（已存在的ID被忽略）"""
+        self._write(ids, embeddings, documents, metadatas, upsert=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        """新增或覆盖文档"""
+        self._write(ids, embeddings, documents, metadatas, upsert=True)
+
+    def delete(self, ids) -> None:
+        """删除文档（不存在的ID被忽略），释放的行供后续写入复用"""
+        with self._lock:
+            rows = [self._row_of.pop(doc_id) for doc_id in ids if doc_id in self._row_of]
+            if not rows:
+                return
+            self._db.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+            self._valid[rows] = False
+            self._free.extend(rows)
+
+    # ---------- 读取 ----------
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def get(self, ids=None, include=None, limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        """
+        按行号顺序分页读取文档（接口同 Chroma 的 collection.get）
+
+        指定 ids 时只读取这些文档（不存在的忽略）；include 含 "embeddings" 时返回float32向量矩阵
+        """
+        include = include or ["metadatas", "documents"]
+        with self._lock:
+            if ids is not None:
+                wanted = sorted(self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of)
+                rows = [
+                    self._db.execute("SELECT doc_id, document, metadata FROM rows WHERE row = ?", (row,)).fetchone()
+                    for row in wanted
+                ]
+            else:
+                rows = self._db.execute(
+                    "SELECT doc_id, document, metadata FROM rows ORDER BY row LIMIT ? OFFSET ?",
+                    (limit if limit is not None else -1, offset)
+                ).fetchall()
+            embeddings = None
+            if "embeddings" in include:
+                row_numbers = [self._row_of[row[0]] for row in rows]
+                embeddings = np.array(self._vectors[row_numbers], dtype=np.float32) if row_numbers else np.empty((0, 0), dtype=np.float32)
+
+        result: Dict[str, Any] = {"ids": [row[0] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[2]) if row[2] else None for row in rows]
+        if embeddings is not None:
+            result["embeddings"] = embeddings
+        return result
+
+    def _where_mask(self, where: Dict[str, Any], size: int) -> np.ndarray:
+        """元数据等值过滤（支持 {key: value} 和 {key: {"$eq": value}}）"""
+        clauses = []
+        params = []
+        for key, condition in where.items():
+            if isinstance(condition, dict):
+                if set(condition) != {"$eq"}:
+                    raise ValueError(f"NumPy向量库只支持等值过滤: {condition}")
+                condition = condition["$eq"]
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", condition])
+
+        with self._lock:
+            matched = [
+                row for (row,) in self._db.execute(
+                    f"SELECT row FROM rows WHERE {' AND '.join(clauses)}", params
+                )
+            ]
+        mask = np.zeros(size, dtype=bool)
+        matched = [row for row in matched if row < size]
+        mask[matched] = True
+        return mask
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """
+        精确余弦检索
+
+        Args:
+            query_embeddings: 查询向量（一个或多个）
+            n_results: 每个查询返回的结果数
+            where: 元数据等值过滤
+
+        Returns:
+            与Chroma一致的结果 {ids, documents, distances, metadatas}，每项为每个查询一个列表
+        """
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        empty = {
+            "ids": [[] for _ in range(len(queries))],
+            "documents": [[] for _ in range(len(queries))],
+            "distances": [[] for _ in range(len(queries))],
+            "metadatas": [[] for _ in range(len(queries))]
+        }
+
+        with self._lock:
+            size = self._size
+            if self._vectors is None or size == 0:
+                return empty
+            # 取当前数组的引用：并发写入扩容会替换数组对象，但旧映射仍然有效
+            vectors = self._vectors
+            compact = self._compact
+            scales = self._scales
+            mask = self._valid[:size].copy()
+
+        if where:
+            mask &= self._where_mask(where, size)
+        valid_count = int(mask.sum())
+        k = min(n_results, valid_count)
+        if k <= 0:
+            return empty
+
+        if compact is None:
+            scores = queries @ vectors[:size].T
+            candidates = k
+        else:
+            scores = self._scan_compact(queries, compact, scales, size)
+            candidates = min(valid_count, k * self.rerank_factor) if self.rerank_factor else k
+        scores[:, ~mask] = -np.inf
+
+        # argpartition 取top候选，再只对这些候选排序
+        top = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+
+        if compact is not None and self.rerank_factor:
+            # 重排：只读取候选行的float32原始向量，计算精确分数
+            full = np.asarray(vectors[top.ravel()]).reshape(top.shape[0], candidates, -1)
+            top_scores = np.einsum("qkd,qd->qk", full, queries)
+
+        order = np.argsort(-top_scores, axis=1)[:, :k]
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        needed = sorted({int(row) for row in top.ravel()})
+        with self._lock:
+            records = {}
+            for start in range(0, len(needed), 500):
+                chunk = needed[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row, doc_id, document, metadata in self._db.execute(
+                    f"SELECT row, doc_id, document, metadata FROM rows WHERE row IN ({placeholders})",
+                    chunk
+                ):
+                    records[row] = (doc_id, document, json.loads(metadata) if metadata else None)
+
+        result = {"ids": [], "documents": [], "distances": [], "metadatas": []}
+        for rows, row_scores in zip(top, top_scores):
+            ids, documents, distances, metadatas = [], [], [], []
+            for row, score in zip(rows, row_scores):
+                record = records.get(int(row))
+                if record is None:
+                    # 检索期间被并发删除
+                    continue
+                ids.append(record[0])
+                documents.append(record[1])
+                distances.append(float(1.0 - score))
+                metadatas.append(record[2])
+            result["ids"].append(ids)
+            result["documents"].append(documents)
+            result["distances"].append(distances)
+            result["metadatas"].append(metadatas)
+        return result
+
+    def _scan_compact(
+        self,
+        queries: np.ndarray,
+        compact: np.ndarray,
+        scales: Optional[np.ndarray],
+        size: int
+    ) -> np.ndarray:
+        """
+        在低精度副本上计算近似余弦相似度
+
+        按块转换为float32后做矩阵乘法（NumPy没有float16/int8的BLAS路径），
+        临时内存只占一块的大小。
+
+        Returns:
+            形状为 (查询数, size) 的float32分数矩阵
+        """
+        scores = np.empty((queries.shape[0], size), dtype=np.float32)
+        for start in range(0, size, self.SCAN_BLOCK_ROWS):
+            end = min(size, start + self.SCAN_BLOCK_ROWS)
+            block = queries @ compact[start:end].astype(np.float32).T
+            if scales is not None:
+                block *= scales[start:end]
+            scores[:, start:end] = block
+        return scores
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """检索扫描的向量数据大小（字节）"""
+        with self._lock:
+            size = self._size
+            if self._vectors is None:
+                return {"precision": self.precision, "scan_bytes": 0, "full_precision_bytes": 0}
+            dimension = self._vectors.shape[1]
+            full_bytes = size * dimension * 4
+            if self._compact is None:
+                scan_bytes = full_bytes
+            else:
+                scan_bytes = size * dimension * self._compact.dtype.itemsize
+                if self._scales is not None:
+                    scan_bytes += size * 4
+        return {"precision": self.precision, "scan_bytes": scan_bytes, "full_precision_bytes": full_bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._compact = None
+            self._scales = None
+            self._db.close()
+
+
+class NumpyVectorClient:
+    """NumPy向量库客户端（接口与 chromadb.PersistentClient 的子集一致）"""
+
+    def __init__(self, path: str, precision: str = "float32", rerank_factor: int = 0):
+        """
+        Args:
+            path: 存储根目录，每个集合一个子目录
+            precision: 检索使用的向量精度 float32 / float16 / int8
+            rerank_factor: 低精度检索的重排候选倍数，0 表示不重排
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"不支持的向量精度: {precision}，可选 {PRECISIONS}")
+        self.path = path
+        self.precision = precision
+        self.rerank_factor = rerank_factor
+        os.makedirs(path, exist_ok=True)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self, name: str) -> NumpyCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = NumpyCollection(
+                name, self._directory(name),
+                precision=self.precision,
+                rerank_factor=self.rerank_factor
+            )
+            self._collections[name] = collection
+        return collection
+
+    def list_collections(self) -> List[NumpyCollection]:
+        with self._lock:
+            return [
+                self._open(name) for name in sorted(os.listdir(self.path))
+                if os.path.isdir(self._directory(name))
+            ]
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if not os.path.isdir(self._directory(name)):
+                raise ValueError(f"Collection {name} does not exist.")
+            return self._open(name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        # 只支持余弦距离，metadata 仅为兼容Chroma接口
+        with self._lock:
+            return self._open(name)
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        with self._lock:
+            if os.path.isdir(self._directory(name)):
+                raise ValueError(f"Collection {name} already exists.")
+            return self._open(name)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            if not os.path.isdir(self._directory(name)):
+                raise ValueError(f"Collection {name} does not exist.")
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(self._directory(name))
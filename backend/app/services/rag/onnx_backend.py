@@ -0,0 +1,98 @@
+"""
+ONNX Runtime 推理后端 - 在纯CPU节点上替代PyTorch推理
+
+模型目录由 scripts/export_onnx_model.py 生成，包含：
+- model.onnx / model_quantized.onnx: 导出的Transformer（输出token级隐藏状态）
+- tokenizer 文件
+- onnx_config.json: 最大序列长度等推理参数
+- manifest.json: 文件校验清单
+"""
+import json
+import os
+from typing import List
+
+import numpy as np
+
+
+class OnnxEmbeddingBackend:
+    """onnxruntime 推理后端，输出与 SentenceTransformer 一致的均值池化句向量"""
+
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: int = 0, batch_size: int = 32):
+        """
+        初始化ONNX推理后端
+
+        Args:
+            model_dir: ONNX模型目录
+            quantized: 是否加载int8量化模型
+            num_threads: 推理线程数，0为onnxruntime默认
+            batch_size: 单次推理的最大文本数
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "onnx_config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.max_seq_length = config.get("max_seq_length", 128)
+        self.batch_size = batch_size
+
+        model_file = "model_quantized.onnx" if quantized else "model.onnx"
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.isfile(model_path):
+            raise RuntimeError(f"ONNX模型文件不存在: {model_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        批量编码
+
+        按文本长度排序后分批推理以减少padding，最后恢复原始顺序。
+
+        Args:
+            texts: 输入文本列表
+
+        Returns:
+            形状为 (len(texts), dimension) 的float32矩阵
+        """
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        chunks = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [texts[i] for i in order[start:start + self.batch_size]]
+            chunks.append(self._encode_batch(batch))
+
+        embeddings = np.concatenate(chunks, axis=0)
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        inputs = {
+            name: np.asarray(value, dtype=np.int64)
+            for name, value in encoded.items()
+            if name in self.input_names
+        }
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # 均值池化（与 SentenceTransformer 的 Pooling 层一致，忽略padding）
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype(np.float32)
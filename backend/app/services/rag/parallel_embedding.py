@@ -0,0 +1,132 @@
+"""
+多进程嵌入引擎 - 用于批量重建索引
+
+文本按长度排序后切分为分片，分发到进程池中编码（每个工作进程只加载一次模型），
+结果按输入顺序返回。
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import settings
+
+
+# 工作进程内的推理后端（每个进程初始化一次）
+_worker_backend = None
+
+
+def _init_worker(backend: str, threads_per_worker: int) -> None:
+    """工作进程初始化：限制线程数并加载模型"""
+    global _worker_backend
+    from app.services.rag.embedding_service import create_embedding_backend
+
+    if threads_per_worker > 0:
+        # 避免多个进程各自占满所有核导致的线程争用
+        settings.EMBEDDING_ONNX_THREADS = threads_per_worker
+        try:
+            import torch
+            torch.set_num_threads(threads_per_worker)
+        except ImportError:
+            pass
+
+    _worker_backend, _ = create_embedding_backend(backend)
+
+
+def _encode_shard(texts: List[str]) -> np.ndarray:
+    """在工作进程中编码一个分片"""
+    return _worker_backend.encode(texts)
+
+
+class ParallelEmbeddingEngine:
+    """进程池嵌入引擎"""
+
+    def __init__(self, num_workers: int, shard_size: int = 64, threads_per_worker: int = 1):
+        """
+        初始化引擎（进程池在首次使用时创建）
+
+        Args:
+            num_workers: 工作进程数
+            shard_size: 每个分片的文本数量
+            threads_per_worker: 每个工作进程的推理线程数
+        """
+        self.num_workers = num_workers
+        self.shard_size = max(1, shard_size)
+        self.threads_per_worker = threads_per_worker
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn 避免 fork 继承父进程中已初始化的推理线程池
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(settings.EMBEDDING_BACKEND, self.threads_per_worker)
+                )
+            return self._executor
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        并行编码
+
+        Args:
+            texts: 输入文本列表
+
+        Returns:
+            形状为 (len(texts), dimension) 的float32矩阵，顺序与输入一致
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # 按长度排序，使同一分片内的文本长度接近，减少padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+        shards = [
+            sorted_texts[start:start + self.shard_size]
+            for start in range(0, len(sorted_texts), self.shard_size)
+        ]
+
+        # executor.map 按提交顺序返回结果
+        embeddings = np.concatenate(list(self._get_executor().map(_encode_shard, shards)), axis=0)
+
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+# 全局单例
+_engine: Optional[ParallelEmbeddingEngine] = None
+_engine_lock = threading.Lock()
+
+def get_parallel_embedding_engine() -> Optional[ParallelEmbeddingEngine]:
+    """获取多进程嵌入引擎单例，未配置工作进程时返回None"""
+    global _engine
+    if settings.EMBEDDING_WORKERS <= 1:
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ParallelEmbeddingEngine(
+                    num_workers=settings.EMBEDDING_WORKERS,
+                    shard_size=settings.EMBEDDING_WORKER_SHARD_SIZE,
+                    threads_per_worker=settings.EMBEDDING_WORKER_THREADS
+                )
+    return _engine
+
+
+def shutdown_parallel_embedding_engine() -> None:
+    """关闭多进程嵌入引擎（应用退出时调用）"""
+    if _engine is not None:
+        _engine.shutdown()
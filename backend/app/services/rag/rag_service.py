@@ -1,10 +1,25 @@
 """
 RAG推荐服务 - 基于相似对话推荐标签
 """
-from typing import List, Dict, Any, Optional
+import threading
+from typing import Callable, Iterable, List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings
 from app.services.rag.vector_store import get_vector_store
 from app.services.rag.embedding_service import get_embedding_service
-import json
+from app.services.rag.index_sync import parse_manual_tags, reconcile_vectors
+from app.services.rag.lexical_index import LexicalIndex, get_lexical_index, get_lexical_revision
+from app.services.rag.result_cache import RecommendationCache
+from app.services.rag.tag_aggregation import aggregate_tag_votes
+from app.services.rag.tag_centroids import get_tag_centroid_classifier, is_tag_centroid_enabled
+from app.services.rag.tag_classifier import get_tag_classifier, is_tag_classifier_enabled
+from app.services.rag.tag_vocabulary import TagVocabulary, get_tag_vocabulary, parse_tag_ids
+
+
+class IndexBuildCancelled(Exception):
+    """索引构建被取消"""
 
 
 class RAGRecommender:
@@ -14,6 +29,12 @@ class RAGRecommender:
         """初始化RAG推荐服务"""
         self.vector_store = get_vector_store()
         self.embedding_service = get_embedding_service()
+        
+        # 推荐结果缓存（索引变化后自动失效）
+        self.result_cache = RecommendationCache(
+            max_items=settings.RECOMMEND_CACHE_MAX_ITEMS,
+            ttl_seconds=settings.RECOMMEND_CACHE_TTL_SECONDS
+        )
     
     def recommend_tags(
         self,
@@ -32,116 +53,402 @@ class RAGRecommender:
         Returns:
             推荐结果，包含推荐标签、相似对话、置信度
         """
-        # 搜索相似对话
-        similar_conversations = self.vector_store.search_similar(
-            query_text=conversation_text,
-            top_k=top_k
+        # 先查缓存（令牌在检索前读取，检索期间索引变化时结果不会以新令牌缓存）
+        cache_key = RecommendationCache.make_key(
+            conversation_text, top_k, min_similarity, self._cache_token()
         )
-        
-        # 过滤低相似度结果（Chroma使用余弦距离，越小越相似）
-        # 余弦距离范围 [0, 2]，0表示完全相同，2表示完全相反
-        # 转换为相似度：相似度 = 1 - 距离/2
-        filtered_results = []
-        for conv in similar_conversations:
-            similarity = 1 - conv['distance'] / 2
-            if similarity >= min_similarity:
-                conv['similarity'] = similarity
-                filtered_results.append(conv)
-        
-        # 如果没有找到相似的对话
-        if not filtered_results:
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 搜索相似对话
+        similar_conversations = self._retrieve(conversation_text, top_k)
+
+        result = self._build_recommendation(similar_conversations, min_similarity)
+        self.result_cache.put(cache_key, result)
+        return result
+
+    def recommend_tags_batch(
+        self,
+        conversation_texts: List[str],
+        top_k: int = 3,
+        min_similarity: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """
+        批量推荐标签：所有文本一次编码、一次索引查询
+
+        Args:
+            conversation_texts: 对话文本列表
+            top_k: 每条对话参考的相似对话数量
+            min_similarity: 最小相似度阈值
+
+        Returns:
+            与输入顺序一致的推荐结果列表，每项格式同 recommend_tags
+        """
+        token = self._cache_token()
+        cache_keys = [
+            RecommendationCache.make_key(text, top_k, min_similarity, token)
+            for text in conversation_texts
+        ]
+        results = [self.result_cache.get(key) for key in cache_keys]
+
+        # 只检索未命中缓存的文本
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            batch_results = self._retrieve_batch([conversation_texts[i] for i in missing], top_k)
+            built = self._build_recommendations(batch_results, min_similarity)
+            for i, result in zip(missing, built):
+                results[i] = result
+                self.result_cache.put(cache_keys[i], result)
+
+        return results
+
+    def recommend_tags_by_centroid(self, conversation_text: str) -> Dict[str, Any]:
+        """
+        用标签质心模型推荐标签（一次编码 + 一次矩阵乘法，不检索索引）
+
+        Args:
+            conversation_text: 当前对话文本
+
+        Returns:
+            推荐结果，包含推荐标签、标签得分、置信度；模型未启用或未训练时 success 为 False
+        """
+        classifier = get_tag_centroid_classifier() if is_tag_centroid_enabled() else None
+        if classifier is None or not classifier.is_trained():
             return {
-                "success": True,
+                "success": False,
+                "source": "tag_centroid",
                 "recommendations": [],
-                "similar_conversations": [],
                 "confidence": 0.0,
-                "message": "未找到相似的已审核对话"
+                "message": "标签质心模型未启用或尚未训练"
             }
-        
-        # 提取标签并统计频率
-        tag_frequency = {}
-        for conv in filtered_results:
-            tags_str = conv['metadata'].get('tags', '')
-            if tags_str:
-                tags = tags_str.split(',')
-                for tag in tags:
-                    if tag:
-                        tag_frequency[tag] = tag_frequency.get(tag, 0) + 1
-        
-        # 按频率排序标签
-        recommended_tags = sorted(
-            tag_frequency.items(),
-            key=lambda x: (x[1], x[0]),
-            reverse=True
+
+        embedding = self.vector_store.query_embedder.embed_text(conversation_text)
+        return classifier.recommend(embedding)
+
+    def recommend_tags_by_classifier(self, conversation_text: str) -> Dict[str, Any]:
+        """
+        用多标签分类模型推荐标签（一次编码 + 一次矩阵乘法，不检索索引）
+
+        Args:
+            conversation_text: 当前对话文本
+
+        Returns:
+            推荐结果，包含推荐标签、标签概率、置信度、模型版本；模型未启用或未训练时 success 为 False
+        """
+        classifier = get_tag_classifier() if is_tag_classifier_enabled() else None
+        if classifier is None:
+            return {
+                "success": False,
+                "source": "tag_classifier",
+                "recommendations": [],
+                "confidence": 0.0,
+                "message": "标签分类模型未启用或尚未训练"
+            }
+
+        embedding = self.vector_store.query_embedder.embed_text(conversation_text)
+        return classifier.recommend(embedding)
+
+    def _cache_token(self) -> tuple:
+        """推荐结果缓存令牌：向量索引令牌 + 检索模式 + 词法索引修订号"""
+        return (*self.vector_store.get_cache_token(), settings.RAG_RETRIEVAL_MODE, get_lexical_revision())
+
+    def _retrieve(self, text: str, top_k: int, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按检索模式查找相似对话
+
+        Args:
+            text: 查询文本
+            top_k: 返回结果数量
+            mode: dense / hybrid / lexical，默认取配置
+
+        Returns:
+            相似对话列表（词法/混合结果带有 similarity 字段）
+        """
+        mode = mode or settings.RAG_RETRIEVAL_MODE
+        lexical = get_lexical_index() if mode in ("hybrid", "lexical") else None
+        if lexical is None:
+            # 向量检索（词法索引尚未构建完成时也回退到这里）
+            return self.vector_store.search_similar(query_text=text, top_k=top_k)
+        if mode == "lexical":
+            return lexical.search(text, top_k)
+
+        candidates = top_k * max(1, settings.RAG_HYBRID_CANDIDATE_FACTOR)
+        dense = self.vector_store.search_similar(query_text=text, top_k=candidates)
+        return self._fuse(text, dense, lexical, top_k, candidates)
+
+    def _retrieve_batch(self, texts: List[str], top_k: int, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """批量版 _retrieve：向量部分一次编码、一次索引查询"""
+        mode = mode or settings.RAG_RETRIEVAL_MODE
+        lexical = get_lexical_index() if mode in ("hybrid", "lexical") else None
+        if lexical is None:
+            return self.vector_store.search_similar_batch(texts=texts, top_k=top_k)
+        if mode == "lexical":
+            return [lexical.search(text, top_k) for text in texts]
+
+        candidates = top_k * max(1, settings.RAG_HYBRID_CANDIDATE_FACTOR)
+        dense_batch = self.vector_store.search_similar_batch(texts=texts, top_k=candidates)
+        return [
+            self._fuse(text, dense, lexical, top_k, candidates)
+            for text, dense in zip(texts, dense_batch)
+        ]
+
+    @staticmethod
+    def _fuse(
+        text: str,
+        dense: List[Dict[str, Any]],
+        lexical: LexicalIndex,
+        top_k: int,
+        candidates: int
+    ) -> List[Dict[str, Any]]:
+        """
+        融合向量与BM25两路候选
+
+        融合相似度 = w·向量相似度 + (1-w)·BM25相似度。只被BM25召回的候选没有向量距离，
+        用向量候选中的最低相似度作为估计（它不在向量top-N中，真实值不会更高）。
+
+        Args:
+            text: 查询文本
+            dense: 向量检索结果
+            lexical: 词法索引
+            top_k: 返回结果数量
+            candidates: BM25一路的候选数量
+
+        Returns:
+            按融合相似度排序的前 top_k 条结果
+        """
+        weight = settings.RAG_HYBRID_DENSE_WEIGHT
+
+        merged = {}
+        for conv in dense:
+            merged[conv['metadata'].get('conversation_id')] = {
+                **conv,
+                'dense_similarity': 1 - conv['distance'] / 2
+            }
+        dense_floor = min((conv['dense_similarity'] for conv in merged.values()), default=0.0)
+
+        lexical_results, lexical_scores = lexical.search_with_scores(text, candidates, list(merged))
+        for conv in lexical_results:
+            conversation_id = conv['metadata']['conversation_id']
+            lexical_scores.setdefault(conversation_id, conv['similarity'])
+            if conversation_id not in merged:
+                merged[conversation_id] = {**conv, 'dense_similarity': dense_floor}
+
+        for conversation_id, conv in merged.items():
+            conv['lexical_similarity'] = lexical_scores.get(conversation_id, 0.0)
+            conv['similarity'] = weight * conv['dense_similarity'] + (1 - weight) * conv['lexical_similarity']
+
+        fused = sorted(merged.values(), key=lambda conv: conv['similarity'], reverse=True)
+        return fused[:top_k]
+
+    def _build_recommendation(
+        self,
+        similar_conversations: List[Dict[str, Any]],
+        min_similarity: float
+    ) -> Dict[str, Any]:
+        """单条版 _build_recommendations"""
+        return self._build_recommendations([similar_conversations], min_similarity)[0]
+
+    def _build_recommendations(
+        self,
+        batch_similar: List[List[Dict[str, Any]]],
+        min_similarity: float
+    ) -> List[Dict[str, Any]]:
+        """
+        根据相似对话汇总推荐标签（批量）
+
+        标签以整数ID表示，所有查询的近邻投票按相似度加权后一次性用 NumPy 聚合，
+        tag_scores 为 0~1 的校准得分（见 tag_aggregation），tag_counts 为支持该标签的近邻数。
+
+        Args:
+            batch_similar: 每个查询的相似对话（search_similar 的返回格式）
+            min_similarity: 最小相似度阈值
+
+        Returns:
+            与输入顺序一致的推荐结果，每项包含推荐标签、标签得分、相似对话、置信度
+        """
+        # 过滤低相似度结果（Chroma使用余弦距离，越小越相似）
+        # 余弦距离范围 [0, 2]，0表示完全相同，2表示完全相反
+        # 转换为相似度：相似度 = 1 - 距离/2（词法/混合检索的结果已带有相似度）
+        batch_filtered = []
+        for similar_conversations in batch_similar:
+            filtered_results = []
+            for conv in similar_conversations:
+                similarity = conv['similarity'] if 'similarity' in conv else 1 - conv['distance'] / 2
+                if similarity >= min_similarity:
+                    conv['similarity'] = similarity
+                    filtered_results.append(conv)
+            batch_filtered.append(filtered_results)
+
+        vocabulary = get_tag_vocabulary()
+        neighbor_tag_ids = [
+            [self._neighbor_tag_ids(conv['metadata'], vocabulary) for conv in filtered_results]
+            for filtered_results in batch_filtered
+        ]
+        scores, counts = aggregate_tag_votes(
+            neighbor_tag_ids,
+            [[conv['similarity'] for conv in filtered_results] for filtered_results in batch_filtered],
+            vocab_size=len(vocabulary),
+            temperature=settings.RAG_TAG_WEIGHT_TEMPERATURE,
+            rank_decay=settings.RAG_TAG_RANK_DECAY,
+            shrinkage=settings.RAG_TAG_SCORE_SHRINKAGE
         )
-        
-        # 计算置信度（基于最高相似度和结果数量）
-        max_similarity = max(conv['similarity'] for conv in filtered_results)
-        confidence = min(0.95, max_similarity * (1 + len(filtered_results) * 0.1))
-        
-        # 格式化相似对话（去掉嵌入向量）
-        similar_convs = []
-        for conv in filtered_results[:3]:  # 最多返回3个相似对话
-            similar_convs.append({
-                "conversation_id": conv['metadata'].get('conversation_id'),
-                "text": conv['text'][:200] + "..." if len(conv['text']) > 200 else conv['text'],
-                "tags": conv['metadata'].get('tags', '').split(','),
-                "similarity": round(conv['similarity'], 3)
+
+        results = []
+        for q, filtered_results in enumerate(batch_filtered):
+            # 如果没有找到相似的对话
+            if not filtered_results:
+                results.append({
+                    "success": True,
+                    "recommendations": [],
+                    "similar_conversations": [],
+                    "confidence": 0.0,
+                    "message": "未找到相似的已审核对话"
+                })
+                continue
+
+            # 按得分排序标签（得分相同时按支持数）
+            supported = np.flatnonzero(counts[q])
+            supported = supported[scores[q, supported] >= settings.RAG_TAG_MIN_SCORE]
+            order = np.lexsort((-counts[q, supported], -scores[q, supported]))
+            recommended_tags = [
+                (vocabulary.decode(tag_id), float(scores[q, tag_id]), int(counts[q, tag_id]))
+                for tag_id in supported[order]
+            ]
+
+            # 计算置信度（基于最高相似度和结果数量）
+            max_similarity = max(conv['similarity'] for conv in filtered_results)
+            confidence = min(0.95, max_similarity * (1 + len(filtered_results) * 0.1))
+
+            # 格式化相似对话（去掉嵌入向量）
+            similar_convs = []
+            for conv in filtered_results[:3]:  # 最多返回3个相似对话
+                similar_convs.append({
+                    "conversation_id": conv['metadata'].get('conversation_id'),
+                    "text": conv['text'][:200] + "..." if len(conv['text']) > 200 else conv['text'],
+                    "tags": conv['metadata'].get('tags', '').split(','),
+                    "similarity": round(conv['similarity'], 3)
+                })
+
+            results.append({
+                "success": True,
+                "recommendations": [tag for tag, score, count in recommended_tags],
+                "tag_scores": {tag: round(score, 3) for tag, score, count in recommended_tags},
+                "tag_counts": {tag: count for tag, score, count in recommended_tags},
+                "similar_conversations": similar_convs,
+                "confidence": round(confidence, 3),
+                "message": f"基于 {len(filtered_results)} 条相似对话推荐"
             })
-        
-        return {
-            "success": True,
-            "recommendations": [tag for tag, count in recommended_tags],
-            "tag_scores": {tag: count for tag, count in recommended_tags},
-            "similar_conversations": similar_convs,
-            "confidence": round(confidence, 3),
-            "message": f"基于 {len(filtered_results)} 条相似对话推荐"
-        }
+
+        return results
+
+    @staticmethod
+    def _neighbor_tag_ids(metadata: Dict[str, Any], vocabulary: TagVocabulary) -> np.ndarray:
+        """
+        近邻的标签ID
+
+        元数据中的 tag_ids 与当前词表版本一致且都在词表范围内时直接使用；
+        否则（旧索引、词法结果、词表文件被替换或未同步）按 tags 字符串重新编码
+        """
+        tag_ids = metadata.get('tag_ids')
+        if tag_ids is not None and metadata.get('tag_vocab') == vocabulary.version:
+            ids = parse_tag_ids(tag_ids)
+            if not ids.size or ids.max() < len(vocabulary):
+                return ids
+        return vocabulary.encode_joined(metadata.get('tags', ''))
     
-    def build_vector_index(self, conversations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def build_vector_index(
+        self,
+        conversations: Iterable[Dict[str, Any]],
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        reconcile: bool = True
+    ) -> Dict[str, Any]:
         """
         构建向量索引
         
+        写入新版本集合，完成后原子切换为当前版本；重建期间查询仍使用旧版本。
+        对话按分块流式读取、编码、写入，内存占用与语料规模无关。
+        
+        重建期间的增量同步会同时写入新版本，但可能早于构建写入同一条对话：
+        对话读取后被删除、取消审核或改了标签，构建随后写入的仍是读取时的状态。
+        因此切换前先以数据库为准对新版本对账。
+        
         Args:
-            conversations: 对话列表，每个包含 id, text, manual_tag
+            conversations: 对话列表或迭代器，每个包含 id, raw_text, manual_tag
+            progress_callback: 进度回调 (阶段 scanned/embedded/written, 数量)，
+                抛出 IndexBuildCancelled 可取消构建
+            reconcile: 切换前是否以数据库为准对账（对话不是从数据库读取时传 False）
             
         Returns:
             构建结果
         """
         try:
-            # 清空现有索引
-            self.vector_store.clear_collection()
-            
-            # 过滤有标签的对话
-            tagged_conversations = []
-            for conv in conversations:
-                if conv.get('manual_tag'):
-                    try:
-                        tags = json.loads(conv['manual_tag'])
-                        if tags:  # 只添加有标签的对话
-                            tagged_conversations.append({
-                                'id': conv['id'],
-                                'text': conv['raw_text'],
-                                'tags': tags if isinstance(tags, list) else []
-                            })
-                    except:
-                        continue
+            # 写入新版本集合
+            staging = self.vector_store.begin_rebuild()
+            count = 0
+            try:
+                chunk_size = settings.VECTOR_INDEX_WRITE_BATCH
+                chunk = []
+                for conv in conversations:
+                    if progress_callback:
+                        progress_callback("scanned", 1)
+                    
+                    # 过滤有标签的对话（与增量同步使用相同的判定）
+                    tags = parse_manual_tags(conv.get('manual_tag'))
+                    if tags:  # 只添加有标签的对话
+                        chunk.append({
+                            'id': conv['id'],
+                            'text': conv['raw_text'],
+                            'tags': tags
+                        })
+                    
+                    if len(chunk) >= chunk_size:
+                        count += len(self.vector_store.add_conversations_batch(
+                            chunk,
+                            collection=staging,
+                            progress_callback=progress_callback
+                        ))
+                        chunk = []
+                
+                if chunk:
+                    count += len(self.vector_store.add_conversations_batch(
+                        chunk,
+                        collection=staging,
+                        progress_callback=progress_callback
+                    ))
+                
+                if reconcile:
+                    reconciled = reconcile_vectors(staging)
+                    if reconciled["upserted"] or reconciled["deleted"]:
+                        print(f"🔄 [索引构建] 切换前对账：新增/更新 {reconciled['upserted']} 条，删除 {reconciled['deleted']} 条")
+                    count = staging.count()
+            except Exception:
+                self.vector_store.abort_rebuild()
+                raise
             
-            if not tagged_conversations:
+            if count == 0:
+                self.vector_store.abort_rebuild()
                 return {
                     "success": False,
                     "message": "没有找到已标注的对话"
                 }
             
-            # 批量添加到向量数据库
-            self.vector_store.add_conversations_batch(tagged_conversations)
+            # 原子切换
+            version = self.vector_store.activate_staging()
             
             return {
                 "success": True,
-                "message": f"成功构建向量索引，共 {len(tagged_conversations)} 条对话",
-                "count": len(tagged_conversations)
+                "message": f"成功构建向量索引，共 {count} 条对话",
+                "count": count,
+                "index_version": version
             }
             
+        except IndexBuildCancelled:
+            return {
+                "success": False,
+                "cancelled": True,
+                "message": "索引构建已取消，当前索引未改变"
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -152,19 +459,37 @@ class RAGRecommender:
         """获取向量索引统计信息"""
         count = self.vector_store.get_collection_count()
         
-        return {
+        stats = {
             "total_documents": count,
             "embedding_dimension": self.embedding_service.get_dimension(),
-            "collection_name": self.vector_store.collection.name
+            "collection_name": self.vector_store.collection.name,
+            **self.vector_store.get_index_info(),
+            "embedding_cache": self.embedding_service.cache.get_stats(),
+            "result_cache": self.result_cache.get_stats(),
+            "retrieval_mode": settings.RAG_RETRIEVAL_MODE
         }
+        lexical = get_lexical_index()
+        if lexical is not None:
+            stats["lexical_index"] = lexical.get_stats()
+        if is_tag_centroid_enabled():
+            stats["tag_centroids"] = get_tag_centroid_classifier().get_stats()
+        classifier = get_tag_classifier() if is_tag_classifier_enabled() else None
+        if classifier is not None:
+            stats["tag_classifier"] = {"version": classifier.version, "tags": len(classifier.tags), **classifier.meta}
+        if hasattr(self.vector_store.query_embedder, "get_stats"):
+            stats["micro_batching"] = self.vector_store.query_embedder.get_stats()
+        return stats
 
 
 # 全局单例
 _rag_recommender = None
+_rag_recommender_lock = threading.Lock()
 
 def get_rag_recommender() -> RAGRecommender:
     """获取RAG推荐服务单例"""
     global _rag_recommender
     if _rag_recommender is None:
-        _rag_recommender = RAGRecommender()
+        with _rag_recommender_lock:
+            if _rag_recommender is None:
+                _rag_recommender = RAGRecommender()
     return _rag_recommender
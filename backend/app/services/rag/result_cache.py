@@ -0,0 +1,116 @@
+"""
+推荐结果缓存 - 相同文本在索引未变化时直接返回上次的推荐结果
+
+键包含文本哈希、top_k、min_similarity 和索引令牌（版本号 + 修订号）。
+索引任何写入都会改变令牌，旧条目不再命中，并在下次访问时整体清空。
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.services.rag.embedding_cache import make_cache_key
+
+
+class RecommendationCache:
+    """有界 LRU + TTL 推荐结果缓存"""
+
+    def __init__(self, max_items: int = 2048, ttl_seconds: float = 600.0):
+        """
+        初始化缓存
+
+        Args:
+            max_items: 最多缓存的结果数量，<=0 表示禁用
+            ttl_seconds: 结果有效期（秒），<=0 表示不过期
+        """
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._token: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    @staticmethod
+    def make_key(text: str, top_k: int, min_similarity: float, token: Hashable) -> Tuple:
+        """
+        生成缓存键
+
+        Args:
+            text: 对话文本
+            top_k: 相似对话数量
+            min_similarity: 最小相似度阈值
+            token: 索引令牌（版本号, 修订号）
+        """
+        return (make_cache_key(text, "recommend"), top_k, round(min_similarity, 6), token)
+
+    def _check_token(self, token: Hashable) -> None:
+        """索引令牌变化时清空全部条目（调用方持有锁）"""
+        if token != self._token:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._token = token
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存结果
+
+        Returns:
+            结果的副本；未命中或已过期返回None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._check_token(key[-1])
+            entry = self._items.get(key)
+            if entry is not None and self.ttl_seconds > 0 and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._items[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            result = entry[1]
+        # 返回副本，调用方修改结果不会污染缓存
+        return copy.deepcopy(result)
+
+    def put(self, key: Tuple, result: Dict[str, Any]) -> None:
+        """写入结果（只缓存成功的结果）"""
+        if not self.enabled or not result.get("success"):
+            return
+        with self._lock:
+            # 查询期间索引已变化（令牌已被更新的请求刷新）时丢弃过期结果
+            if key[-1] != self._token:
+                return
+            self._items[key] = (time.monotonic(), copy.deepcopy(result))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._items),
+                "max_items": self.max_items,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations
+            }
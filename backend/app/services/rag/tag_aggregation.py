@@ -0,0 +1,97 @@
+"""
+相似对话标签聚合 - 按相似度加权投票（NumPy向量化）
+
+每个查询的近邻按相似度做 softmax 加权（可选按排名衰减），权重归一化后
+按标签ID累加，得到 0~1 的标签得分；再按有效近邻数做收缩，
+近邻少或权重集中在一两条上时得分整体降低，避免单条近邻给出满分。
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def aggregate_tag_votes(
+    neighbor_tag_ids: Sequence[Sequence[np.ndarray]],
+    neighbor_similarities: Sequence[Sequence[float]],
+    vocab_size: int,
+    temperature: float = 0.05,
+    rank_decay: float = 1.0,
+    shrinkage: float = 1.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量聚合近邻标签
+
+    Args:
+        neighbor_tag_ids: 每个查询的近邻标签ID数组列表（近邻按相似度降序）
+        neighbor_similarities: 每个查询的近邻相似度列表，与 neighbor_tag_ids 对齐
+        vocab_size: 标签词表大小
+        temperature: softmax 温度，越小越偏向最相似的近邻；<=0 时各近邻等权
+        rank_decay: 按排名的衰减系数（第r名乘以 rank_decay**r），1.0 表示不衰减
+        shrinkage: 收缩强度k，得分乘以 n_eff/(n_eff+k)，n_eff 为权重的有效样本数；0 表示不收缩
+
+    Returns:
+        (scores, counts)：形状均为 (查询数, vocab_size)，scores 为校准后的标签得分，
+        counts 为支持该标签的近邻数
+
+    Raises:
+        ValueError: 标签ID超出 [0, vocab_size)（否则会累加到其他查询的行上）
+    """
+    num_queries = len(neighbor_tag_ids)
+    scores = np.zeros((num_queries, vocab_size), dtype=np.float64)
+    counts = np.zeros((num_queries, vocab_size), dtype=np.int64)
+
+    width = max((len(sims) for sims in neighbor_similarities), default=0)
+    if num_queries == 0 or width == 0 or vocab_size == 0:
+        return scores, counts
+
+    # 相似度补齐为矩阵，空位用 mask 屏蔽
+    sims = np.zeros((num_queries, width), dtype=np.float64)
+    mask = np.zeros((num_queries, width), dtype=bool)
+    for q, row in enumerate(neighbor_similarities):
+        sims[q, :len(row)] = row
+        mask[q, :len(row)] = True
+
+    if temperature > 0:
+        row_max = np.where(mask, sims, -np.inf).max(axis=1, keepdims=True)
+        row_max[~np.isfinite(row_max)] = 0.0
+        weights = np.exp((sims - row_max) / temperature)
+    else:
+        weights = np.ones_like(sims)
+    if rank_decay != 1.0:
+        weights *= rank_decay ** np.arange(width, dtype=np.float64)
+    weights *= mask
+
+    totals = weights.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    weights /= totals
+
+    # 展平为 (查询, 标签, 权重) 三元组后一次 bincount
+    flat_tags = [tag_ids for neighbors in neighbor_tag_ids for tag_ids in neighbors]
+    if not flat_tags:
+        return scores, counts
+    lengths = np.fromiter((len(tag_ids) for tag_ids in flat_tags), dtype=np.int64, count=len(flat_tags))
+    if not lengths.any():
+        return scores, counts
+
+    # 每个近邻在 weights 矩阵中的 (查询, 排名) 位置
+    neighbors_per_query = np.fromiter((len(neighbors) for neighbors in neighbor_tag_ids), dtype=np.int64, count=num_queries)
+    query_of = np.repeat(np.arange(num_queries, dtype=np.int64), neighbors_per_query)
+    rank_of = np.arange(len(flat_tags), dtype=np.int64) - np.repeat(np.cumsum(neighbors_per_query) - neighbors_per_query, neighbors_per_query)
+
+    tag_ids = np.concatenate(flat_tags).astype(np.int64, copy=False)
+    if tag_ids.min() < 0 or tag_ids.max() >= vocab_size:
+        raise ValueError(f"标签ID超出词表范围 [0, {vocab_size})")
+    flat = np.repeat(query_of * vocab_size, lengths) + tag_ids
+    vote_weight = np.repeat(weights[query_of, rank_of], lengths)
+    size = num_queries * vocab_size
+    scores = np.bincount(flat, weights=vote_weight, minlength=size).reshape(num_queries, vocab_size)
+    counts = np.bincount(flat, minlength=size).reshape(num_queries, vocab_size)
+
+    if shrinkage > 0:
+        sum_sq = (weights ** 2).sum(axis=1, keepdims=True)
+        sum_sq[sum_sq == 0] = 1.0
+        n_eff = 1.0 / sum_sq  # 权重已归一化，(Σw)² = 1
+        n_eff[~mask.any(axis=1)] = 0.0
+        scores *= n_eff / (n_eff + shrinkage)
+
+    return scores, counts
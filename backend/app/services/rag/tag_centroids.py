@@ -0,0 +1,412 @@
+"""
+标签质心分类器 - 不调用LLM的快速标签推荐
+
+每个标准化标签（TAG_DEFINITIONS）的质心为带该标签的已审核对话向量之和（归一化后使用），
+新对话与全部标签的余弦相似度由一次矩阵乘法得到。
+
+全量训练时用留一法（样本不计入自己所属的质心）为每个标签选取F1最优的判定阈值，
+并记录该阈值下的精确率作为标签置信度。审核通过/取消/删除时增量更新向量之和与计数，
+阈值沿用上次全量训练的结果；索引对账和重建完成后重新全量训练。
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.tag_definitions import TAG_DEFINITIONS
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化（零向量保持为零）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def best_f1_thresholds(scores: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    每列（标签）选取F1最优的判定阈值（得分 >= 阈值判为正）
+
+    Args:
+        scores: 形状为 (样本数, 标签数) 的得分
+        labels: 同形状的0/1真实标签
+
+    Returns:
+        (阈值, 精确率, 召回率, F1)，均为长度为标签数的数组；没有正样本的标签F1为0
+    """
+    num_examples, num_tags = scores.shape
+    positives = labels.sum(axis=0)
+    order = np.argsort(-scores, axis=0, kind="stable")
+    sorted_scores = np.take_along_axis(scores, order, axis=0)
+    true_positives = np.cumsum(np.take_along_axis(labels, order, axis=0), axis=0)
+    predicted = np.arange(1, num_examples + 1)[:, None]
+
+    precision = true_positives / predicted
+    recall = true_positives / np.maximum(positives, 1)[None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    best = f1.argmax(axis=0)
+
+    columns = np.arange(num_tags)
+    return (
+        sorted_scores[best, columns].astype(np.float32),
+        precision[best, columns].astype(np.float32),
+        recall[best, columns].astype(np.float32),
+        f1[best, columns].astype(np.float32)
+    )
+
+
+class TagCentroidClassifier:
+    """标签质心分类器"""
+
+    def __init__(self, path: Optional[str] = None, tags: Optional[List[str]] = None):
+        """
+        初始化（存在模型文件时加载）
+
+        Args:
+            path: 模型文件路径（.npz），为空时只在内存中维护
+            tags: 参与判定的标签，默认取 TAG_DEFINITIONS
+        """
+        self.path = path
+        self.tags = list(tags if tags is not None else TAG_DEFINITIONS)
+        self._tag_index = {tag: i for i, tag in enumerate(self.tags)}
+        self._lock = threading.Lock()
+        self._reset_state()
+
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except Exception as e:
+                print(f"⚠️ [质心模型] 加载失败，等待重新训练: {e}")
+                self._reset_state()
+
+    def _reset_state(self) -> None:
+        num_tags = len(self.tags)
+        self.sums: Optional[np.ndarray] = None  # (标签数, dimension) 向量之和
+        self.counts = np.zeros(num_tags, dtype=np.int64)
+        self.thresholds = np.full(num_tags, np.inf, dtype=np.float32)  # 未校准的标签不会被判定
+        self.precisions = np.zeros(num_tags, dtype=np.float32)
+        self.model_name: Optional[str] = None  # 训练时的嵌入模型标识
+        self.trained_examples = 0
+        self.trained_at: Optional[float] = None
+        self.updates_since_training = 0
+        self._centroids: Optional[np.ndarray] = None
+
+    # ---------- 训练与增量更新 ----------
+
+    def _label_matrix(self, tag_lists: List[List[str]]) -> np.ndarray:
+        """标签列表转 (样本数, 标签数) 的0/1矩阵（非标准化标签忽略）"""
+        labels = np.zeros((len(tag_lists), len(self.tags)), dtype=np.float32)
+        for i, tags in enumerate(tag_lists):
+            for tag in tags:
+                tag_id = self._tag_index.get(tag)
+                if tag_id is not None:
+                    labels[i, tag_id] = 1.0
+        return labels
+
+    def fit(self, iter_pages: Callable[[], Iterable[Tuple[np.ndarray, List[List[str]]]]]) -> Dict[str, Any]:
+        """
+        全量训练（两遍扫描：先累加质心，再计算留一得分选取阈值）
+
+        Args:
+            iter_pages: 无参函数，每次调用返回一个 (向量矩阵, 每行的标签列表) 分页迭代器
+
+        Returns:
+            训练统计
+        """
+        started = time.monotonic()
+        num_tags = len(self.tags)
+
+        # 第一遍：每个标签的向量之和与样本数
+        sums = None
+        counts = np.zeros(num_tags, dtype=np.int64)
+        for embeddings, tag_lists in iter_pages():
+            vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+            labels = self._label_matrix(tag_lists)
+            if sums is None:
+                sums = np.zeros((num_tags, vectors.shape[1]), dtype=np.float64)
+            sums += labels.T.astype(np.float64) @ vectors
+            counts += labels.sum(axis=0).astype(np.int64)
+
+        if sums is None:
+            with self._lock:
+                self._reset_state()
+            self.save()
+            return {"examples": 0, "tags": 0, "seconds": round(time.monotonic() - started, 2)}
+
+        # 第二遍：留一得分（正样本的得分用去掉自身后的质心计算，避免阈值过于乐观）
+        sum_norms_sq = (sums ** 2).sum(axis=1)
+        sums32 = sums.astype(np.float32)
+        all_scores = []
+        all_labels = []
+        for embeddings, tag_lists in iter_pages():
+            vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+            labels = self._label_matrix(tag_lists)
+            dots = vectors @ sums32.T
+            self_sq = (vectors ** 2).sum(axis=1, keepdims=True)
+            loo_norms = np.sqrt(np.maximum(sum_norms_sq - 2 * labels * dots + labels * self_sq, 1e-12))
+            # 只有自己一条样本的标签，去掉自身后质心为零，得分记为0
+            loo_scores = np.where(loo_norms > 1e-6, (dots - labels * self_sq) / loo_norms, 0.0)
+            all_scores.append(loo_scores.astype(np.float32))
+            all_labels.append(labels.astype(bool))
+        scores = np.concatenate(all_scores)
+        labels = np.concatenate(all_labels)
+
+        thresholds, precisions = self._calibrate(scores, labels, counts)
+        model_name = current_embedding_model_id()
+
+        with self._lock:
+            self.sums = sums
+            self.counts = counts
+            self.thresholds = thresholds
+            self.precisions = precisions
+            self.model_name = model_name
+            self.trained_examples = len(scores)
+            self.trained_at = time.time()
+            self.updates_since_training = 0
+            self._centroids = None
+        self.save()
+
+        calibrated = int(np.isfinite(thresholds).sum())
+        seconds = time.monotonic() - started
+        print(f"✅ [质心模型] 训练完成：{len(scores)} 条样本，{calibrated}/{num_tags} 个标签可判定，耗时 {seconds:.1f}s")
+        return {"examples": len(scores), "tags": calibrated, "seconds": round(seconds, 2)}
+
+    @staticmethod
+    def _calibrate(scores: np.ndarray, labels: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每个标签选取留一F1最优的阈值
+
+        Returns:
+            (阈值, 该阈值下的精确率)，样本不足 TAG_CENTROID_MIN_EXAMPLES 的标签阈值为 inf
+        """
+        thresholds, precisions, _, f1 = best_f1_thresholds(scores, labels)
+        ineligible = (counts < max(1, settings.TAG_CENTROID_MIN_EXAMPLES)) | (f1 == 0)
+        thresholds[ineligible] = np.inf
+        precisions[ineligible] = 0.0
+        return thresholds, precisions
+
+    def update(
+        self,
+        additions: Iterable[Tuple[np.ndarray, List[str]]] = (),
+        removals: Iterable[Tuple[np.ndarray, List[str]]] = ()
+    ) -> bool:
+        """
+        增量更新质心（阈值保持不变，下次全量训练时重新校准）
+
+        Args:
+            additions: 新增的 (向量, 标签列表)
+            removals: 移除的 (向量, 标签列表)，须与当初加入时的向量一致
+
+        Returns:
+            是否有更新（模型尚未训练时跳过）
+        """
+        changed = 0
+        with self._lock:
+            if self.sums is None:
+                return False
+            for items, sign in ((removals, -1), (additions, 1)):
+                for embedding, tags in items:
+                    tag_ids = [self._tag_index[tag] for tag in set(tags) if tag in self._tag_index]
+                    if not tag_ids:
+                        continue
+                    vector = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+                    self.sums[tag_ids] += sign * vector
+                    self.counts[tag_ids] += sign
+                    changed += 1
+            if not changed:
+                return False
+            self.updates_since_training += changed
+            self._centroids = None
+        self.save()
+        return True
+
+    def reset(self) -> None:
+        """清空模型（清空所有对话后调用）"""
+        with self._lock:
+            self._reset_state()
+        self.save()
+
+    # ---------- 推理 ----------
+
+    def is_trained(self) -> bool:
+        return self.sums is not None
+
+    def predict(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        计算查询与全部标签质心的余弦相似度
+
+        Args:
+            embeddings: 形状为 (查询数, dimension) 的向量矩阵
+
+        Returns:
+            形状为 (查询数, 标签数) 的得分矩阵
+        """
+        centroids = self._centroids
+        if centroids is None:
+            with self._lock:
+                if self.sums is None:
+                    raise RuntimeError("标签质心模型尚未训练")
+                centroids = _normalize(self.sums).astype(np.float32)
+                self._centroids = centroids
+        return _normalize(np.asarray(embeddings, dtype=np.float32)) @ centroids.T
+
+    def recommend(self, embedding: np.ndarray) -> Dict[str, Any]:
+        """
+        推荐标签
+
+        得分达到阈值的标签按超出阈值的幅度排序；置信度取这些标签中最低的留一精确率。
+        置信度只反映已判定标签的精确度，得分略低于阈值（TAG_CENTROID_UNCERTAIN_MARGIN 内）的标签
+        列为不确定，说明可能还有未判定出的标签。
+
+        Args:
+            embedding: 对话向量
+
+        Returns:
+            推荐结果，包含推荐标签、标签得分、置信度、不确定标签
+        """
+        scores = self.predict(np.asarray(embedding)[None, :])[0]
+        thresholds = self.thresholds
+        hits = np.flatnonzero(scores >= thresholds)
+        hits = hits[np.argsort(-(scores[hits] - thresholds[hits]), kind="stable")]
+        near = np.flatnonzero((scores < thresholds) & (scores >= thresholds - settings.TAG_CENTROID_UNCERTAIN_MARGIN))
+
+        recommendations = [self.tags[i] for i in hits]
+        confidence = float(self.precisions[hits].min()) if len(hits) else 0.0
+        return {
+            "success": True,
+            "source": "tag_centroid",
+            "recommendations": recommendations,
+            "tag_scores": {self.tags[i]: round(float(scores[i]), 3) for i in hits},
+            "confidence": round(confidence, 3),
+            "uncertain_tags": [self.tags[i] for i in near],
+            "message": f"质心模型判定 {len(recommendations)} 个标签" if recommendations else "质心模型未判定出标签"
+        }
+
+    # ---------- 持久化 ----------
+
+    def save(self) -> None:
+        """写入临时文件后原子替换（模型为空时删除文件）"""
+        if not self.path:
+            return
+        with self._lock:
+            if self.sums is None:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            meta = {
+                "model_name": self.model_name,
+                "trained_examples": self.trained_examples,
+                "trained_at": self.trained_at,
+                "updates_since_training": self.updates_since_training
+            }
+            arrays = {
+                "tags": np.array(self.tags),
+                "sums": self.sums.copy(),
+                "counts": self.counts.copy(),
+                "thresholds": self.thresholds.copy(),
+                "precisions": self.precisions.copy(),
+                "meta": np.array(json.dumps(meta))
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def _load(self, path: str) -> None:
+        """加载模型文件（按标签名对齐，新增的标准化标签等待下次训练）"""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model_name = current_embedding_model_id()
+            if meta.get("model_name") != model_name:
+                print(f"⚠️ [质心模型] 嵌入模型已变化（{meta.get('model_name')} -> {model_name}），等待重新训练")
+                return
+
+            saved_tags = [str(tag) for tag in data["tags"]]
+            sums = np.zeros((len(self.tags), data["sums"].shape[1]), dtype=np.float64)
+            for saved_index, tag in enumerate(saved_tags):
+                tag_id = self._tag_index.get(tag)
+                if tag_id is None:
+                    continue
+                sums[tag_id] = data["sums"][saved_index]
+                self.counts[tag_id] = data["counts"][saved_index]
+                self.thresholds[tag_id] = data["thresholds"][saved_index]
+                self.precisions[tag_id] = data["precisions"][saved_index]
+
+        self.sums = sums
+        self.model_name = model_name
+        self.trained_examples = meta.get("trained_examples", 0)
+        self.trained_at = meta.get("trained_at")
+        self.updates_since_training = meta.get("updates_since_training", 0)
+        print(f"✅ [质心模型] 已加载：{self.trained_examples} 条训练样本")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """模型统计"""
+        return {
+            "trained": self.is_trained(),
+            "trained_examples": self.trained_examples,
+            "trained_at": self.trained_at,
+            "updates_since_training": self.updates_since_training,
+            "tags": len(self.tags),
+            "calibrated_tags": int(np.isfinite(self.thresholds).sum())
+        }
+
+
+def current_embedding_model_id() -> str:
+    """
+    当前嵌入服务的模型标识（含推理后端和模型文件摘要，如 "...@3f2a9c1d0b7e+onnx-int8"）
+
+    质心由索引中的向量训练、用查询向量判定，嵌入模型或推理后端变化后需要重新训练
+    """
+    from app.services.rag.embedding_service import get_embedding_service
+
+    return get_embedding_service().model_name
+
+
+def is_tag_centroid_enabled() -> bool:
+    return settings.TAG_CENTROID_ENABLED
+
+
+# 全局单例
+_tag_centroid_classifier: Optional[TagCentroidClassifier] = None
+_tag_centroid_lock = threading.Lock()
+
+def get_tag_centroid_classifier() -> TagCentroidClassifier:
+    """获取标签质心分类器单例"""
+    global _tag_centroid_classifier
+    if _tag_centroid_classifier is None:
+        with _tag_centroid_lock:
+            if _tag_centroid_classifier is None:
+                _tag_centroid_classifier = TagCentroidClassifier(settings.TAG_CENTROID_MODEL_PATH)
+    return _tag_centroid_classifier
+
+
+def train_tag_centroids() -> Dict[str, Any]:
+    """从当前向量索引全量训练质心模型（索引中即为已审核且有标签的对话）"""
+    from app.services.rag.vector_store import get_vector_store
+
+    vector_store = get_vector_store()
+
+    def iter_pages():
+        for _, embeddings, tags_strs in vector_store.iter_embeddings():
+            yield embeddings, [tags_str.split(",") for tags_str in tags_strs]
+
+    return get_tag_centroid_classifier().fit(iter_pages)
+
+
+def update_tag_centroids(previous: Dict[int, tuple], current: Dict[int, tuple]) -> None:
+    """
+    按对话在索引中的新旧状态增量更新质心
+
+    Args:
+        previous: 变更前 VectorStore.get_embeddings 的结果
+        current: 变更后 VectorStore.get_embeddings 的结果
+    """
+    get_tag_centroid_classifier().update(
+        additions=[(embedding, tags_str.split(",")) for embedding, tags_str in current.values()],
+        removals=[(embedding, tags_str.split(",")) for embedding, tags_str in previous.values()]
+    )
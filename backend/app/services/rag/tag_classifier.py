@@ -0,0 +1,425 @@
+"""
+多标签分类器 - 基于MiniLM向量的一对多逻辑回归（仅依赖NumPy）
+
+用已审核对话的人工标签（Conversation.manual_tag）训练，每个标准化标签一个二分类器，
+推理为一次矩阵乘法 + sigmoid。已审核对话按对话ID哈希稳定地划分为训练/校准/测试三份：
+训练集拟合权重，校准集为每个标签选取F1最优的判定阈值，测试集留给离线评估
+（scripts/evaluate_tag_classifier.py）。
+
+模型按版本保存在 TAG_CLASSIFIER_DIR 下（model_v{N}.npz），当前版本记录在指针文件中；
+服务在指针变化后自动加载新版本。
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.tag_definitions import TAG_DEFINITIONS
+from app.services.rag.tag_centroids import best_f1_thresholds, current_embedding_model_id
+
+
+ARTIFACT_FORMAT = 1
+
+# 数据划分（按对话ID哈希取模100）
+SPLIT_TEST = "test"
+SPLIT_CALIBRATION = "calibration"
+SPLIT_TRAIN = "train"
+
+
+def split_of(conversation_id: int, test_percent: int, calibration_percent: int) -> str:
+    """对话所属的数据划分（只取决于对话ID，训练和评估脚本得到相同的划分）"""
+    bucket = zlib.crc32(str(conversation_id).encode("ascii")) % 100
+    if bucket < test_percent:
+        return SPLIT_TEST
+    if bucket < test_percent + calibration_percent:
+        return SPLIT_CALIBRATION
+    return SPLIT_TRAIN
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    """数值稳定的sigmoid"""
+    return np.exp(-np.logaddexp(0, -z))
+
+
+def fit_one_vs_rest(
+    features: np.ndarray,
+    labels: np.ndarray,
+    l2: float = 1e-4,
+    epochs: int = 50,
+    learning_rate: float = 0.05,
+    batch_size: int = 1024,
+    seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray, List[float]]:
+    """
+    小批量Adam训练一对多逻辑回归（所有标签共享一次矩阵乘法）
+
+    Args:
+        features: 形状为 (样本数, dimension) 的特征
+        labels: 形状为 (样本数, 标签数) 的0/1标签
+        l2: L2正则系数
+        epochs: 训练轮数
+        learning_rate: Adam学习率
+        batch_size: 小批量大小
+        seed: 打乱顺序的随机种子
+
+    Returns:
+        (权重 (dimension, 标签数), 偏置 (标签数,), 每轮的平均交叉熵)
+    """
+    num_examples, dimension = features.shape
+    num_tags = labels.shape[1]
+    features = features.astype(np.float32, copy=False)
+    labels = labels.astype(np.float32, copy=False)
+
+    weights = np.zeros((dimension, num_tags), dtype=np.float32)
+    # 偏置初始化为标签先验的对数几率，稀有标签从一开始就输出低概率
+    prior = np.clip(labels.mean(axis=0), 1e-4, 1 - 1e-4)
+    bias = np.log(prior / (1 - prior)).astype(np.float32)
+
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    m_w, v_w = np.zeros_like(weights), np.zeros_like(weights)
+    m_b, v_b = np.zeros_like(bias), np.zeros_like(bias)
+    step = 0
+    rng = np.random.default_rng(seed)
+    history = []
+
+    for _ in range(epochs):
+        order = rng.permutation(num_examples)
+        epoch_loss = 0.0
+        for start in range(0, num_examples, batch_size):
+            batch = order[start:start + batch_size]
+            x, y = features[batch], labels[batch]
+            logits = x @ weights + bias
+            # 交叉熵 = log(1+e^z) - y·z
+            epoch_loss += float((np.logaddexp(0, logits) - y * logits).sum())
+
+            error = _sigmoid(logits) - y
+            grad_w = x.T @ error / len(batch) + l2 * weights
+            grad_b = error.mean(axis=0)
+
+            step += 1
+            for param, grad, m, v in ((weights, grad_w, m_w, v_w), (bias, grad_b, m_b, v_b)):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                m_hat = m / (1 - beta1 ** step)
+                v_hat = v / (1 - beta2 ** step)
+                param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+        history.append(epoch_loss / (num_examples * num_tags))
+
+    return weights, bias, history
+
+
+class TagClassifier:
+    """一个版本的多标签分类模型"""
+
+    def __init__(
+        self,
+        tags: List[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+        thresholds: np.ndarray,
+        meta: Dict[str, Any]
+    ):
+        self.tags = list(tags)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.thresholds = thresholds.astype(np.float32)
+        self.meta = meta
+        self.version = meta.get("version")
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        计算各标签的概率
+
+        Args:
+            embeddings: 形状为 (查询数, dimension) 的向量矩阵
+
+        Returns:
+            形状为 (查询数, 标签数) 的概率矩阵
+        """
+        return _sigmoid(np.asarray(embeddings, dtype=np.float32) @ self.weights + self.bias)
+
+    def recommend(self, embedding: np.ndarray) -> Dict[str, Any]:
+        """
+        推荐标签
+
+        概率达到该标签阈值的标签按概率降序返回；置信度取其中最低的概率。
+
+        Args:
+            embedding: 对话向量
+
+        Returns:
+            推荐结果，包含推荐标签、标签概率、置信度、模型版本
+        """
+        proba = self.predict_proba(np.asarray(embedding)[None, :])[0]
+        hits = np.flatnonzero(proba >= self.thresholds)
+        hits = hits[np.argsort(-proba[hits], kind="stable")]
+
+        recommendations = [self.tags[i] for i in hits]
+        return {
+            "success": True,
+            "source": "tag_classifier",
+            "model_version": self.version,
+            "recommendations": recommendations,
+            "tag_scores": {self.tags[i]: round(float(proba[i]), 3) for i in hits},
+            "confidence": round(float(proba[hits].min()), 3) if len(hits) else 0.0,
+            "message": f"分类模型判定 {len(recommendations)} 个标签" if recommendations else "分类模型未判定出标签"
+        }
+
+    def save(self, path: str) -> None:
+        """写入临时文件后原子替换"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            tags=np.array(self.tags),
+            weights=self.weights,
+            bias=self.bias,
+            thresholds=self.thresholds,
+            meta=np.array(json.dumps(self.meta, ensure_ascii=False))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TagClassifier":
+        """
+        加载模型文件
+
+        Raises:
+            ValueError: 文件格式版本或嵌入模型与当前配置不一致
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") != ARTIFACT_FORMAT:
+                raise ValueError(f"不支持的模型文件格式: {meta.get('format')}")
+            model_name = current_embedding_model_id()
+            if meta.get("embedding_model") != model_name:
+                raise ValueError(f"模型基于 {meta.get('embedding_model')} 训练，与当前嵌入模型 {model_name} 不一致")
+            return cls(
+                tags=[str(tag) for tag in data["tags"]],
+                weights=data["weights"],
+                bias=data["bias"],
+                thresholds=data["thresholds"],
+                meta=meta
+            )
+
+
+# ---------- 版本管理 ----------
+
+def _pointer_path() -> str:
+    return os.path.join(settings.TAG_CLASSIFIER_DIR, "current.json")
+
+
+def _model_path(version: int) -> str:
+    return os.path.join(settings.TAG_CLASSIFIER_DIR, f"model_v{version}.npz")
+
+
+def _read_current_version() -> Optional[int]:
+    try:
+        with open(_pointer_path(), encoding="utf-8") as f:
+            return int(json.load(f)["version"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _existing_versions() -> List[int]:
+    if not os.path.isdir(settings.TAG_CLASSIFIER_DIR):
+        return []
+    versions = []
+    for name in os.listdir(settings.TAG_CLASSIFIER_DIR):
+        if name.startswith("model_v") and name.endswith(".npz"):
+            try:
+                versions.append(int(name[len("model_v"):-len(".npz")]))
+            except ValueError:
+                continue
+    return sorted(versions)
+
+
+def publish_tag_classifier(classifier: TagClassifier) -> int:
+    """
+    保存为新版本并切换指针（保留最近 TAG_CLASSIFIER_KEEP_VERSIONS 个版本）
+
+    Returns:
+        新版本号
+    """
+    os.makedirs(settings.TAG_CLASSIFIER_DIR, exist_ok=True)
+    version = max(_existing_versions(), default=0) + 1
+    classifier.version = version
+    classifier.meta["version"] = version
+    classifier.save(_model_path(version))
+
+    tmp_path = f"{_pointer_path()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp_path, _pointer_path())
+
+    for old in _existing_versions()[:-max(1, settings.TAG_CLASSIFIER_KEEP_VERSIONS)]:
+        os.remove(_model_path(old))
+    return version
+
+
+_tag_classifier: Optional[TagClassifier] = None
+_tag_classifier_version: Optional[int] = None
+_tag_classifier_lock = threading.Lock()
+
+def get_tag_classifier() -> Optional[TagClassifier]:
+    """
+    获取当前版本的分类模型（指针变化后自动加载新版本）
+
+    Returns:
+        分类模型，未训练或加载失败时为 None
+    """
+    global _tag_classifier, _tag_classifier_version
+    version = _read_current_version()
+    if version != _tag_classifier_version:
+        with _tag_classifier_lock:
+            if version != _tag_classifier_version:
+                classifier = None
+                if version is not None:
+                    try:
+                        classifier = TagClassifier.load(_model_path(version))
+                        print(f"✅ [分类模型] 已加载版本 {version}")
+                    except Exception as e:
+                        print(f"❌ [分类模型] 版本 {version} 加载失败: {e}")
+                _tag_classifier = classifier
+                _tag_classifier_version = version
+    return _tag_classifier
+
+
+# ---------- 训练 ----------
+
+def load_labelled_embeddings(tags: List[str]) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    """
+    读取有人工标签的已审核对话并编码
+
+    Args:
+        tags: 参与训练的标签（其他标签忽略）
+
+    Returns:
+        (对话ID列表, 向量矩阵, 0/1标签矩阵)，只包含至少有一个参与训练标签的对话
+    """
+    from app.services.rag.embedding_service import get_embedding_service
+    from app.services.rag.index_jobs import iter_approved_conversations
+    from app.services.rag.index_sync import parse_manual_tags
+
+    tag_index = {tag: i for i, tag in enumerate(tags)}
+    embedding_service = get_embedding_service()
+
+    conversation_ids: List[int] = []
+    label_rows: List[np.ndarray] = []
+    embedding_chunks: List[np.ndarray] = []
+    texts: List[str] = []
+
+    def flush():
+        if texts:
+            embedding_chunks.append(embedding_service.embed_texts_bulk(texts))
+            texts.clear()
+
+    for conv in iter_approved_conversations(settings.VECTOR_INDEX_WRITE_BATCH):
+        tag_ids = [tag_index[tag] for tag in parse_manual_tags(conv['manual_tag']) if tag in tag_index]
+        if not tag_ids:
+            continue
+        row = np.zeros(len(tags), dtype=np.uint8)
+        row[tag_ids] = 1
+        conversation_ids.append(conv['id'])
+        label_rows.append(row)
+        texts.append(conv['raw_text'])
+        if len(texts) >= settings.VECTOR_INDEX_WRITE_BATCH:
+            flush()
+    flush()
+
+    if not conversation_ids:
+        return [], np.empty((0, 0), dtype=np.float32), np.empty((0, len(tags)), dtype=np.uint8)
+    return conversation_ids, np.concatenate(embedding_chunks), np.stack(label_rows)
+
+
+def train_tag_classifier(
+    test_percent: int = 10,
+    calibration_percent: int = 10,
+    min_examples: int = 5,
+    l2: float = 1e-4,
+    epochs: int = 50,
+    learning_rate: float = 0.05,
+    batch_size: int = 1024,
+    publish: bool = True
+) -> Dict[str, Any]:
+    """
+    训练分类模型并发布为新版本
+
+    Args:
+        test_percent: 测试集比例（%），不参与训练和校准
+        calibration_percent: 校准集比例（%），用于选取每个标签的阈值
+        min_examples: 训练集中正样本少于该数的标签不参与训练
+        l2: L2正则系数
+        epochs: 训练轮数
+        learning_rate: Adam学习率
+        batch_size: 小批量大小
+        publish: 是否保存为新版本并切换
+
+    Returns:
+        训练统计（含新模型对象 classifier）
+
+    Raises:
+        ValueError: 可用于训练的数据不足
+    """
+    started = time.monotonic()
+    all_tags = list(TAG_DEFINITIONS)
+    conversation_ids, embeddings, labels = load_labelled_embeddings(all_tags)
+    if not conversation_ids:
+        raise ValueError("没有可用于训练的已审核对话")
+
+    splits = np.array([split_of(conv_id, test_percent, calibration_percent) for conv_id in conversation_ids])
+    train_mask = splits == SPLIT_TRAIN
+    calibration_mask = splits == SPLIT_CALIBRATION
+
+    # 只保留训练集中样本足够的标签
+    kept = np.flatnonzero(labels[train_mask].sum(axis=0) >= max(1, min_examples))
+    if len(kept) == 0:
+        raise ValueError(f"没有训练样本不少于 {min_examples} 条的标签")
+    tags = [all_tags[i] for i in kept]
+    labels = labels[:, kept]
+    encoded_seconds = time.monotonic() - started
+
+    weights, bias, history = fit_one_vs_rest(
+        embeddings[train_mask], labels[train_mask],
+        l2=l2, epochs=epochs, learning_rate=learning_rate, batch_size=batch_size
+    )
+
+    # 校准集上选取阈值；校准集中没有正样本的标签退回0.5
+    thresholds = np.full(len(tags), 0.5, dtype=np.float32)
+    if calibration_mask.any():
+        proba = _sigmoid(embeddings[calibration_mask] @ weights + bias)
+        tuned, _, _, f1 = best_f1_thresholds(proba, labels[calibration_mask].astype(np.float32))
+        thresholds = np.where(f1 > 0, tuned, thresholds).astype(np.float32)
+
+    meta = {
+        "format": ARTIFACT_FORMAT,
+        "embedding_model": current_embedding_model_id(),
+        "trained_at": time.time(),
+        "examples": {split: int((splits == split).sum()) for split in (SPLIT_TRAIN, SPLIT_CALIBRATION, SPLIT_TEST)},
+        "split": {"test_percent": test_percent, "calibration_percent": calibration_percent},
+        "params": {"l2": l2, "epochs": epochs, "learning_rate": learning_rate, "batch_size": batch_size, "min_examples": min_examples},
+        "final_loss": history[-1] if history else None
+    }
+    classifier = TagClassifier(tags, weights, bias, thresholds, meta)
+    version = publish_tag_classifier(classifier) if publish else None
+
+    seconds = time.monotonic() - started
+    print(f"✅ [分类模型] 训练完成：{len(tags)} 个标签，训练样本 {meta['examples'][SPLIT_TRAIN]} 条，耗时 {seconds:.1f}s（编码 {encoded_seconds:.1f}s）")
+    return {
+        "version": version,
+        "tags": len(tags),
+        "examples": meta["examples"],
+        "loss_history": history,
+        "seconds": round(seconds, 2),
+        "classifier": classifier
+    }
+
+
+def is_tag_classifier_enabled() -> bool:
+    return settings.TAG_CLASSIFIER_ENABLED
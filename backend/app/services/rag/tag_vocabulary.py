@@ -0,0 +1,141 @@
+"""
+标签词表 - 标签名与整数ID的双向映射
+
+ID只追加不复用，持久化为JSON（tags 列表下标即ID）；标准化标签按定义顺序预置，
+人工标注中出现的其他标签在首次遇到时追加。向量库元数据保存标签ID和词表版本，
+推荐时用ID直接做NumPy聚合；词表文件被删除或替换后版本改变，旧元数据中的ID不再使用。
+"""
+import json
+import os
+import threading
+import uuid
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.tag_definitions import ALL_TAGS
+
+
+class TagVocabulary:
+    """标签词表"""
+
+    def __init__(self, path: Optional[str]):
+        """
+        加载（或创建）词表
+
+        Args:
+            path: JSON文件路径，为空时只在内存中维护
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._tags: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.version: Optional[str] = None  # 词表版本，创建词表时生成，ID只在同一版本内有效
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data["version"]
+            for tag in data["tags"]:
+                self._ids[tag] = len(self._tags)
+                self._tags.append(tag)
+
+        if self.version is None:
+            self.version = uuid.uuid4().hex[:12]
+            with self._lock:
+                self._save()
+        if any(tag not in self._ids for tag in ALL_TAGS):
+            self.encode(ALL_TAGS)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def encode(self, tags: List[str]) -> List[int]:
+        """
+        标签名转ID（新标签追加到词表并持久化）
+
+        Args:
+            tags: 标签列表
+
+        Returns:
+            去重后的ID列表，顺序与首次出现一致
+        """
+        ids = []
+        added = False
+        with self._lock:
+            for tag in tags:
+                if not tag:
+                    continue
+                tag_id = self._ids.get(tag)
+                if tag_id is None:
+                    tag_id = len(self._tags)
+                    self._ids[tag] = tag_id
+                    self._tags.append(tag)
+                    added = True
+                if tag_id not in ids:
+                    ids.append(tag_id)
+            if added:
+                self._save()
+        return ids
+
+    def encode_joined(self, tags_str: str) -> np.ndarray:
+        """
+        逗号分隔的标签字符串转ID数组（结果按字符串缓存，不要修改返回的数组）
+
+        Args:
+            tags_str: 如 "4.2米,有尾板"
+
+        Returns:
+            int32 ID数组
+        """
+        return self._encode_joined_cached(tags_str or "")
+
+    @lru_cache(maxsize=65536)
+    def _encode_joined_cached(self, tags_str: str) -> np.ndarray:
+        return np.asarray(self.encode(tags_str.split(",")), dtype=np.int32)
+
+    def decode(self, tag_id: int) -> str:
+        """ID转标签名"""
+        return self._tags[tag_id]
+
+    def _save(self) -> None:
+        """写入临时文件后原子替换（调用方持有锁）"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "tags": self._tags}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+@lru_cache(maxsize=65536)
+def parse_tag_ids(tag_ids_str: str) -> np.ndarray:
+    """
+    解析元数据中逗号分隔的标签ID（按字符串缓存，不要修改返回的数组）
+
+    Args:
+        tag_ids_str: 如 "3,17"
+
+    Returns:
+        int32 ID数组
+    """
+    if not tag_ids_str:
+        return np.empty(0, dtype=np.int32)
+    return np.asarray([int(tag_id) for tag_id in tag_ids_str.split(",")], dtype=np.int32)
+
+
+# 全局单例
+_tag_vocabulary: Optional[TagVocabulary] = None
+_tag_vocabulary_lock = threading.Lock()
+
+def get_tag_vocabulary() -> TagVocabulary:
+    """获取标签词表单例"""
+    global _tag_vocabulary
+    if _tag_vocabulary is None:
+        with _tag_vocabulary_lock:
+            if _tag_vocabulary is None:
+                _tag_vocabulary = TagVocabulary(settings.TAG_VOCABULARY_PATH)
+    return _tag_vocabulary
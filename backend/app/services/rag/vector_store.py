@@ -1,11 +1,22 @@
 """
-向量数据库服务 - 使用Chroma
+向量数据库服务 - 使用Chroma（或进程内NumPy精确检索，见 VECTOR_STORE_BACKEND）
+
+索引按版本存放在不同的集合中（conversations_v1, conversations_v2 ...），
+当前生效的版本记录在指针文件中。重建索引时写入新版本集合，完成后原子切换指针，
+重建期间查询始终命中完整的旧版本；上一个版本保留用于回滚。
 """
+import json
 import os
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
+import re
+import threading
+from typing import Callable, List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings as app_settings
 from app.services.rag.embedding_service import get_embedding_service
+from app.services.rag.micro_batcher import get_embedding_batcher
+from app.services.rag.tag_vocabulary import get_tag_vocabulary
 
 
 class VectorStore:
@@ -18,27 +29,65 @@ class VectorStore:
         Args:
             collection_name: 集合名称
         """
-        # 创建持久化存储目录
-        persist_dir = "/app/data/chroma"
-        os.makedirs(persist_dir, exist_ok=True)
+        self.backend = app_settings.VECTOR_STORE_BACKEND
+        self.base_name = collection_name
         
-        # 初始化Chroma客户端
-        self.client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
+        if self.backend == "numpy":
+            # 进程内NumPy精确检索（接口与Chroma客户端一致）
+            from app.services.rag.numpy_store import NumpyVectorClient
+            
+            persist_dir = app_settings.VECTOR_STORE_NUMPY_DIR
+            os.makedirs(persist_dir, exist_ok=True)
+            self.client = NumpyVectorClient(
+                persist_dir,
+                precision=app_settings.VECTOR_STORE_PRECISION,
+                rerank_factor=app_settings.VECTOR_STORE_RERANK_FACTOR
             )
-        )
+        elif self.backend == "chroma":
+            import chromadb
+            from chromadb.config import Settings
+            
+            # 创建持久化存储目录
+            persist_dir = "/app/data/chroma"
+            os.makedirs(persist_dir, exist_ok=True)
+            
+            # 初始化Chroma客户端
+            self.client = chromadb.PersistentClient(
+                path=persist_dir,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+        else:
+            raise ValueError(f"不支持的向量库后端: {self.backend}")
+        self.persist_dir = persist_dir
         
-        # 获取或创建集合
+        # 读取当前生效的索引版本，获取或创建对应集合
+        self._swap_lock = threading.Lock()
+        pointer = self._read_pointer()
+        self.index_version = pointer["version"]
+        self.previous_version = pointer.get("previous")
         self.collection = self.client.get_or_create_collection(
-            name=collection_name,
+            name=self._collection_name(self.index_version),
             metadata={"hnsw:space": "cosine"}
         )
         
+        # 正在重建的新版本集合
+        self.staging_collection = None
+        self.staging_version = None
+        
+        # 当前版本的修订号：每次写入当前集合后递增，用于推荐结果缓存失效
+        self.revision = 0
+        
         # 获取嵌入服务
         self.embedding_service = get_embedding_service()
+
+        # 单条查询经微批处理器编码，并发请求合并为一次前向计算
+        if app_settings.EMBEDDING_MICRO_BATCHING:
+            self.query_embedder = get_embedding_batcher()
+        else:
+            self.query_embedder = self.embedding_service
     
     def add_conversation(
         self,
@@ -60,35 +109,73 @@ class VectorStore:
             文档ID
         """
         # 生成嵌入
-        embedding = self.embedding_service.embed_text(text)
+        embeddings = self._to_backend(self.embedding_service.embed_text(text)[None, :])
         
         # 准备元数据
-        doc_metadata = {
-            "conversation_id": conversation_id,
-            "tags": ",".join(tags),
-            **(metadata or {})
-        }
+        doc_metadata = self._build_metadata(conversation_id, tags, metadata)
         
         # 添加到集合
         doc_id = f"conv_{conversation_id}"
-        self.collection.add(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[text],
-            metadatas=[doc_metadata]
-        )
+        for collection in self._write_targets():
+            collection.add(
+                ids=[doc_id],
+                embeddings=embeddings,
+                documents=[text],
+                metadatas=[doc_metadata]
+            )
+        self._mark_changed()
         
         return doc_id
     
+    def _to_backend(self, embeddings: np.ndarray):
+        """
+        把嵌入矩阵转换为向量库接受的格式
+
+        NumPy后端直接接收float32 ndarray；Chroma 0.4 只接受嵌套列表，
+        只在这一处转换。
+
+        Args:
+            embeddings: 形状为 (n, dimension) 的float32矩阵
+
+        Returns:
+            ndarray 或嵌套列表
+        """
+        if self.backend == "numpy":
+            return embeddings
+        return embeddings.tolist()
+
+    @staticmethod
+    def _build_metadata(
+        conversation_id: int,
+        tags: List[str],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """构建文档元数据（同时保存标签ID和词表版本，推荐时免去标签名解析）"""
+        vocabulary = get_tag_vocabulary()
+        tag_ids = vocabulary.encode(tags)
+        return {
+            "conversation_id": conversation_id,
+            "tags": ",".join(tags),
+            "tag_ids": ",".join(str(tag_id) for tag_id in tag_ids),
+            "tag_vocab": vocabulary.version,
+            **(metadata or {})
+        }
+    
     def add_conversations_batch(
         self,
-        conversations: List[Dict[str, Any]]
+        conversations: List[Dict[str, Any]],
+        upsert: bool = False,
+        collection=None,
+        progress_callback: Optional[Callable[[str, int], None]] = None
     ) -> List[str]:
         """
         批量添加对话到向量数据库
         
         Args:
             conversations: 对话列表，每个包含 id, text, tags
+            upsert: 已存在的文档是否覆盖（否则要求ID不存在）
+            collection: 写入的集合，默认写入当前版本（重建期间同时写入新版本）
+            progress_callback: 进度回调 (阶段 embedded/written, 本块数量)
             
         Returns:
             文档ID列表
@@ -96,29 +183,43 @@ class VectorStore:
         if not conversations:
             return []
         
-        # 批量生成嵌入
-        texts = [conv["text"] for conv in conversations]
-        embeddings = self.embedding_service.embed_texts(texts)
-        
-        # 准备数据
-        ids = [f"conv_{conv['id']}" for conv in conversations]
-        documents = texts
-        metadatas = [
-            {
-                "conversation_id": conv["id"],
-                "tags": ",".join(conv.get("tags", [])),
-                **conv.get("metadata", {})
-            }
-            for conv in conversations
-        ]
-        
-        # 批量添加
-        self.collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
-        )
+        # 按文本长度排序，使同一编码批次内长度接近（写入顺序不影响检索）
+        conversations = sorted(conversations, key=lambda conv: len(conv["text"]))
+        
+        # 分块编码并写入，避免单次写入过大
+        targets = [collection] if collection is not None else self._write_targets()
+        ids = []
+        chunk_size = app_settings.VECTOR_INDEX_WRITE_BATCH
+        for start in range(0, len(conversations), chunk_size):
+            chunk = conversations[start:start + chunk_size]
+            
+            # 批量生成嵌入（大批量时由多进程引擎并行编码）
+            texts = [conv["text"] for conv in chunk]
+            embeddings = self._to_backend(self.embedding_service.embed_texts_bulk(texts))
+            if progress_callback:
+                progress_callback("embedded", len(chunk))
+            
+            # 准备数据
+            chunk_ids = [f"conv_{conv['id']}" for conv in chunk]
+            metadatas = [
+                self._build_metadata(conv["id"], conv.get("tags", []), conv.get("metadata"))
+                for conv in chunk
+            ]
+            
+            # 批量写入
+            for target in targets:
+                write = target.upsert if upsert else target.add
+                write(
+                    ids=chunk_ids,
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=metadatas
+                )
+            ids.extend(chunk_ids)
+            if collection is None:
+                self._mark_changed()
+            if progress_callback:
+                progress_callback("written", len(chunk))
         
         return ids
     
@@ -140,28 +241,203 @@ class VectorStore:
             相似对话列表，包含 id, text, distance, metadata
         """
         # 生成查询嵌入
-        query_embedding = self.embedding_service.embed_text(query_text)
+        query_embedding = self.query_embedder.embed_text(query_text)
         
         # 执行搜索
+        return self.search_by_embeddings(query_embedding[None, :], top_k, filter_metadata)[0]
+
+    def search_similar_batch(
+        self,
+        texts: List[str],
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似对话：一次前向编码全部查询，一次索引查询
+
+        Args:
+            texts: 查询文本列表
+            top_k: 每条查询返回的结果数量
+            where: 元数据过滤条件
+
+        Returns:
+            与输入顺序一致的结果列表，每项格式同 search_similar
+        """
+        if not texts:
+            return []
+
+        # 批量查询直接走嵌入服务（已是一批，无需再经过微批处理器）
+        query_embeddings = self.embedding_service.embed_texts(texts)
+
+        return self.search_by_embeddings(query_embeddings, top_k, where)
+
+    def search_by_embeddings(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        用已编码的查询向量检索（一次索引查询）
+
+        Args:
+            query_embeddings: 形状为 (查询数, dimension) 的float32矩阵
+            top_k: 每条查询返回的结果数量
+            where: 元数据过滤条件
+
+        Returns:
+            与输入顺序一致的结果列表，每项格式同 search_similar
+        """
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=self._to_backend(query_embeddings),
             n_results=top_k,
-            where=filter_metadata
+            where=where
         )
-        
-        # 格式化结果
+
+        return [self._format_query_results(results, i) for i in range(len(query_embeddings))]
+
+    @staticmethod
+    def _format_query_results(results: Dict[str, Any], index: int) -> List[Dict[str, Any]]:
+        """把 collection.query 第 index 条查询的结果整理为字典列表"""
         similarities = []
-        if results['ids'] and results['ids'][0]:
-            for i in range(len(results['ids'][0])):
+        if results['ids'] and len(results['ids']) > index and results['ids'][index]:
+            for i in range(len(results['ids'][index])):
                 similarities.append({
-                    'id': results['ids'][0][i],
-                    'text': results['documents'][0][i],
-                    'distance': results['distances'][0][i],
-                    'metadata': results['metadatas'][0][i]
+                    'id': results['ids'][index][i],
+                    'text': results['documents'][index][i],
+                    'distance': results['distances'][index][i],
+                    'metadata': results['metadatas'][index][i]
                 })
-        
+
         return similarities
     
+    def upsert_conversation(
+        self,
+        conversation_id: int,
+        text: str,
+        tags: List[str],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        新增或更新单条对话的向量
+        
+        Args:
+            conversation_id: 对话ID
+            text: 对话文本
+            tags: 标签列表
+            metadata: 额外的元数据
+            
+        Returns:
+            文档ID
+        """
+        embeddings = self._to_backend(self.embedding_service.embed_text(text)[None, :])
+        
+        doc_id = f"conv_{conversation_id}"
+        for collection in self._write_targets():
+            collection.upsert(
+                ids=[doc_id],
+                embeddings=embeddings,
+                documents=[text],
+                metadatas=[self._build_metadata(conversation_id, tags, metadata)]
+            )
+        self._mark_changed()
+        
+        return doc_id
+    
+    def delete_conversations(self, conversation_ids: List[int], collection=None) -> int:
+        """
+        批量删除对话（不存在的ID会被忽略）
+        
+        Args:
+            conversation_ids: 对话ID列表
+            collection: 删除的集合，默认从当前版本删除（重建期间同时从新版本删除）
+            
+        Returns:
+            请求删除的数量
+        """
+        if not conversation_ids:
+            return 0
+        doc_ids = [f"conv_{conversation_id}" for conversation_id in conversation_ids]
+        targets = [collection] if collection is not None else self._write_targets()
+        for target in targets:
+            for start in range(0, len(doc_ids), app_settings.VECTOR_INDEX_WRITE_BATCH):
+                target.delete(ids=doc_ids[start:start + app_settings.VECTOR_INDEX_WRITE_BATCH])
+        if collection is None:
+            self._mark_changed()
+        return len(doc_ids)
+    
+    def get_indexed_tags(self, collection=None) -> Dict[int, str]:
+        """
+        获取索引中所有对话及其标签（不读取向量和文本）
+        
+        Args:
+            collection: 读取的集合，默认为当前版本
+        
+        Returns:
+            {对话ID: 逗号分隔的标签}
+        """
+        collection = collection if collection is not None else self.collection
+        indexed = {}
+        page_size = 5000
+        offset = 0
+        while True:
+            page = collection.get(
+                include=["metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            for metadata in page["metadatas"]:
+                indexed[int(metadata["conversation_id"])] = metadata.get("tags", "")
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        return indexed
+    
+    def get_embeddings(self, conversation_ids: List[int]) -> Dict[int, tuple]:
+        """
+        读取对话在当前索引中的向量和标签
+
+        Args:
+            conversation_ids: 对话ID列表（不在索引中的忽略）
+
+        Returns:
+            {对话ID: (float32向量, 逗号分隔的标签)}
+        """
+        if not conversation_ids:
+            return {}
+        page = self.collection.get(
+            ids=[f"conv_{conversation_id}" for conversation_id in conversation_ids],
+            include=["embeddings", "metadatas"]
+        )
+        return {
+            int(metadata["conversation_id"]): (np.asarray(embedding, dtype=np.float32), metadata.get("tags", ""))
+            for embedding, metadata in zip(page["embeddings"], page["metadatas"])
+        }
+
+    def iter_embeddings(self, page_size: int = 5000):
+        """
+        分页遍历当前索引的向量和标签（用于训练标签分类模型）
+
+        Yields:
+            (对话ID列表, 形状为 (页大小, dimension) 的float32矩阵, 逗号分隔的标签列表)
+        """
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["embeddings", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            if page["ids"]:
+                yield (
+                    [int(metadata["conversation_id"]) for metadata in page["metadatas"]],
+                    np.asarray(page["embeddings"], dtype=np.float32),
+                    [metadata.get("tags", "") for metadata in page["metadatas"]]
+                )
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+    
     def delete_conversation(self, conversation_id: int) -> bool:
         """
         删除对话
@@ -174,7 +450,9 @@ class VectorStore:
         """
         try:
             doc_id = f"conv_{conversation_id}"
-            self.collection.delete(ids=[doc_id])
+            for collection in self._write_targets():
+                collection.delete(ids=[doc_id])
+            self._mark_changed()
             return True
         except Exception as e:
             print(f"删除失败: {e}")
@@ -195,22 +473,191 @@ class VectorStore:
                 name=collection_name,
                 metadata={"hnsw:space": "cosine"}
             )
+            self._mark_changed()
             return True
         except Exception as e:
             print(f"清空失败: {e}")
             return False
     
+    def _mark_changed(self) -> None:
+        """当前集合内容已变化"""
+        with self._swap_lock:
+            self.revision += 1
+    
+    def get_cache_token(self) -> tuple:
+        """
+        当前索引内容的令牌（版本号, 修订号），内容变化后令牌必然不同
+        
+        Returns:
+            可作为缓存键的一部分的元组
+        """
+        with self._swap_lock:
+            return (self.index_version, self.revision)
+    
     def get_collection_count(self) -> int:
         """获取集合中的文档数量"""
         return self.collection.count()
+    
+    # ---------- 索引版本管理（蓝绿重建） ----------
+    
+    def _collection_name(self, version: int) -> str:
+        """版本号对应的集合名称（版本0为旧版未分版本的集合）"""
+        return self.base_name if version == 0 else f"{self.base_name}_v{version}"
+    
+    def _pointer_path(self) -> str:
+        return os.path.join(self.persist_dir, f"{self.base_name}_active.json")
+    
+    def _read_pointer(self) -> Dict[str, Any]:
+        """读取当前生效版本指针"""
+        try:
+            with open(self._pointer_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "previous": None}
+    
+    def _write_pointer(self, version: int, previous: Optional[int]) -> None:
+        """原子写入版本指针（先写临时文件再替换）"""
+        path = self._pointer_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "previous": previous}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _write_targets(self) -> list:
+        """增量写入的目标集合：当前版本，以及正在重建的新版本"""
+        targets = [self.collection]
+        if self.staging_collection is not None:
+            targets.append(self.staging_collection)
+        return targets
+    
+    def _existing_versions(self) -> List[int]:
+        """列出磁盘上存在的所有版本号"""
+        pattern = re.compile(rf"^{re.escape(self.base_name)}(?:_v(\d+))?$")
+        versions = []
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            match = pattern.match(name)
+            if match:
+                versions.append(int(match.group(1) or 0))
+        return versions
+    
+    def begin_rebuild(self):
+        """
+        创建新版本集合用于重建
+        
+        Returns:
+            新版本的集合
+            
+        Raises:
+            RuntimeError: 已有重建在进行中
+        """
+        with self._swap_lock:
+            if self.staging_collection is not None:
+                raise RuntimeError("已有索引重建正在进行")
+            
+            version = max([self.index_version, self.previous_version or 0, *self._existing_versions()]) + 1
+            name = self._collection_name(version)
+            self.staging_collection = self.client.create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"}
+            )
+            self.staging_version = version
+            return self.staging_collection
+    
+    def activate_staging(self) -> int:
+        """
+        将重建完成的新版本原子切换为当前版本，旧版本保留用于回滚
+        
+        Returns:
+            新的当前版本号
+        """
+        with self._swap_lock:
+            if self.staging_collection is None:
+                raise RuntimeError("没有正在重建的索引")
+            
+            old_version = self.index_version
+            self._write_pointer(self.staging_version, old_version)
+            self.collection = self.staging_collection
+            self.index_version = self.staging_version
+            self.previous_version = old_version
+            self.staging_collection = None
+            self.staging_version = None
+            self.revision += 1
+        
+        self._drop_stale_versions()
+        return self.index_version
+    
+    def abort_rebuild(self) -> None:
+        """放弃正在重建的新版本，当前版本不受影响"""
+        with self._swap_lock:
+            if self.staging_collection is None:
+                return
+            name = self.staging_collection.name
+            self.staging_collection = None
+            self.staging_version = None
+        try:
+            self.client.delete_collection(name)
+        except Exception as e:
+            print(f"删除重建中的集合失败: {e}")
+    
+    def rollback(self) -> bool:
+        """
+        回滚到上一个版本
+        
+        上一个版本在切换后不再接收增量写入，回滚后需要对账（见 index_sync.rollback_index）
+        
+        Returns:
+            是否回滚成功（没有可用的上一个版本时返回False）
+        """
+        with self._swap_lock:
+            if self.previous_version is None:
+                return False
+            try:
+                previous = self.client.get_collection(self._collection_name(self.previous_version))
+            except Exception:
+                return False
+            
+            current_version = self.index_version
+            self._write_pointer(self.previous_version, current_version)
+            self.collection = previous
+            self.index_version, self.previous_version = self.previous_version, current_version
+            self.revision += 1
+            return True
+    
+    def _drop_stale_versions(self) -> None:
+        """删除当前版本和上一个版本之外的旧集合"""
+        keep = {self.index_version, self.previous_version, self.staging_version}
+        for version in self._existing_versions():
+            if version not in keep:
+                try:
+                    self.client.delete_collection(self._collection_name(version))
+                except Exception as e:
+                    print(f"删除旧版本集合失败: {e}")
+    
+    def get_index_info(self) -> Dict[str, Any]:
+        """获取索引版本信息"""
+        info = {
+            "backend": self.backend,
+            "index_version": self.index_version,
+            "previous_version": self.previous_version,
+            "rebuilding_version": self.staging_version
+        }
+        if self.backend == "numpy":
+            info["vector_memory"] = self.collection.memory_usage()
+        return info
 
 
 # 全局单例
 _vector_store = None
+_vector_store_lock = threading.Lock()
 
 def get_vector_store(collection_name: str = "conversations") -> VectorStore:
     """获取向量存储单例"""
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore(collection_name)
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = VectorStore(collection_name)
     return _vector_store
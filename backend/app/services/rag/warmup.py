@@ -0,0 +1,162 @@
+"""
+RAG组件预热 - 启动时在后台线程加载嵌入模型和向量库
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+
+
+# 组件状态: pending / loading / ready / failed
+_state: Dict[str, Dict[str, Any]] = {
+    "model": {"status": "pending", "error": None, "seconds": None},
+    "chroma": {"status": "pending", "error": None, "seconds": None},
+}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+
+
+def _set_state(component: str, status: str, error: Optional[str] = None, seconds: Optional[float] = None):
+    with _lock:
+        _state[component] = {
+            "status": status,
+            "error": error,
+            "seconds": round(seconds, 3) if seconds is not None else None
+        }
+
+
+def _warmup() -> None:
+    """加载嵌入模型、执行一次预热编码，然后初始化向量库"""
+    from app.services.rag.embedding_service import get_embedding_service
+    from app.services.rag.lexical_index import is_lexical_enabled
+    from app.services.rag.vector_store import get_vector_store
+
+    _set_state("model", "loading")
+    started = time.monotonic()
+    try:
+        service = get_embedding_service()
+        service.warm_up()
+    except Exception as e:
+        print(f"❌ [预热] 嵌入模型加载失败: {e}")
+        _set_state("model", "failed", error=str(e))
+        return
+    _set_state("model", "ready", seconds=time.monotonic() - started)
+    print(f"✅ [预热] 嵌入模型就绪，耗时 {time.monotonic() - started:.1f}s")
+
+    _set_state("chroma", "loading")
+    started = time.monotonic()
+    try:
+        get_vector_store().get_collection_count()
+    except Exception as e:
+        print(f"❌ [预热] 向量库初始化失败: {e}")
+        _set_state("chroma", "failed", error=str(e))
+        return
+    _set_state("chroma", "ready", seconds=time.monotonic() - started)
+
+    # 补齐预热期间未能同步的审核变更（对账同时会重建词法索引、重新训练质心模型）
+    if settings.VECTOR_INDEX_RECONCILE_ON_STARTUP:
+        from app.services.rag.index_sync import reconcile_index
+
+        try:
+            reconcile_index()
+        except Exception as e:
+            print(f"❌ [预热] 索引对账失败: {e}")
+    else:
+        if is_lexical_enabled():
+            from app.services.rag.index_sync import rebuild_lexical_index
+
+            try:
+                rebuild_lexical_index()
+            except Exception as e:
+                print(f"❌ [预热] 词法索引构建失败: {e}")
+
+        # 不对账时只在没有可用的质心模型文件时训练
+        from app.services.rag.tag_centroids import (
+            get_tag_centroid_classifier,
+            is_tag_centroid_enabled,
+            train_tag_centroids,
+        )
+
+        if is_tag_centroid_enabled() and not get_tag_centroid_classifier().is_trained():
+            try:
+                train_tag_centroids()
+            except Exception as e:
+                print(f"❌ [预热] 质心模型训练失败: {e}")
+
+
+def start_background_warmup() -> bool:
+    """
+    在后台线程启动预热（已在运行或已就绪时不重复启动）
+
+    Returns:
+        是否启动了新的预热线程
+    """
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return False
+        if all(item["status"] == "ready" for item in _state.values()):
+            return False
+        _thread = threading.Thread(target=_warmup, name="rag-warmup", daemon=True)
+        _thread.start()
+    return True
+
+
+def is_rag_ready() -> bool:
+    """嵌入模型和向量库是否都已就绪"""
+    with _lock:
+        return all(item["status"] == "ready" for item in _state.values())
+
+
+def get_warming_up_response() -> Optional[Dict[str, Any]]:
+    """
+    推荐接口的就绪检查
+
+    Returns:
+        未就绪时返回可直接响应给前端的"预热中"结果；已就绪返回None
+    """
+    if is_rag_ready():
+        return None
+
+    with _lock:
+        failed = {name: item["error"] for name, item in _state.items() if item["status"] == "failed"}
+
+    # 预热未启动或失败时（重新）触发，避免永远停留在未就绪状态
+    start_background_warmup()
+
+    message = "推荐模型正在加载，请稍后重试"
+    if failed:
+        message = f"推荐组件加载失败，正在重试: {failed}"
+
+    return {
+        "success": False,
+        "warming_up": True,
+        "message": message,
+        "recommendations": [],
+        "confidence": 0.0
+    }
+
+
+def _check_database() -> Dict[str, Any]:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return {"status": "ready", "error": None}
+    except Exception as e:
+        return {"status": "failed", "error": str(e)}
+
+
+def get_readiness() -> Dict[str, Any]:
+    """获取各组件就绪状态"""
+    with _lock:
+        components = {name: dict(item) for name, item in _state.items()}
+    components["database"] = _check_database()
+
+    return {
+        "ready": all(item["status"] == "ready" for item in components.values()),
+        "components": components
+    }
@@ -0,0 +1,98 @@
+"""
+标准化标签定义 - 人工审核、AI分析和推荐共用的标签体系
+"""
+
+# 完整的标准化标签定义（包含详细说明）
+TAG_DEFINITIONS = {
+    # 路线相关
+    "不走高速": "路线可经过高速，但货主要求不走高速，司机同意不走",
+    "无高速费": "货主不出高速费，司机同意，但走高速",
+    "部分过路/桥/船/高速费": "货主承担部分过路/桥/船/高速费，司机同意",
+    "过路/桥/船/高速费": "货主承担全部过路/桥/船/高速费",
+
+    # 车辆尺寸
+    "车厢长X米": "司机描述自己的车厢长度（如：车厢长4.2米、6.8米等）",
+    "车宽X米": "司机描述自己的车厢宽度（如：车宽2米、2.3米等）",
+    "车高X米": "司机描述自己的车厢高度（如：车高2.2米、2.5米等）",
+    "车容量X方": "司机描述自己的车可以装多少方。拼车场景下剩余空间不算",
+    "车载重X吨": "司机描述自己的车可以装多少吨",
+
+    # 车型分类
+    "面包车": "优先标注明确的车型，如无表述，再标注非XX。如：司机表达自己不是平板，是厢货，应该打标为厢货；司机表达自己不是平板，没有说具体是什么车型，应该打标为非平板",
+    "高栏": "高栏车型",
+    "厢货": "厢式货车",
+    "平板": "平板车型",
+    "依维柯": "依维柯车型",
+    "飞翼车": "飞翼车型（侧门像翅膀一样打开）",
+    "非平板": "司机明确表示不是平板车",
+    "非面包车": "司机明确表示不是面包车",
+    "非高栏": "司机明确表示不是高栏车",
+    "非厢货": "司机明确表示不是厢货车",
+
+    # 尾板相关
+    "尾板车": "车辆装有尾板",
+    "尾板费": "有尾板，且司货双方同意了尾板费",
+    "无尾板": "车辆没有尾板",
+
+    # 装卸相关
+    "装卸费": "需要司机装卸，且司机表示需要装卸费用",
+    "搬运装卸": "需要司机自己装卸（司机要了搬运费，但货主拒绝，司机认可不给也行）",
+    "搭把手": "有人装卸，司机需要帮忙，且无搬运费用，提到费用的归到装卸费",
+    "不搬运": "司机明确拒绝不帮忙搬运",
+
+    # 跟车要求
+    "跟车X人": "不能跟车、跟车1人、跟车2人及以上；按照司机描述可跟车的人数打标",
+
+    # 拼车
+    "拼车单": "司机自行拼车或者可接受拼车",
+
+    # 装卸要求
+    "X装X卸": "货源为X装X卸，司机接受，费用未谈拢也算",
+
+    # 侧门类型
+    "侧门单开": "至少有一侧可以开一扇门",
+    "侧门双开": "至少有一侧可以开两扇门",
+    "侧门全开": "侧边门可以全部打开",
+    "侧边栏，侧门全开": "侧边门可以全部打开，但是顶上有栏杆，无法拆卸",
+    "双边侧门全开": "两边的侧门都可以全开",
+    "非侧开门": "侧边门不能打开，或者司机不愿意打开也算",
+
+    # 时间要求
+    "明日卸": "明天卸货",
+    "明日装卸": "明天装卸货",
+    "固定/上班时间装卸": "在工作时间（8:00-18:00）装卸",
+    "夜间运输": "在夜间（18:00-次日8:00）运输或装卸",
+
+    # 车辆动力
+    "新能源": "电车也属于新能源",
+    "油车": "燃油车",
+
+    # 车门类型
+    "双开门": "区别于侧门双开，指尾部双开门",
+    "非双开门": "尾部不是双开门",
+
+    # 座位相关
+    "无座车": "货运版，本身没有座位；或者客运版，座位都拆了，折叠的不算",
+
+    # 辅助工具
+    "小推车": "司机当下有才算，如果说要回家取，那是无小推车",
+    "无小推车": "司机当下没有小推车",
+
+    # 车顶类型
+    "开顶车厢": "车顶可以全部打开",
+    "不可开顶": "车顶不能打开",
+    "不可全开顶": "高栏车，滑动雨布，雨布可不拆，因此有一部分无法打开",
+
+    # 雨布绳子
+    "雨布": "车上有雨布、雨棚都算",
+    "无雨布": "车上没有雨布",
+    "有绳子": "车上有绳子、网兜都算",
+    "无绳子": "车上没有绳子，或者车辆无法用绳子固定",
+
+    # 费用相关
+    "进出场费": "如有提及，且货主愿意出就算",
+    "等待费": "提及等待费用",
+    "停车费": "提及停车费用",
+}
+
+ALL_TAGS = list(TAG_DEFINITIONS.keys())
@@ -0,0 +1,415 @@
+"""
+规则标签抽取 - 数值类和明确表述类标签的快速通道（不调用LLM、不需要嵌入模型）
+
+所有规则编译成一个带命名分组的正则，对对话文本做一次从左到右的扫描。Python 的 re 不会为
+多分支正则跳过无关字符，因此按每个分支可能的首字符分桶：先用字符类找到候选位置，
+再只尝试以该字符开头的分支（相当于自动机的第一层转移），结果与整体正则逐位置匹配一致。
+同一位置上问句、否定（"不是XX"/"没有XX"/"XX没有"）的写法排在肯定写法之前，
+因此 "非XX"/"无XX" 类标签不会被误判为肯定标签；否定延续到 和/跟/、 连接的后续表述
+（"没雨布和绳子"）。"不要XX"、对装备说 "不是XX"（"不是尾板问题"）以及前面紧挨着
+未被规则捕获的否定词的表述含义不确定，不判定、交给LLM。规则无法判定的线索词（费用、装卸、时间等）
+也在同一次扫描中识别，没有这类线索、也没有问句、矛盾和不确定表述时视为规则已完整覆盖该对话。
+"""
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import re._parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+from app.services.tag_definitions import TAG_DEFINITIONS
+
+
+# 肯定/否定成对的明确表述：(词形正则, 肯定标签, 否定标签)
+ENTITY_TERMS: List[Tuple[str, str, Optional[str]]] = [
+    (r"平板车?", "平板", "非平板"),
+    (r"面包车", "面包车", "非面包车"),
+    (r"高栏车?", "高栏", "非高栏"),
+    (r"(?:厢货|箱货|厢式货?车|厢车)", "厢货", "非厢货"),
+    (r"尾板", "尾板车", "无尾板"),
+    (r"(?:雨布|雨棚|篷布)", "雨布", "无雨布"),
+    (r"(?:绳子|网兜)", "有绳子", "无绳子"),
+    (r"小推车", "小推车", "无小推车"),
+    (r"依维柯", "依维柯", None),
+    (r"飞翼车?", "飞翼车", None),
+    (r"(?:新能源|电动车|电车)", "新能源", None),
+    (r"(?:燃油车|油车)", "油车", None),
+]
+
+# 明确车型出现时不再标注 "非XX"（见 TAG_DEFINITIONS["面包车"] 的说明）
+VEHICLE_TYPES = {"面包车", "高栏", "厢货", "平板", "依维柯", "飞翼车"}
+NEGATED_VEHICLE_TYPES = {"非平板", "非面包车", "非高栏", "非厢货"}
+
+QUESTION_PREFIX = r"(?:有没有|是不是|带没带|有无|要不要)(?:带|装|配)?"
+QUESTION_SUFFIX = r"(?:吗|么|嘛|呢|[?？])"
+# 否定词类别 -> 前置否定词正则："没有XX" 对所有表述都是明确否定，"不是XX" 只对车型是明确否定
+# （见 TAG_DEFINITIONS["非平板"]），"不要XX"/"不用XX" 是需求而不是车辆情况，均不能判定
+NEGATION_PREFIXES: Dict[str, str] = {
+    "possession": r"(?:没有|没|无|不带|不含)(?:带|装|配|有|那种|这种)?",
+    "copula": r"(?:不是|并非|非)(?:那种|这种)?",
+    "refusal": r"(?:不需要|不要|不用|别)(?:带|装|配|那种|这种)?",
+}
+NEGATION_SUFFIX = r"(?:也|都)?(?:没有|没带|没装|没)(?!问题)"
+
+# 否定延续到并列的后续表述（"没雨布和绳子"）
+CONJUNCTION = re.compile(r"\s*(?:和|跟|与|及|以及|或|或者|、)\s*")
+
+# 肯定表述/数值前 NEGATOR_WINDOW 个字符内（同一分句）出现未被捕获的否定词时不判定
+NEGATOR = re.compile(r"[不没无非别未]")
+CLAUSE_BREAK = re.compile(r"[，。,.!！?？；;\s]")
+NEGATOR_WINDOW = 4
+
+METERS = r"(?P<v>\d+(?:\.\d+)?)\s*米(?:(?P<d>\d)(?!\d))?"
+CN_COUNT = r"[一二两三四五1-5]"
+
+# 数值类规则：(标签, 正则, 取值方式)
+VALUE_RULES: List[Tuple[str, str, str]] = [
+    ("车厢长X米", r"(?:车厢|车身|货箱|厢子?|车)?长度?(?:是|有|为)?\s*" + METERS, "meters"),
+    ("车厢长X米", r"(?P<v>\d{1,2})\s*米\s*(?P<d>\d)(?!\d|\s*[宽高])", "meters"),  # 4米2、9米6
+    ("车厢长X米", r"(?P<v>\d+(?:\.\d+)?)\s*米(?=的?(?:车|厢|箱|平板|高栏|货车))", "meters"),
+    ("车宽X米", r"(?:车厢?|厢子?)?宽度?(?:是|有|为)?\s*" + METERS, "meters"),
+    ("车高X米", r"(?:车厢?|厢子?)?高度?(?:是|有|为)?\s*" + METERS, "meters"),
+    ("车容量X方", r"(?:能装|可以装|能拉|可以拉|装得下|容量|容积|最多装|最多拉)(?:是|有|为)?\s*"
+                 r"(?P<v>\d+(?:\.\d+)?)\s*个?(?:立方|方)", "cubic"),
+    ("车载重X吨", r"(?:载重|能拉|能装|可以拉|可以装|最多拉|最多装|限载|核载|拉得了|装得了)(?:是|有|为)?\s*"
+                 r"(?P<v>\d+(?:\.\d+)?)\s*吨", "tons"),
+    ("跟车X人", r"(?:能够|能|可以|可)?(?:跟车?|坐|带)\s*(?P<v>" + CN_COUNT + r")\s*[个位]?人", "people"),
+    ("跟车X人", r"(?:不能够|不能|不可以|不让|没法|无法)(?:跟车|跟人|坐人|带人)|跟不了[车人]?", "no_people"),
+    ("X装X卸", r"(?P<v>" + CN_COUNT + r")装(?P<d>" + CN_COUNT + r")卸", "load_unload"),
+]
+
+# 规则无法判定的标签的线索词：出现即交给LLM
+UNCOVERED_CUES = (
+    r"高速|过路|过桥|路桥|船|费|钱|块|元|搬|装卸|卸货|装货|帮忙|搭把手|拼|门|明天|明日|晚上|夜|凌晨|"
+    r"上班|下班|\d+点|[一二三四五六七八九十]+点|顶|座|等|停车|进场|出场|米|吨|方|跟|推车"
+)
+
+CN_DIGITS = {"一": "1", "二": "2", "两": "2", "三": "3", "四": "4", "五": "5"}
+
+DIGIT = r"\d"  # 首字符集合中表示任意数字（与正则 \d 一致，即 str.isdecimal）
+
+
+def _first_chars(items) -> Optional[Tuple[Set[str], bool]]:
+    """
+    计算已解析正则序列可能的首字符
+
+    Returns:
+        (首字符集合, 是否可能匹配空串)；含无法枚举的结构时返回None
+    """
+    chars: Set[str] = set()
+    for op, av in items:
+        first = _first_chars_of(op, av)
+        if first is None:
+            return None
+        op_chars, nullable = first
+        chars |= op_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _first_chars_of(op, av) -> Optional[Tuple[Set[str], bool]]:
+    if op is _sre_parse.LITERAL:
+        return {chr(av)}, False
+    if op is _sre_parse.IN:
+        chars: Set[str] = set()
+        for item_op, item_av in av:
+            if item_op is _sre_parse.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op is _sre_parse.RANGE and item_av[1] - item_av[0] <= 256:
+                chars.update(chr(code) for code in range(item_av[0], item_av[1] + 1))
+            elif item_op is _sre_parse.CATEGORY and item_av is _sre_parse.CATEGORY_DIGIT:
+                chars.add(DIGIT)
+            else:
+                return None
+        return chars, False
+    if op is _sre_parse.SUBPATTERN:
+        return _first_chars(av[-1])
+    if op is _sre_parse.BRANCH:
+        chars = set()
+        nullable = False
+        for branch in av[1]:
+            first = _first_chars(branch)
+            if first is None:
+                return None
+            chars |= first[0]
+            nullable = nullable or first[1]
+        return chars, nullable
+    if op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT):
+        first = _first_chars(av[2])
+        if first is None:
+            return None
+        return first[0], first[1] or av[0] == 0
+    if op in (_sre_parse.ASSERT, _sre_parse.ASSERT_NOT, _sre_parse.AT):
+        # 零宽断言不消耗字符，按可空处理（首字符集合只会偏大，不影响正确性）
+        return set(), True
+    return None
+
+
+def _negation_kind(negator: str, positive: str) -> str:
+    """否定词对该表述的作用：negative 明确否定，uncertain 含义不确定"""
+    if negator == "possession" or (negator == "copula" and positive in VEHICLE_TYPES):
+        return "negative"
+    return "uncertain"
+
+
+def _negated_nearby(text: str, start: int, floor: int) -> bool:
+    """start 之前（不早于 floor、同一分句内）是否紧挨着否定词"""
+    window = text[max(floor, start - NEGATOR_WINDOW):start]
+    return bool(NEGATOR.search(CLAUSE_BREAK.split(window)[-1]))
+
+
+def _count(value: str) -> str:
+    return CN_DIGITS.get(value, value)
+
+
+def _format_value(kind: str, match: "re.Match", prefix: str) -> Optional[str]:
+    """按取值方式格式化数值（如 9米6 → 9.6米）"""
+    value = match.group(f"{prefix}_v") if f"{prefix}_v" in match.re.groupindex else None
+    decimal = match.group(f"{prefix}_d") if f"{prefix}_d" in match.re.groupindex else None
+    if kind == "meters":
+        if decimal and "." not in value:
+            value = f"{value}.{decimal}"
+        return f"{float(value):g}米"
+    if kind == "cubic":
+        return f"{float(value):g}方"
+    if kind == "tons":
+        return f"{float(value):g}吨"
+    if kind == "people":
+        return f"跟车{_count(value)}人"
+    if kind == "no_people":
+        return "不能跟车"
+    if kind == "load_unload":
+        return f"{_count(value)}装{_count(decimal)}卸"
+    return None
+
+
+class TagRuleMatcher:
+    """编译后的规则匹配器（线程安全，只读）"""
+
+    def __init__(self):
+        # 分组名 -> (类型, 标签, 否定标签/取值方式)
+        self._branches: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {}
+        # 否定分支的分组名 -> 否定词类别
+        self._negators: Dict[str, str] = {}
+        alternatives: List[str] = []
+
+        def add(kind: str, tag: Optional[str], extra: Optional[str], pattern: str,
+                negator: Optional[str] = None) -> None:
+            name = f"a{len(alternatives)}"
+            # 分支内的命名分组加上分支前缀，保证合并后组名唯一
+            pattern = pattern.replace("(?P<v>", f"(?P<{name}_v>").replace("(?P<d>", f"(?P<{name}_d>")
+            alternatives.append(f"(?P<{name}>{pattern})")
+            self._branches[name] = (kind, tag, extra)
+            if negator:
+                self._negators[name] = negator
+
+        for term, positive, negative in ENTITY_TERMS:
+            add("question", positive, negative, QUESTION_PREFIX + term)
+            add("question", positive, negative, "有" + term + r"(?:没有|没)")
+            for negator, prefix in NEGATION_PREFIXES.items():
+                add(_negation_kind(negator, positive), positive, negative, prefix + term, negator)
+            add("negative", positive, negative, term + NEGATION_SUFFIX, "possession")
+            add("question", positive, negative, term + r"\s*" + QUESTION_SUFFIX)
+            add("positive", positive, negative, term)
+
+        for tag, pattern, kind in VALUE_RULES:
+            add("value", tag, kind, pattern)
+
+        add("cue", None, None, UNCOVERED_CUES)
+
+        unknown = {tag for _, tag, _ in self._branches.values() if tag and tag not in TAG_DEFINITIONS}
+        unknown |= {neg for kind, _, neg in self._branches.values()
+                    if kind != "value" and neg and neg not in TAG_DEFINITIONS}
+        if unknown:
+            raise ValueError(f"规则中的标签不在标签定义中: {sorted(unknown)}")
+
+        self.alternatives = alternatives
+        self.pattern = re.compile("|".join(alternatives))
+        self._build_dispatch()
+        self.tags = sorted(
+            {tag for _, tag, _ in self._branches.values() if tag} |
+            {neg for kind, _, neg in self._branches.values() if kind != "value" and neg},
+            key=list(TAG_DEFINITIONS).index
+        )
+
+    def _build_dispatch(self) -> None:
+        """按首字符分桶：每个桶按原顺序合并可能以该字符开头的分支"""
+        branch_chars: List[Set[str]] = []
+        for alternative in self.alternatives:
+            first = _first_chars(_sre_parse.parse(alternative))
+            if first is None or first[1] or not first[0]:
+                # 无法确定首字符（或可匹配空串）时退回整体正则
+                self._trigger = None
+                return
+            branch_chars.append(first[0])
+
+        keys = set().union(*branch_chars)
+        literal_keys = sorted(key for key in keys if key != DIGIT)
+        self._buckets: Dict[str, "re.Pattern"] = {}
+        for key in literal_keys + [DIGIT]:
+            indices = [
+                i for i, chars in enumerate(branch_chars)
+                if key in chars or (DIGIT in chars and key != DIGIT and key.isdecimal())
+            ]
+            if indices:
+                self._buckets[key] = re.compile("|".join(self.alternatives[i] for i in indices))
+        trigger_class = "".join(re.escape(key) for key in literal_keys) + (DIGIT if DIGIT in keys else "")
+        self._trigger = re.compile(f"[{trigger_class}]")
+
+    def finditer(self, text: str) -> Iterator["re.Match"]:
+        """从左到右扫描，返回不重叠的匹配（与 self.pattern.finditer 结果一致）"""
+        if self._trigger is None:
+            yield from self.pattern.finditer(text)
+            return
+
+        position = 0
+        buckets = self._buckets
+        while True:
+            candidate = self._trigger.search(text, position)
+            if candidate is None:
+                return
+            start = candidate.start()
+            char = text[start]
+            bucket = buckets.get(char) or buckets[DIGIT]
+            match = bucket.match(text, start)
+            if match is None:
+                position = start + 1
+            else:
+                yield match
+                position = match.end()
+
+    def match(self, text: str) -> dict:
+        """
+        抽取规则标签
+
+        Args:
+            text: 对话文本
+
+        Returns:
+            {
+                "tags": 判定的标签（按标签定义顺序）,
+                "values": {标签: [抽取到的数值]},
+                "evidence": {标签: [匹配的原文]},
+                "decided_tags": 已由规则定论、无需LLM再判断的标签,
+                "conflicts": 肯定和否定同时出现的标签,
+                "questions": 问句中提到、未确认的表述,
+                "uncertain": 带否定词但含义不确定的表述,
+                "uncovered_cues": 规则无法判定的线索词,
+                "fully_covered": 规则是否完整覆盖该对话
+            }
+        """
+        positives: Dict[str, List[str]] = {}
+        negatives: Dict[str, List[str]] = {}
+        values: Dict[str, List[str]] = {}
+        evidence: Dict[str, List[str]] = {}
+        entity_pairs: Dict[str, Optional[str]] = {}
+        questions: List[str] = []
+        uncertain: List[str] = []
+        uncertain_tags: Set[str] = set()
+        cues: List[str] = []
+
+        text = text or ""
+        previous_end = 0
+        carry: Optional[Tuple[str, int]] = None  # 可延续到并列表述的否定：(否定词类别, 结束位置)
+        for match in self.finditer(text):
+            name = match.lastgroup
+            kind, tag, extra = self._branches[name]
+            snippet = match.group(name)
+            start, end = match.span()
+            floor, previous_end = previous_end, end
+            if kind == "cue":
+                # 线索词（如 "跟"）不打断否定的延续
+                if snippet not in cues:
+                    cues.append(snippet)
+                continue
+
+            negator = self._negators.get(name)
+            if kind == "positive" and carry and CONJUNCTION.fullmatch(text, carry[1], start):
+                negator = carry[0]
+                kind = _negation_kind(negator, tag)
+            elif kind in ("positive", "value") and _negated_nearby(text, start, floor):
+                kind = "uncertain"
+            carry = (negator, end) if negator else None
+
+            if kind == "question":
+                questions.append(snippet)
+            elif kind == "uncertain":
+                uncertain.append(snippet)
+                uncertain_tags.add(tag)
+                if self._branches[name][0] != "value":
+                    entity_pairs[tag] = extra
+            elif kind == "value":
+                value = _format_value(extra, match, name)
+                tag_values = values.setdefault(tag, [])
+                if value and value not in tag_values:
+                    tag_values.append(value)
+                evidence.setdefault(tag, []).append(snippet)
+            elif kind == "positive":
+                entity_pairs[tag] = extra
+                positives.setdefault(tag, []).append(snippet)
+            else:
+                entity_pairs[tag] = extra
+                negatives.setdefault(tag, []).append(snippet)
+
+        tags = set(values)
+        decided = set(values)
+        conflicts: List[str] = []
+        for positive, negative in entity_pairs.items():
+            if positive in uncertain_tags and positive not in positives and positive not in negatives:
+                continue
+            if positive in positives and positive in negatives:
+                conflicts.append(positive)
+                continue
+            decided.add(positive)
+            if negative:
+                decided.add(negative)
+            if positive in positives:
+                tags.add(positive)
+                evidence[positive] = positives[positive]
+            elif negative:
+                tags.add(negative)
+                evidence[negative] = negatives[positive]
+
+        if tags & VEHICLE_TYPES:
+            tags -= NEGATED_VEHICLE_TYPES
+            decided |= NEGATED_VEHICLE_TYPES
+
+        # 同一数值标签出现多个不同的值（如 "4.2米还是6.8米"）时交给LLM判断
+        ambiguous = [tag for tag, tag_values in values.items() if len(tag_values) > 1]
+        # 有含义不确定表述的标签（及其否定标签）都交给LLM判断
+        undecided = set(ambiguous) | uncertain_tags
+        undecided |= {entity_pairs[tag] for tag in uncertain_tags if entity_pairs.get(tag)}
+        order = list(TAG_DEFINITIONS).index
+        return {
+            "tags": sorted(tags, key=order),
+            "values": values,
+            "evidence": {tag: evidence[tag] for tag in sorted(tags, key=order)},
+            "decided_tags": sorted(decided - undecided, key=order),
+            "conflicts": conflicts,
+            "questions": questions,
+            "uncertain": uncertain,
+            "uncovered_cues": cues,
+            "fully_covered": bool(tags) and not (conflicts or questions or uncertain or cues or ambiguous)
+        }
+
+
+_tag_rule_matcher: Optional[TagRuleMatcher] = None
+_tag_rule_matcher_lock = threading.Lock()
+
+
+def get_tag_rule_matcher() -> TagRuleMatcher:
+    """获取规则匹配器单例（首次调用时编译）"""
+    global _tag_rule_matcher
+    if _tag_rule_matcher is None:
+        with _tag_rule_matcher_lock:
+            if _tag_rule_matcher is None:
+                _tag_rule_matcher = TagRuleMatcher()
+    return _tag_rule_matcher
+
+
+def extract_rule_tags(text: str) -> dict:
+    """抽取规则标签（见 TagRuleMatcher.match）"""
+    return get_tag_rule_matcher().match(text)
@@ -0,0 +1,114 @@
+"""
+检索模式基准：dense（向量）/ lexical（BM25）/ hybrid（融合）
+
+对已审核的对话做留一评估：用对话文本检索（排除自身），按相似对话的标签汇总推荐，
+与该对话的人工标签对比，统计标签精确率/召回率和单次检索延迟(p50/p99)。
+
+运行方式（需要已构建的向量索引）：
+python scripts/benchmark_hybrid_retrieval.py --queries 500 --top-k 3
+
+为公平比较延迟，脚本会关闭嵌入缓存和微批处理（否则向量检索的编码会直接命中缓存）。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.rag.index_sync import parse_manual_tags, rebuild_lexical_index
+
+
+def load_queries(limit: int, seed: int):
+    """随机抽取有人工标签的已审核对话"""
+    db = SessionLocal()
+    try:
+        rows = db.query(Conversation.id, Conversation.raw_text, Conversation.manual_tag).filter(
+            Conversation.status == 'approved'
+        ).all()
+    finally:
+        db.close()
+
+    labelled = [(row.id, row.raw_text, set(parse_manual_tags(row.manual_tag))) for row in rows]
+    labelled = [item for item in labelled if item[2]]
+    random.Random(seed).shuffle(labelled)
+    return labelled[:limit]
+
+
+def evaluate(recommender, mode: str, queries, top_k: int, min_similarity: float) -> dict:
+    """留一评估一个检索模式"""
+    latencies = []
+    true_positive = recommended = expected = 0
+    for conversation_id, text, truth in queries:
+        started = time.perf_counter()
+        results = recommender._retrieve(text, top_k + 1, mode=mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        neighbours = [
+            conv for conv in results
+            if conv['metadata'].get('conversation_id') != conversation_id
+        ][:top_k]
+        predicted = set(recommender._build_recommendation(neighbours, min_similarity)["recommendations"])
+
+        true_positive += len(predicted & truth)
+        recommended += len(predicted)
+        expected += len(truth)
+
+    precision = true_positive / recommended if recommended else 0.0
+    recall = true_positive / expected if expected else 0.0
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dense / lexical / hybrid 检索基准")
+    parser.add_argument("--queries", type=int, default=500, help="评估的对话数量")
+    parser.add_argument("--top-k", type=int, default=3, help="参考的相似对话数量")
+    parser.add_argument("--min-similarity", type=float, default=0.5, help="最小相似度阈值")
+    parser.add_argument("--modes", default="dense,lexical,hybrid", help="逗号分隔的检索模式")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    settings.EMBEDDING_CACHE_PATH = ""
+    settings.EMBEDDING_CACHE_MAX_ITEMS = 0
+    settings.EMBEDDING_MICRO_BATCHING = False
+
+    from app.services.rag.rag_service import get_rag_recommender
+
+    recommender = get_rag_recommender()
+    if recommender.vector_store.get_collection_count() == 0:
+        print("❌ 向量索引为空，请先构建索引")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    documents = rebuild_lexical_index()
+    print(f"📚 词法索引 {documents} 条，构建耗时 {time.perf_counter() - started:.1f}s")
+
+    queries = load_queries(args.queries, args.seed)
+    print(f"📐 {len(queries)} 条查询，top-{args.top_k}，最小相似度 {args.min_similarity}\n")
+
+    # 预热一次模型
+    recommender._retrieve(queries[0][1], 1, mode="dense")
+
+    for mode in [mode.strip() for mode in args.modes.split(",") if mode.strip()]:
+        result = evaluate(recommender, mode, queries, args.top_k, args.min_similarity)
+        print(
+            f"{mode:>8} | p50 {result['p50']:7.2f}ms | p99 {result['p99']:7.2f}ms | "
+            f"精确率 {result['precision']:.3f} | 召回率 {result['recall']:.3f} | F1 {result['f1']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
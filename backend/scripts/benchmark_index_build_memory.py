@@ -0,0 +1,125 @@
+"""
+索引构建内存基准：ndarray 直通 vs 旧的 Python 列表路径
+
+用 tracemalloc 统计 build_vector_index 的峰值内存和耗时（NumPy的数组分配也会被 tracemalloc 记录）。
+"list" 模式模拟改造前的行为：嵌入服务返回 .tolist() 的嵌套列表，再交给向量库转换回数组；
+"ndarray" 模式为当前实现：float32 矩阵从编码器一路传到向量库。
+
+运行方式：
+python scripts/benchmark_index_build_memory.py --size 20000
+python scripts/benchmark_index_build_memory.py --size 5000 --encoder model   # 使用真实嵌入模型
+
+默认使用随机向量编码器，只测量编码之外的管线开销；向量库使用临时目录下的NumPy后端，
+不会影响正式索引。
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.config import settings
+
+
+class RandomEncoder:
+    """随机向量编码器（不加载模型，只用于测量管线开销）"""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._rng = np.random.default_rng(0)
+
+    def encode(self, texts):
+        return self._rng.standard_normal((len(texts), self.dimension), dtype=np.float32)
+
+
+def make_conversations(size: int):
+    """生成合成的已审核对话"""
+    tags = json.dumps(["4.2米", "有尾板"], ensure_ascii=False)
+    for i in range(1, size + 1):
+        yield {
+            "id": i,
+            "raw_text": f"司机：你好，车厢长4.2米，有尾板，编号{i}。货主：好的，明天早上装货。" * 3,
+            "manual_tag": tags
+        }
+
+
+def run(mode: str, size: int, workdir: str, service) -> dict:
+    """在独立的临时索引目录中执行一次构建，返回峰值内存与耗时"""
+    from app.services.rag import rag_service as rag_module
+    from app.services.rag import vector_store as vector_store_module
+
+    settings.VECTOR_STORE_NUMPY_DIR = os.path.join(workdir, mode)
+    vector_store = vector_store_module.VectorStore()
+    vector_store_module._vector_store = vector_store
+
+    original_bulk = service.embed_texts_bulk
+    if mode == "list":
+        # 模拟改造前：服务层转换为列表，向量库原样传给后端
+        service.embed_texts_bulk = lambda texts: original_bulk(texts).tolist()
+        vector_store._to_backend = lambda embeddings: embeddings
+
+    recommender = rag_module.RAGRecommender()
+    try:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        result = recommender.build_vector_index(make_conversations(size), reconcile=False)
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        service.embed_texts_bulk = original_bulk
+
+    if not result.get("success"):
+        raise RuntimeError(result.get("message"))
+    return {"peak_bytes": peak, "seconds": seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="索引构建内存基准（ndarray vs 列表）")
+    parser.add_argument("--size", type=int, default=20000, help="对话数量")
+    parser.add_argument("--dimension", type=int, default=384, help="随机编码器的向量维度")
+    parser.add_argument("--encoder", choices=["random", "model"], default="random", help="编码器")
+    args = parser.parse_args()
+
+    # 隔离环境：NumPy后端、无持久化缓存、单进程编码
+    settings.VECTOR_STORE_BACKEND = "numpy"
+    settings.EMBEDDING_CACHE_PATH = ""
+    settings.EMBEDDING_CACHE_MAX_ITEMS = 0
+    settings.EMBEDDING_WORKERS = 0
+    settings.EMBEDDING_MICRO_BATCHING = False
+
+    from app.services.rag import embedding_service as embedding_module
+
+    if args.encoder == "random":
+        embedding_module.create_embedding_backend = lambda backend=None: (RandomEncoder(args.dimension), "random")
+    service = embedding_module.get_embedding_service()
+
+    print(f"📐 {args.size} 条对话，写入分块 {settings.VECTOR_INDEX_WRITE_BATCH}，编码器 {args.encoder}\n")
+
+    workdir = tempfile.mkdtemp(prefix="index-build-bench-")
+    try:
+        results = {}
+        for mode in ("list", "ndarray"):
+            results[mode] = run(mode, args.size, workdir, service)
+            print(
+                f"{mode:>8} | 峰值内存 {results[mode]['peak_bytes'] / 1024 / 1024:8.2f}MB | "
+                f"耗时 {results[mode]['seconds']:6.2f}s ({args.size / results[mode]['seconds']:8.0f} 条/s)"
+            )
+
+        reduction = 1 - results["ndarray"]["peak_bytes"] / results["list"]["peak_bytes"]
+        print(f"\n📉 峰值内存降低 {reduction:.1%}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
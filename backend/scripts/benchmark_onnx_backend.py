@@ -0,0 +1,103 @@
+"""
+ONNX后端一致性校验与延迟基准
+
+对比 torch 与 onnx 后端在同一批文本上的输出（余弦相似度）和编码延迟。
+余弦一致性低于阈值时以非零状态码退出，可作为导出模型后的验收检查。
+
+运行方式：
+EMBEDDING_ONNX_DIR=./models/embedding-onnx python scripts/benchmark_onnx_backend.py [--quantized]
+"""
+import argparse
+import os
+import sys
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.rag.embedding_service import create_embedding_backend
+
+SAMPLE_TEXTS = [
+    "司机：你好，我看到你发布的货源信息。$_$货主：是的，10吨钢材，尾板车，4.2米厢式车。",
+    "司机：老板，你这个杭州到宁波的货，高栏车行吗？$_$货主：不行，要厢式车，怕下雨。",
+    "司机：我的车是新能源面包车，可以跟车1人。$_$货主：好的，需要一装一卸。",
+    "司机：不走高速的话要多跑两个小时。$_$货主：那就走高速，过路费我出。",
+    "司机：车上有雨布和绳子，侧门可以全开。",
+]
+
+
+def load_texts(limit: int) -> list:
+    """优先使用数据库中的真实对话，不足时使用内置样例"""
+    db = SessionLocal()
+    try:
+        rows = db.query(Conversation.raw_text).limit(limit).all()
+        texts = [row[0] for row in rows if row[0]]
+    except Exception:
+        texts = []
+    finally:
+        db.close()
+    return texts or SAMPLE_TEXTS
+
+
+def time_encode(backend, texts: list, batch_size: int, rounds: int) -> list:
+    """返回每批编码耗时（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            t0 = time.perf_counter()
+            backend.encode(batch)
+            timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX后端一致性与延迟基准")
+    parser.add_argument("--limit", type=int, default=256, help="参与测试的文本数量")
+    parser.add_argument("--rounds", type=int, default=3, help="延迟测试轮数")
+    parser.add_argument("--quantized", action="store_true", help="测试int8量化模型")
+    parser.add_argument("--min-cosine", type=float, default=None, help="最低余弦一致性阈值")
+    args = parser.parse_args()
+
+    settings.EMBEDDING_ONNX_QUANTIZED = args.quantized
+    # 量化模型允许更大的数值偏差
+    min_cosine = args.min_cosine or (0.98 if args.quantized else 0.999)
+
+    texts = load_texts(args.limit)
+    print(f"📄 测试文本: {len(texts)} 条")
+
+    torch_backend, _ = create_embedding_backend("torch")
+    onnx_backend, onnx_name = create_embedding_backend("onnx")
+    print(f"🔧 ONNX模型: {onnx_name}")
+
+    # 一致性
+    reference = torch_backend.encode(texts)
+    candidate = onnx_backend.encode(texts)
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    print(f"\n📐 余弦一致性: min={cosine.min():.5f} mean={cosine.mean():.5f} (阈值 {min_cosine})")
+
+    # 延迟
+    print("\n⏱️  编码延迟 (ms/批):")
+    print(f"{'batch':>6} {'torch p50':>10} {'onnx p50':>10} {'speedup':>8}")
+    for batch_size in (1, 8, 32):
+        torch_times = time_encode(torch_backend, texts, batch_size, args.rounds)
+        onnx_times = time_encode(onnx_backend, texts, batch_size, args.rounds)
+        torch_p50 = float(np.percentile(torch_times, 50))
+        onnx_p50 = float(np.percentile(onnx_times, 50))
+        print(f"{batch_size:>6} {torch_p50:>10.2f} {onnx_p50:>10.2f} {torch_p50 / onnx_p50:>7.2f}x")
+
+    if cosine.min() < min_cosine:
+        print(f"\n❌ 一致性校验失败: 最低余弦 {cosine.min():.5f} < {min_cosine}")
+        sys.exit(1)
+    print("\n✅ 一致性校验通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+规则标签抽取基准
+
+对全部对话（分块流式读取）运行规则抽取，统计吞吐量（条/秒、MB/秒）、单条延迟(p50/p99)、
+规则命中率和完整覆盖率（即智能分析可跳过第二层LLM的比例）；
+对有人工标签的已审核对话统计每个规则标签的精确率/召回率。
+--compare-naive 同时测量两种对照的扫描吞吐量：不按首字符分桶的整体正则，以及每个规则分别 finditer。
+
+运行方式：
+python scripts/benchmark_tag_rules.py --compare-naive
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.database import SessionLocal
+from app.models import Conversation
+from app.services.rag.index_sync import parse_manual_tags
+from app.services.tag_definitions import TAG_DEFINITIONS
+from app.services.tag_rules import get_tag_rule_matcher
+
+
+def iter_conversations(chunk_size: int, limit: int):
+    """按ID键集分页读取全部对话"""
+    last_id = 0
+    count = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                Conversation.id, Conversation.raw_text, Conversation.manual_tag, Conversation.status
+            ).filter(Conversation.id > last_id).order_by(Conversation.id).limit(chunk_size).all()
+        finally:
+            db.close()
+
+        if not rows:
+            return
+        for row in rows:
+            yield row
+            count += 1
+            if limit and count >= limit:
+                return
+        last_id = rows[-1].id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则标签抽取基准")
+    parser.add_argument("--limit", type=int, default=0, help="最多读取的对话数，0 表示全部")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--compare-naive", action="store_true", help="对照：整体正则扫描、每个规则分别扫描")
+    args = parser.parse_args()
+
+    matcher = get_tag_rule_matcher()
+    rows = list(iter_conversations(args.chunk_size, args.limit))
+    if not rows:
+        print("❌ 没有对话数据")
+        sys.exit(1)
+    total_bytes = sum(len((row.raw_text or "").encode("utf-8")) for row in rows)
+    print(f"📐 {len(rows)} 条对话，{total_bytes / 1e6:.2f} MB，{len(matcher.alternatives)} 个规则分支，覆盖 {len(matcher.tags)} 个标签\n")
+
+    latencies = []
+    results = []
+    started = time.perf_counter()
+    for row in rows:
+        item_started = time.perf_counter()
+        results.append(matcher.match(row.raw_text))
+        latencies.append((time.perf_counter() - item_started) * 1e6)
+    elapsed = time.perf_counter() - started
+    print(f"⏱️ 单次扫描     {len(rows) / elapsed:>10.0f} 条/秒 | {total_bytes / 1e6 / elapsed:>6.2f} MB/秒 | "
+          f"p50 {np.percentile(latencies, 50):.1f}µs | p99 {np.percentile(latencies, 99):.1f}µs")
+
+    if args.compare_naive:
+        texts = [row.raw_text or "" for row in rows]
+        started = time.perf_counter()
+        for text in texts:
+            for _ in matcher.finditer(text):
+                pass
+        scan_elapsed = time.perf_counter() - started
+        print(f"⏱️ 其中扫描     {len(rows) / scan_elapsed:>10.0f} 条/秒 | {total_bytes / 1e6 / scan_elapsed:>6.2f} MB/秒")
+
+        started = time.perf_counter()
+        for text in texts:
+            for _ in matcher.pattern.finditer(text):
+                pass
+        combined_elapsed = time.perf_counter() - started
+        print(f"⏱️ 整体正则扫描 {len(rows) / combined_elapsed:>10.0f} 条/秒 | {total_bytes / 1e6 / combined_elapsed:>6.2f} MB/秒 | "
+              f"分桶快 {combined_elapsed / scan_elapsed:.1f}x")
+
+        patterns = [re.compile(alternative) for alternative in matcher.alternatives]
+        started = time.perf_counter()
+        for text in texts:
+            for pattern in patterns:
+                for _ in pattern.finditer(text):
+                    pass
+        naive_elapsed = time.perf_counter() - started
+        print(f"⏱️ 逐规则扫描   {len(rows) / naive_elapsed:>10.0f} 条/秒 | {total_bytes / 1e6 / naive_elapsed:>6.2f} MB/秒 | "
+              f"分桶快 {naive_elapsed / scan_elapsed:.1f}x")
+
+    with_tags = sum(1 for result in results if result["tags"])
+    covered = sum(1 for result in results if result["fully_covered"])
+    decided = [len(result["decided_tags"]) for result in results if result["tags"] and not result["fully_covered"]]
+    cue_counts = Counter(cue for result in results for cue in result["uncovered_cues"])
+    print(f"\n📊 有规则标签 {with_tags / len(rows):.1%} | 完整覆盖（跳过第二层LLM）{covered / len(rows):.1%} | "
+          f"其余有规则标签的对话平均从第二层提示词去掉 {np.mean(decided) if decided else 0:.1f}/{len(TAG_DEFINITIONS)} 个标签")
+    print(f"   未覆盖线索词 Top10: {', '.join(f'{cue}({n})' for cue, n in cue_counts.most_common(10))}")
+
+    # 与人工标签对比（只看规则能判定的标签）
+    true_positives = Counter()
+    predicted = Counter()
+    support = Counter()
+    for row, result in zip(rows, results):
+        if row.status != 'approved':
+            continue
+        truth = set(parse_manual_tags(row.manual_tag))
+        if not truth:
+            continue
+        for tag in matcher.tags:
+            in_truth = tag in truth
+            in_predicted = tag in result["tags"]
+            support[tag] += in_truth
+            predicted[tag] += in_predicted
+            true_positives[tag] += in_truth and in_predicted
+
+    if sum(support.values()) or sum(predicted.values()):
+        print(f"\n{'标签':<12} {'支持数':>6} {'预测数':>6} {'精确率':>7} {'召回率':>7}")
+        for tag in sorted(matcher.tags, key=lambda t: -support[t]):
+            precision = true_positives[tag] / predicted[tag] if predicted[tag] else 0.0
+            recall = true_positives[tag] / support[tag] if support[tag] else 0.0
+            print(f"{tag:<12} {support[tag]:>6} {predicted[tag]:>6} {precision:>7.3f} {recall:>7.3f}")
+        micro_precision = sum(true_positives.values()) / max(sum(predicted.values()), 1)
+        micro_recall = sum(true_positives.values()) / max(sum(support.values()), 1)
+        print(f"\n📊 微平均 精确率 {micro_precision:.3f} | 召回率 {micro_recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+离线评估多标签分类模型
+
+在训练时划出的测试集（按对话ID哈希，与训练脚本一致）上统计每个标签的精确率/召回率，
+并测量单条推荐的延迟(p50/p99)：只计算模型推理，以及包含文本编码的端到端推荐。
+
+运行方式（需要先运行 scripts/train_tag_classifier.py）：
+python scripts/evaluate_tag_classifier.py --latency-queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.rag.tag_classifier import SPLIT_TEST, get_tag_classifier, load_labelled_embeddings, split_of
+
+
+def percentiles(latencies):
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线评估多标签分类模型")
+    parser.add_argument("--latency-queries", type=int, default=500, help="测量延迟的查询数量")
+    args = parser.parse_args()
+
+    classifier = get_tag_classifier()
+    if classifier is None:
+        print("❌ 没有可用的分类模型，请先运行 scripts/train_tag_classifier.py")
+        sys.exit(1)
+
+    split = classifier.meta["split"]
+    conversation_ids, embeddings, labels = load_labelled_embeddings(classifier.tags)
+    test_mask = np.array([
+        split_of(conv_id, split["test_percent"], split["calibration_percent"]) == SPLIT_TEST
+        for conv_id in conversation_ids
+    ], dtype=bool)
+    if not test_mask.any():
+        print("❌ 测试集为空")
+        sys.exit(1)
+
+    test_embeddings = embeddings[test_mask]
+    truth = labels[test_mask].astype(bool)
+    predicted = classifier.predict_proba(test_embeddings) >= classifier.thresholds
+
+    print(f"📐 模型版本 {classifier.version}，测试集 {len(test_embeddings)} 条，{len(classifier.tags)} 个标签\n")
+    print(f"{'标签':<16} {'支持数':>6} {'阈值':>6} {'精确率':>7} {'召回率':>7} {'F1':>6}")
+    true_positives = (predicted & truth).sum(axis=0)
+    predicted_counts = predicted.sum(axis=0)
+    support = truth.sum(axis=0)
+    for i in np.argsort(-support, kind="stable"):
+        precision = true_positives[i] / predicted_counts[i] if predicted_counts[i] else 0.0
+        recall = true_positives[i] / support[i] if support[i] else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        print(f"{classifier.tags[i]:<16} {support[i]:>6} {classifier.thresholds[i]:>6.3f} {precision:>7.3f} {recall:>7.3f} {f1:>6.3f}")
+
+    micro_precision = true_positives.sum() / max(predicted_counts.sum(), 1)
+    micro_recall = true_positives.sum() / max(support.sum(), 1)
+    micro_f1 = 2 * micro_precision * micro_recall / (micro_precision + micro_recall) if micro_precision + micro_recall else 0.0
+    exact = (predicted == truth).all(axis=1).mean()
+    print(f"\n📊 微平均 精确率 {micro_precision:.3f} | 召回率 {micro_recall:.3f} | F1 {micro_f1:.3f} | 完全一致 {exact:.3f}")
+
+    # 延迟：模型推理（单条）
+    queries = test_embeddings[:args.latency_queries]
+    latencies = []
+    for embedding in queries:
+        started = time.perf_counter()
+        classifier.recommend(embedding)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p50, p99 = percentiles(latencies)
+    print(f"⏱️ 模型推理     p50 {p50:.3f}ms | p99 {p99:.3f}ms")
+
+    # 延迟：端到端（编码 + 推理）
+    from app.database import SessionLocal
+    from app.models import Conversation
+    from app.services.rag.embedding_cache import EmbeddingCache
+    from app.services.rag.rag_service import get_rag_recommender
+
+    test_ids = [conv_id for conv_id, is_test in zip(conversation_ids, test_mask) if is_test][:args.latency_queries]
+    db = SessionLocal()
+    try:
+        texts = [row.raw_text for row in db.query(Conversation.raw_text).filter(Conversation.id.in_(test_ids)).all()]
+    finally:
+        db.close()
+
+    # 测试集文本在上面已编码过，换成空缓存并绕过微批处理，测量真实的编码开销
+    recommender = get_rag_recommender()
+    recommender.embedding_service.cache = EmbeddingCache(db_path=None, max_memory_items=0)
+    recommender.vector_store.query_embedder = recommender.embedding_service
+    recommender.recommend_tags_by_classifier(texts[0])  # 预热
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        recommender.recommend_tags_by_classifier(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p50, p99 = percentiles(latencies)
+    print(f"⏱️ 端到端推荐   p50 {p50:.3f}ms | p99 {p99:.3f}ms（含文本编码）")
+
+
+if __name__ == "__main__":
+    main()
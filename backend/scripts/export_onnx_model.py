@@ -0,0 +1,96 @@
+"""
+将嵌入模型导出为ONNX（可选int8动态量化），供 EMBEDDING_BACKEND=onnx 使用
+
+运行方式：
+python scripts/export_onnx_model.py --output ./models/embedding-onnx --quantize
+
+导出源优先使用 EMBEDDING_MODEL_DIR（离线目录），否则按模型名称和 EMBEDDING_MODEL_REVISION 从hub加载。
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Optional
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.rag.model_manifest import verify_manifest, write_manifest
+
+
+def export(source: str, model_name: str, revision: Optional[str], output_dir: str, quantize: bool, opset: int):
+    """导出ONNX模型、tokenizer和推理配置（revision 为源模型的hub commit，写入清单）"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    print(f"📦 加载模型: {source}")
+    # 从本地目录加载时 revision 只记录在清单中
+    load_revision = revision if source == model_name else None
+    st_model = SentenceTransformer(source, device="cpu", revision=load_revision)
+    transformer = st_model[0].auto_model
+    tokenizer = st_model.tokenizer
+    transformer.eval()
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, "model.onnx")
+
+    sample = tokenizer(["司机：车厢长4.2米，有尾板。"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    print("🔄 导出ONNX...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (sample["input_ids"], sample["attention_mask"]),
+            model_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print("🔄 int8动态量化...")
+        quantize_dynamic(
+            model_path,
+            os.path.join(output_dir, "model_quantized.onnx"),
+            weight_type=QuantType.QInt8
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "onnx_config.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "max_seq_length": st_model.max_seq_length,
+            "pooling": "mean",
+            "opset": opset
+        }, f, ensure_ascii=False, indent=2)
+
+    manifest = write_manifest(output_dir, model_name, revision)
+    print(f"✅ 已导出到 {output_dir}（{len(manifest['files'])} 个文件）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出嵌入模型为ONNX")
+    parser.add_argument("--output", required=True, help="输出目录")
+    parser.add_argument("--quantize", action="store_true", help="同时生成int8动态量化模型")
+    parser.add_argument("--opset", type=int, default=14, help="ONNX opset版本")
+    args = parser.parse_args()
+
+    if settings.EMBEDDING_MODEL_DIR:
+        source = settings.EMBEDDING_MODEL_DIR
+        manifest = verify_manifest(source)
+        model_name, revision = manifest["model_name"], manifest.get("revision")
+    else:
+        source = model_name = settings.EMBEDDING_MODEL_NAME
+        revision = settings.EMBEDDING_MODEL_REVISION
+    export(source, model_name, revision, args.output, args.quantize, args.opset)
+
+
+if __name__ == "__main__":
+    main()
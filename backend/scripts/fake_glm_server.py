@@ -0,0 +1,128 @@
+"""
+本地模拟GLM服务（用于测试批量预分析，不消耗GLM额度）
+
+实现 /chat/completions 接口：第一层提示词中出现在对话文本里的初始标签判定为合适，
+第二层从标签定义列表中推荐对话文本里出现的标签。可模拟响应延迟和按比例返回 429/503 错误。
+
+运行方式：
+python scripts/fake_glm_server.py --port 8900 --latency 0.5 --failure-rate 0.1
+然后以 GLM_API_BASE_URL=http://127.0.0.1:8900 GLM_API_KEY=fake 启动后端服务
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+TAG_LINE = re.compile(r"^- ([^:：]+)[:：]", re.MULTILINE)
+
+
+def section(prompt: str, header: str) -> str:
+    """提取提示词中 "## 标题" 到下一个 "##" 之间的内容"""
+    start = prompt.find(header)
+    if start < 0:
+        return ""
+    start += len(header)
+    end = prompt.find("\n## ", start)
+    return prompt[start:end if end >= 0 else len(prompt)]
+
+
+def answer(prompt: str) -> dict:
+    """按提示词类型生成回答"""
+    conversation = section(prompt, "## 对话内容：")
+
+    if "## 初始AI推荐的标签：" in prompt:
+        tags = TAG_LINE.findall(section(prompt, "## 初始AI推荐的标签："))
+        appropriate = [tag for tag in tags if tag in conversation]
+        inappropriate = [tag for tag in tags if tag not in conversation]
+        reasons = {tag: "对话中提到该标签" for tag in appropriate}
+        reasons.update({tag: "对话中未提及该标签" for tag in inappropriate})
+        return {"appropriate_tags": appropriate, "inappropriate_tags": inappropriate, "reasons": reasons}
+
+    excluded = {tag.strip() for tag in section(prompt, "## 已排除的标签（不需要再次推荐）：").split(",")}
+    tags = TAG_LINE.findall(section(prompt, "## 所有可用的标准化标签及其定义："))
+    recommended = [tag for tag in tags if tag in conversation and tag not in excluded]
+    return {"recommended_tags": recommended, "reasons": {tag: "对话中提到该标签" for tag in recommended}}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+
+def make_handler(args, stats: Stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._reply(404, {"error": {"message": "not found"}})
+                return
+
+            with stats.lock:
+                stats.requests += 1
+                stats.concurrent += 1
+                stats.max_concurrent = max(stats.max_concurrent, stats.concurrent)
+            try:
+                time.sleep(max(0.0, random.gauss(args.latency, args.latency / 4)))
+                if random.random() < args.failure_rate:
+                    with stats.lock:
+                        stats.failures += 1
+                    self._reply(random.choice([429, 503]), {"error": {"message": "simulated failure"}})
+                    return
+
+                prompt = request["messages"][-1]["content"]
+                content = json.dumps(answer(prompt), ensure_ascii=False)
+                self._reply(200, {
+                    "model": request.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+                })
+            finally:
+                with stats.lock:
+                    stats.concurrent -= 1
+
+        def log_message(self, format, *log_args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟GLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均响应延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="返回 429/503 的比例")
+    args = parser.parse_args()
+
+    stats = Stats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, stats))
+    print(f"🤖 模拟GLM服务: http://{args.host}:{args.port}（延迟 {args.latency}s，失败率 {args.failure_rate}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n📊 请求 {stats.requests} 次，模拟失败 {stats.failures} 次，最大并发 {stats.max_concurrent}")
+
+
+if __name__ == "__main__":
+    main()
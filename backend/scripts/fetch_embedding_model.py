@@ -0,0 +1,65 @@
+"""
+预下载嵌入模型到本地目录并生成校验清单
+
+构建镜像时运行，按固定的 hub commit 下载并完整校验SHA-256，运行期通过 EMBEDDING_MODEL_DIR 离线加载：
+python scripts/fetch_embedding_model.py --output ./models/embedding --revision <40位commit>
+
+只校验已有目录（指定 --revision 时同时核对清单中的版本）：
+python scripts/fetch_embedding_model.py --output ./models/embedding --verify
+"""
+import argparse
+import os
+import re
+import sys
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.rag.model_manifest import verify_manifest, write_manifest
+
+
+def fetch(model_name: str, revision: str, output_dir: str):
+    """按固定版本下载模型并写入清单"""
+    from sentence_transformers import SentenceTransformer
+
+    print(f"⬇️  下载模型: {model_name}@{revision}")
+    model = SentenceTransformer(model_name, device="cpu", revision=revision)
+
+    os.makedirs(output_dir, exist_ok=True)
+    model.save(output_dir)
+
+    manifest = write_manifest(output_dir, model_name, revision)
+    total_size = sum(item["size"] for item in manifest["files"].values())
+    print(f"✅ 模型已保存到 {output_dir}")
+    print(f"📄 清单: {len(manifest['files'])} 个文件，共 {total_size / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预下载嵌入模型并生成校验清单")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL_NAME, help="模型名称")
+    parser.add_argument(
+        "--revision", default=settings.EMBEDDING_MODEL_REVISION,
+        help="hub上的40位commit，默认取 EMBEDDING_MODEL_REVISION"
+    )
+    parser.add_argument("--output", required=True, help="模型输出目录")
+    parser.add_argument("--verify", action="store_true", help="只校验已有目录，不下载")
+    args = parser.parse_args()
+
+    if args.verify:
+        manifest = verify_manifest(args.output)
+        if args.revision and manifest.get("revision") != args.revision:
+            sys.exit(f"❌ 模型版本不一致: 清单为 {manifest.get('revision')}，期望 {args.revision}")
+        print(f"✅ 校验通过: {manifest['model_name']}@{manifest.get('revision')} ({len(manifest['files'])} 个文件)")
+        return
+
+    # 分支名或标签会随hub更新而变化，只接受完整的commit
+    if not args.revision or not re.fullmatch(r"[0-9a-f]{40}", args.revision):
+        sys.exit("❌ 请通过 --revision 或 EMBEDDING_MODEL_REVISION 指定模型在hub上的40位commit")
+
+    fetch(args.model, args.revision, args.output)
+    verify_manifest(args.output)
+
+
+if __name__ == "__main__":
+    main()
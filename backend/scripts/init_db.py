@@ -6,6 +6,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import engine, Base
 from app.models import Conversation, Tag, AuditLog
+from app.services.conversation_search import ensure_fts_index
 
 
 def init_db():
@@ -15,12 +16,18 @@ def init_db():
     # 创建所有表
     Base.metadata.create_all(bind=engine)
 
+    # 全文检索索引（FTS5虚拟表 + 同步触发器）
+    with engine.begin() as conn:
+        ensure_fts_index(conn)
+
     print("✅ 数据库初始化成功！")
     print(f"📍 数据库文件: {engine.url}")
     print("\n📊 已创建的表:")
     print("   - conversations (对话表)")
     print("   - tags (标签表)")
     print("   - audit_logs (审核记录表)")
+    print("   - ai_preanalysis (AI预分析结果表)")
+    print("   - conversations_fts (对话全文索引)")
 
 
 if __name__ == "__main__":
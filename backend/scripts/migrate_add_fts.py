@@ -0,0 +1,55 @@
+"""
+数据库迁移脚本：添加对话全文检索索引（SQLite FTS5 trigram）
+
+创建 conversations_fts 虚拟表和同步触发器，并从 conversations 表回填已有数据。
+可重复执行；加 --rebuild 强制重建索引内容。
+
+运行方式：
+docker exec smartlabelingworkbench-backend-1 python scripts/migrate_add_fts.py
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services.conversation_search import FTS_TABLE, ensure_fts_index
+
+
+def migrate(rebuild: bool = False):
+    """执行数据库迁移"""
+    print(f"📁 数据库: {engine.url}")
+    print("\n🔄 开始迁移...")
+
+    started = time.monotonic()
+    try:
+        with engine.begin() as conn:
+            created = ensure_fts_index(conn, rebuild=rebuild)
+            if created:
+                print(f"  ▶ 已创建 {FTS_TABLE} 表和同步触发器，并回填已有对话")
+            elif rebuild:
+                print(f"  ▶ 已重建 {FTS_TABLE} 索引内容")
+            else:
+                print(f"  ✓ {FTS_TABLE} 已存在（如需重建请加 --rebuild）")
+
+            total = conn.execute(text("SELECT COUNT(*) FROM conversations")).scalar()
+            # 外部内容表的 COUNT 读取的是源表，用 docsize 影子表统计实际已索引的行数
+            indexed = conn.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}_docsize")).scalar()
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+
+    print(f"\n✅ 迁移完成！耗时 {time.monotonic() - started:.1f}s")
+    print(f"📊 对话 {total} 条，已索引 {indexed} 条")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="添加对话全文检索索引")
+    parser.add_argument("--rebuild", action="store_true", help="强制重建索引内容")
+    migrate(rebuild=parser.parse_args().rebuild)
@@ -0,0 +1,40 @@
+"""
+数据库迁移脚本：添加 AI预分析结果表
+创建 ai_preanalysis 表（已有数据库升级时运行一次，新数据库由 init_db.py 创建）
+
+运行方式：
+docker exec smartlabelingworkbench-backend-1 python scripts/migrate_add_preanalysis.py
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import inspect
+
+from app.database import engine
+from app.models import AIPreanalysis
+
+
+def migrate():
+    """执行数据库迁移"""
+    print(f"📁 数据库: {engine.url}")
+    print("\n🔄 开始迁移...")
+
+    try:
+        if inspect(engine).has_table(AIPreanalysis.__tablename__):
+            print(f"  ✓ {AIPreanalysis.__tablename__} 表已存在")
+        else:
+            AIPreanalysis.__table__.create(bind=engine)
+            print(f"  ▶ 已创建 {AIPreanalysis.__tablename__} 表")
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+
+    print("\n✅ 迁移完成！")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,44 @@
+"""
+训练标签质心模型
+
+从当前向量索引（已审核且有标签的对话）读取向量，计算每个标准化标签的质心，
+用留一法校准判定阈值，写入 TAG_CENTROID_MODEL_PATH。服务运行时会随审核增量更新，
+对账和重建索引后也会自动重新训练；本脚本用于离线训练和查看各标签的校准结果。
+
+运行方式：
+python scripts/train_tag_centroids.py
+"""
+import os
+import sys
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.config import settings
+from app.services.rag.tag_centroids import get_tag_centroid_classifier, train_tag_centroids
+from app.services.rag.vector_store import get_vector_store
+
+
+def main():
+    if get_vector_store().get_collection_count() == 0:
+        print("❌ 向量索引为空，请先构建索引")
+        sys.exit(1)
+
+    result = train_tag_centroids()
+    classifier = get_tag_centroid_classifier()
+    print(f"💾 模型文件: {settings.TAG_CENTROID_MODEL_PATH}\n")
+
+    print(f"{'标签':<16} {'样本数':>6} {'阈值':>7} {'留一精确率':>10}")
+    order = np.argsort(-classifier.counts, kind="stable")
+    for i in order:
+        threshold = classifier.thresholds[i]
+        threshold_str = f"{threshold:.3f}" if np.isfinite(threshold) else "-"
+        print(f"{classifier.tags[i]:<16} {classifier.counts[i]:>6} {threshold_str:>7} {classifier.precisions[i]:>10.3f}")
+
+    print(f"\n✅ {result['examples']} 条样本，{result['tags']}/{len(classifier.tags)} 个标签可判定")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+训练多标签分类模型（一对多逻辑回归）
+
+读取有人工标签的已审核对话并编码，按对话ID哈希划分训练/校准/测试集，
+训练后发布为 TAG_CLASSIFIER_DIR 下的新版本，运行中的服务会自动加载。
+评估请运行 scripts/evaluate_tag_classifier.py（使用同一划分的测试集）。
+
+运行方式：
+python scripts/train_tag_classifier.py --epochs 50
+"""
+import argparse
+import os
+import sys
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.rag.tag_classifier import train_tag_classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练多标签分类模型")
+    parser.add_argument("--test-percent", type=int, default=10, help="测试集比例（%%）")
+    parser.add_argument("--calibration-percent", type=int, default=10, help="校准集比例（%%），用于选取标签阈值")
+    parser.add_argument("--min-examples", type=int, default=5, help="训练集正样本少于该数的标签不参与训练")
+    parser.add_argument("--l2", type=float, default=1e-4, help="L2正则系数")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--dry-run", action="store_true", help="只训练不发布")
+    args = parser.parse_args()
+
+    try:
+        result = train_tag_classifier(
+            test_percent=args.test_percent,
+            calibration_percent=args.calibration_percent,
+            min_examples=args.min_examples,
+            l2=args.l2,
+            epochs=args.epochs,
+            learning_rate=args.learning_rate,
+            batch_size=args.batch_size,
+            publish=not args.dry_run
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    history = result["loss_history"]
+    print(f"📉 交叉熵: 第1轮 {history[0]:.4f} → 第{len(history)}轮 {history[-1]:.4f}")
+    print(f"📊 样本划分: {result['examples']}")
+    if result["version"] is not None:
+        print(f"💾 已发布版本 {result['version']} 到 {settings.TAG_CLASSIFIER_DIR}")
+    else:
+        print("⚠️ dry-run，未发布")
+
+
+if __name__ == "__main__":
+    main()
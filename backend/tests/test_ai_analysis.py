@@ -0,0 +1,72 @@
+"""三层AI分析中质心模型的快速通道（app/services/ai_analysis.py）"""
+import asyncio
+
+import pytest
+
+from app.services import ai_analysis
+
+TEXT = "你好，明天下午能装货吗"
+
+
+class FakeRecommender:
+    def __init__(self, result):
+        self.result = result
+
+    def recommend_tags_by_centroid(self, text):
+        return self.result
+
+
+@pytest.fixture
+def layers(monkeypatch):
+    calls = {"initial": [], "conversation": 0}
+
+    async def initial(text, tags):
+        calls["initial"].append(list(tags))
+        return {"appropriate_tags": [], "inappropriate_tags": list(tags), "reasons": {}}
+
+    async def conversation(text, exclude_tags=None):
+        calls["conversation"] += 1
+        return {"recommended_tags": ["回程车"], "reasons": {}}
+
+    async def similar(text):
+        return {"success": False, "similar_conversations": []}, {}
+
+    monkeypatch.setattr(ai_analysis, "analyze_initial_tags_with_ai", initial)
+    monkeypatch.setattr(ai_analysis, "recommend_tags_from_conversation_with_ai", conversation)
+    monkeypatch.setattr(ai_analysis, "search_similar_conversations_for_analysis", similar)
+    monkeypatch.setattr(ai_analysis, "is_rag_ready", lambda: True)
+    monkeypatch.setattr(ai_analysis.settings, "TAG_CENTROID_ENABLED", True)
+    monkeypatch.setattr(ai_analysis.settings, "TAG_CENTROID_SKIP_LLM_CONFIDENCE", 0.9)
+    return calls
+
+
+def _centroid(monkeypatch, uncertain_tags):
+    monkeypatch.setattr(ai_analysis, "get_rag_recommender", lambda: FakeRecommender({
+        "success": True,
+        "recommendations": ["有尾板"],
+        "tag_scores": {"有尾板": 0.8},
+        "confidence": 0.95,
+        "uncertain_tags": uncertain_tags,
+    }))
+
+
+def test_confident_centroid_skips_only_conversation_layer(layers, monkeypatch):
+    _centroid(monkeypatch, [])
+    result = asyncio.run(ai_analysis.run_ai_analysis(TEXT, ["高栏"]))
+
+    # 初始标签仍由第一层验证，质心结论不能代替对初始标签的判断
+    assert layers["initial"] == [["高栏"]]
+    assert layers["conversation"] == 0
+    assert result["initial_ai_analysis"]["inappropriate"] == ["高栏"]
+    assert result["centroid_analysis"]["conversation_llm_skipped"] is True
+    assert result["auto_select_tags"] == ["有尾板"]
+
+
+def test_uncertain_tags_keep_conversation_layer(layers, monkeypatch):
+    _centroid(monkeypatch, ["回程车"])
+    result = asyncio.run(ai_analysis.run_ai_analysis(TEXT, ["高栏"]))
+
+    assert layers["conversation"] == 1
+    assert result["centroid_analysis"]["conversation_llm_skipped"] is False
+    assert result["tag_details"]["有尾板"]["score"] == 6
+    assert "回程车" in result["recommendations"]
@@ -0,0 +1,84 @@
+"""对话全文检索与键集分页（app/services/conversation_search.py）"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Conversation
+from app.services.conversation_search import ensure_fts_index, search_conversations
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        ensure_fts_index(conn)
+
+    session = sessionmaker(bind=engine)()
+    texts = []
+    for i in range(30):
+        # 长度不同使 bm25 分数不同，相同长度的对话分数相同，用于检验同分时按ID分页
+        texts.append("司机：我的车有尾板车配置" + "，好的" * (i % 4) + "$_$货主：有雨布吗")
+    texts += ["司机：高栏车，没有雨布"] * 5
+    session.add_all([
+        Conversation(raw_text=raw_text, status="approved" if i % 3 == 0 else "pending")
+        for i, raw_text in enumerate(texts)
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _all_pages(db, query, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        page = search_conversations(db, query, limit=limit, cursor=cursor, **filters)
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, page["mode"]
+
+
+@pytest.mark.parametrize("query, mode", [("尾板车", "fts"), ("雨布", "like")])
+def test_pages_match_single_query(db, query, mode):
+    expected = search_conversations(db, query, limit=100)
+    ids, page_mode = _all_pages(db, query, limit=7)
+
+    assert page_mode == expected["mode"] == mode
+    assert expected["next_cursor"] is None
+    assert ids == [item["id"] for item in expected["items"]]
+    assert len(ids) == len(set(ids))
+
+
+def test_fts_results_are_ranked_then_ordered_by_id(db):
+    items = search_conversations(db, "尾板车", limit=100)["items"]
+    assert len(items) == 30
+    keys = [(item["score"], item["id"]) for item in items]
+    assert keys == sorted(keys)
+    assert "<mark>" in items[0]["snippet"]
+
+
+def test_filters_apply_across_pages(db):
+    ids, _ = _all_pages(db, "尾板车 雨布", limit=4, status="approved")
+    approved = {c.id for c in db.query(Conversation).filter(Conversation.status == "approved")}
+    assert ids and set(ids) <= approved
+    assert len(ids) == len(set(ids)) == 10
+
+
+def test_index_follows_inserts_and_deletes(db):
+    db.add(Conversation(raw_text="司机：新能源面包车"))
+    db.commit()
+    assert len(search_conversations(db, "面包车")["items"]) == 1
+
+    db.query(Conversation).filter(Conversation.raw_text.like("%尾板车%")).delete(synchronize_session=False)
+    db.commit()
+    assert search_conversations(db, "尾板车")["items"] == []
+
+
+def test_invalid_input(db):
+    with pytest.raises(ValueError):
+        search_conversations(db, "   ")
+    with pytest.raises(ValueError):
+        search_conversations(db, "尾板车", cursor="not-a-cursor")
@@ -0,0 +1,118 @@
+"""蓝绿重建期间的增量同步与回滚（app/services/rag/rag_service.py、index_sync.py）"""
+import json
+import zlib
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base
+from app.models import Conversation
+from app.services.rag import index_sync, rag_service, tag_vocabulary, vector_store as vector_store_module
+from app.services.rag.tag_vocabulary import TagVocabulary
+
+
+class FakeEmbeddingService:
+    """按文本确定的随机单位向量"""
+
+    def embed_text(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=8)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def embed_texts_bulk(self, texts):
+        return np.stack([self.embed_text(text) for text in texts])
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(index_sync, "SessionLocal", session_factory)
+    return session_factory
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, db):
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "VECTOR_STORE_NUMPY_DIR", str(tmp_path / "vectors"))
+    monkeypatch.setattr(settings, "EMBEDDING_MICRO_BATCHING", False)
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_MODE", "dense")
+    monkeypatch.setattr(settings, "TAG_CENTROID_ENABLED", False)
+    monkeypatch.setattr(tag_vocabulary, "_tag_vocabulary", TagVocabulary(None))
+    monkeypatch.setattr(vector_store_module, "get_embedding_service", FakeEmbeddingService)
+    monkeypatch.setattr(rag_service, "get_embedding_service", FakeEmbeddingService)
+
+    store = vector_store_module.VectorStore()
+    monkeypatch.setattr(vector_store_module, "get_vector_store", lambda: store)
+    monkeypatch.setattr(rag_service, "get_vector_store", lambda: store)
+    monkeypatch.setattr(index_sync, "is_rag_ready", lambda: True)
+    return store
+
+
+def _save(db, conversation_id, tags, status="approved"):
+    session = db()
+    try:
+        conversation = session.get(Conversation, conversation_id) or Conversation(id=conversation_id)
+        conversation.raw_text = f"对话 {conversation_id}"
+        conversation.manual_tag = json.dumps(tags, ensure_ascii=False)
+        conversation.status = status
+        session.merge(conversation)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _snapshot(db):
+    session = db()
+    try:
+        return [
+            {"id": row.id, "raw_text": row.raw_text, "manual_tag": row.manual_tag}
+            for row in session.query(Conversation).filter(Conversation.status == "approved").order_by(Conversation.id)
+        ]
+    finally:
+        session.close()
+
+
+def test_changes_during_build_are_not_resurrected(db, store):
+    for conversation_id in (1, 2, 3):
+        _save(db, conversation_id, ["高栏"])
+
+    def conversations():
+        # 构建读取对话之后、写入新版本之前，审核端删除了2、改了3的标签、新审核了4
+        rows = _snapshot(db)
+        _save(db, 2, ["高栏"], status="pending")
+        index_sync.sync_conversation_index(2)
+        _save(db, 3, ["平板"])
+        index_sync.sync_conversation_index(3)
+        _save(db, 4, ["厢货"])
+        index_sync.sync_conversation_index(4)
+        yield from rows
+
+    result = rag_service.RAGRecommender().build_vector_index(conversations())
+
+    assert result["success"] and result["count"] == 3
+    assert store.index_version == 1
+    assert store.get_indexed_tags() == {1: "高栏", 3: "平板", 4: "厢货"}
+
+
+def test_rollback_catches_up_with_changes_after_swap(db, store):
+    for conversation_id in (1, 2):
+        _save(db, conversation_id, ["高栏"])
+    rag_service.RAGRecommender().build_vector_index(_snapshot(db))
+    rag_service.RAGRecommender().build_vector_index(_snapshot(db))
+    assert (store.index_version, store.previous_version) == (2, 1)
+
+    # 切换后的增量同步只写入当前版本
+    _save(db, 1, ["高栏"], status="pending")
+    index_sync.sync_conversation_index(1)
+    _save(db, 5, ["平板"])
+    index_sync.sync_conversation_index(5)
+
+    result = index_sync.rollback_index()
+
+    assert store.index_version == 1
+    assert result["upserted"] == 1 and result["deleted"] == 1
+    assert store.get_indexed_tags() == {2: "高栏", 5: "平板"}
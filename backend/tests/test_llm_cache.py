@@ -0,0 +1,106 @@
+"""LLM响应缓存（app/services/llm_cache.py）"""
+import pytest
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache, make_llm_cache_key
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def _count(cache: LLMResponseCache) -> int:
+    return cache._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+def test_key_is_deterministic_and_covers_every_parameter():
+    key = make_llm_cache_key("glm-4-flash", "提示词", 0.1, 2000)
+    assert key == make_llm_cache_key("glm-4-flash", "提示词", 0.1, 2000)
+    assert len({
+        key,
+        make_llm_cache_key("glm-4-plus", "提示词", 0.1, 2000),
+        make_llm_cache_key("glm-4-flash", "提示词 ", 0.1, 2000),
+        make_llm_cache_key("glm-4-flash", "提示词", 0.2, 2000),
+        make_llm_cache_key("glm-4-flash", "提示词", 0.1, 1000),
+    }) == 5
+
+
+def test_changed_definitions_invalidate_on_reopen(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(path, ttl_seconds=0, max_items=10)
+    cache.put("k", "glm", "旧结果")
+    assert LLMResponseCache(path, ttl_seconds=0, max_items=10).get("k") == "旧结果"
+
+    monkeypatch.setattr(llm_cache, "definitions_fingerprint", lambda: "changed")
+    reopened = LLMResponseCache(path, ttl_seconds=0, max_items=10)
+    assert reopened.get("k") is None
+    assert reopened.get_stats()["items"] == 0
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.db"), ttl_seconds=60, max_items=10)
+    cache.put("a", "glm", "A")
+    cache.put("b", "glm", "B")
+
+    clock.now += 30
+    assert cache.get("a") == "A"
+    clock.now += 31
+    assert cache.get("a") is None
+    assert cache.purge_expired() == 1
+
+    stats = cache.get_stats()
+    assert stats["expired"] == 2
+    assert stats["items"] == _count(cache) == 0
+
+
+def test_eviction_uses_batched_hit_times(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.db"), ttl_seconds=0, max_items=2)
+    cache.put("a", "glm", "A")
+    clock.now += 1
+    cache.put("b", "glm", "B")
+    clock.now += 1
+    # 命中只记在内存中，写入前批量更新，"a" 变为最近使用
+    assert cache.get("a") == "A"
+    assert cache._pending_access == {"a": clock.now}
+    clock.now += 1
+    cache.put("c", "glm", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_hits_flush_in_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(llm_cache, "ACCESS_FLUSH_SIZE", 2)
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.db"), ttl_seconds=0, max_items=10)
+    cache.put("a", "glm", "A")
+    cache.put("b", "glm", "B")
+
+    clock.now += 5
+    cache.get("a")
+    cache.get("b")
+    assert cache._pending_access == {}
+    accessed = dict(cache._conn.execute("SELECT key, accessed_at FROM llm_cache"))
+    assert accessed == {"a": clock.now, "b": clock.now}
+
+
+def test_running_count_matches_table(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.db"), ttl_seconds=0, max_items=3)
+    for key in ["a", "b", "a", "c", "d", "e"]:
+        cache.put(key, "glm", key.upper())
+        assert cache.get_stats()["items"] == _count(cache)
+    assert _count(cache) == 3
+
+    assert cache.clear() == 3
+    assert cache.get_stats()["items"] == _count(cache) == 0
@@ -0,0 +1,48 @@
+"""本地模型清单（app/services/rag/model_manifest.py）"""
+import pytest
+
+from app.services.rag.model_manifest import (
+    manifest_digest,
+    manifest_model_id,
+    verify_manifest,
+    write_manifest,
+)
+
+REVISION = "0123456789abcdef0123456789abcdef01234567"
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    (tmp_path / "config.json").write_text('{"hidden_size": 384}', encoding="utf-8")
+    (tmp_path / "1_Pooling").mkdir()
+    (tmp_path / "1_Pooling" / "config.json").write_text('{"pooling_mode_mean_tokens": true}', encoding="utf-8")
+    (tmp_path / "model.safetensors").write_bytes(b"\x00" * 64)
+    return tmp_path
+
+
+def test_manifest_records_revision_and_files(model_dir):
+    manifest = write_manifest(str(model_dir), "paraphrase-multilingual-MiniLM-L12-v2", REVISION)
+    assert manifest["revision"] == REVISION
+    assert sorted(manifest["files"]) == ["1_Pooling/config.json", "config.json", "model.safetensors"]
+    assert verify_manifest(str(model_dir)) == manifest
+    assert manifest_model_id(manifest) == f"paraphrase-multilingual-MiniLM-L12-v2@{manifest_digest(manifest)}"
+
+
+def test_model_id_changes_with_weights(model_dir):
+    before = manifest_model_id(write_manifest(str(model_dir), "m", REVISION))
+    (model_dir / "model.safetensors").write_bytes(b"\x01" * 64)
+    after = manifest_model_id(write_manifest(str(model_dir), "m", REVISION))
+    assert before != after
+
+
+def test_size_check_skips_hashing(model_dir):
+    write_manifest(str(model_dir), "m", REVISION)
+    # 同样大小的内容被替换：只校验大小时通过，完整校验时失败
+    (model_dir / "model.safetensors").write_bytes(b"\x01" * 64)
+    verify_manifest(str(model_dir), check_hash=False)
+    with pytest.raises(RuntimeError):
+        verify_manifest(str(model_dir), check_hash=True)
+
+    (model_dir / "config.json").unlink()
+    with pytest.raises(RuntimeError):
+        verify_manifest(str(model_dir), check_hash=False)
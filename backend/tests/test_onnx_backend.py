@@ -0,0 +1,64 @@
+"""
+ONNX 与 PyTorch 推理后端的输出一致性
+
+需要 onnxruntime、sentence_transformers、EMBEDDING_ONNX_DIR 下导出的模型
+（scripts/export_onnx_model.py）和本地PyTorch模型，缺少任意一项时跳过。阈值与 scripts/benchmark_onnx_backend.py 一致。
+"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+pytest.importorskip("sentence_transformers")
+
+from app.config import settings
+from app.services.rag.embedding_service import create_embedding_backend
+from app.services.rag.onnx_backend import OnnxEmbeddingBackend
+
+ONNX_DIR = settings.EMBEDDING_ONNX_DIR
+
+pytestmark = pytest.mark.skipif(
+    not ONNX_DIR or not os.path.isfile(os.path.join(ONNX_DIR, "model.onnx")),
+    reason="未配置 EMBEDDING_ONNX_DIR 或目录中没有导出的 model.onnx"
+)
+
+TEXTS = [
+    "司机：你好，我看到你发布的货源信息。$_$货主：是的，10吨钢材，尾板车，4.2米厢式车。",
+    "司机：老板，你这个杭州到宁波的货，高栏车行吗？$_$货主：不行，要厢式车，怕下雨。",
+    "司机：我的车是新能源面包车，可以跟车1人。$_$货主：好的，需要一装一卸。",
+    "司机：不走高速的话要多跑两个小时。$_$货主：那就走高速，过路费我出。",
+    "司机：车上有雨布和绳子，侧门可以全开。",
+    "好的",
+]
+
+
+@pytest.fixture(scope="module")
+def torch_embeddings():
+    # 只使用本地模型，不在测试中访问 huggingface
+    if not settings.EMBEDDING_MODEL_DIR and os.getenv("HF_HUB_OFFLINE") != "1":
+        pytest.skip("需要本地PyTorch模型：设置 EMBEDDING_MODEL_DIR，或以 HF_HUB_OFFLINE=1 使用本地缓存")
+    try:
+        backend, _ = create_embedding_backend("torch")
+    except (OSError, RuntimeError, ValueError) as e:
+        pytest.skip(f"PyTorch模型不可用: {e}")
+    return backend.encode(TEXTS)
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+@pytest.mark.parametrize("quantized, min_cosine", [(False, 0.999), (True, 0.98)])
+def test_onnx_matches_torch(torch_embeddings, quantized, min_cosine):
+    model_file = "model_quantized.onnx" if quantized else "model.onnx"
+    if not os.path.isfile(os.path.join(ONNX_DIR, model_file)):
+        pytest.skip(f"未导出 {model_file}")
+
+    # batch_size=4 使文本按长度分到多个批次，同时校验恢复原始顺序
+    backend = OnnxEmbeddingBackend(ONNX_DIR, quantized=quantized, batch_size=4)
+    onnx_embeddings = backend.encode(TEXTS)
+
+    assert onnx_embeddings.shape == torch_embeddings.shape
+    assert _cosine(torch_embeddings, onnx_embeddings).min() >= min_cosine
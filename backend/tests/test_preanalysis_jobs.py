@@ -0,0 +1,99 @@
+"""预分析任务的限速、退避与LLM调用预估（app/services/preanalysis_jobs.py）"""
+import asyncio
+
+import pytest
+
+from app.services import preanalysis_jobs
+from app.services.ai_analysis import estimate_llm_calls
+from app.services.preanalysis_jobs import PreanalysisManager, TokenBucket, backoff_delay
+
+
+class FakeClock:
+    """monotonic 时钟，sleep 只推进时间并记录等待时长"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(preanalysis_jobs.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(preanalysis_jobs.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_allows_burst_then_paces(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+
+    async def run():
+        for _ in range(3):
+            await bucket.acquire()
+        assert clock.sleeps == []
+        await bucket.acquire()
+        await bucket.acquire(2)
+
+    asyncio.run(run())
+    assert clock.sleeps == pytest.approx([0.5, 1.0])
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+
+    async def run():
+        await bucket.acquire(2)
+        clock.now += 60
+        await bucket.acquire(2)
+        await bucket.acquire(1)
+
+    asyncio.run(run())
+    assert clock.sleeps == pytest.approx([1.0])
+
+
+def test_oversized_request_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    asyncio.run(bucket.acquire(5))
+    assert clock.sleeps == []
+
+
+def test_zero_rate_is_unlimited(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+
+    async def run():
+        for _ in range(10):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    assert clock.sleeps == []
+
+
+def test_backoff_grows_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setattr(preanalysis_jobs.random, "random", lambda: 1.0)
+    assert [backoff_delay(attempt, 1.0, 10.0) for attempt in range(5)] == [1.0, 2.0, 4.0, 8.0, 10.0]
+
+    monkeypatch.setattr(preanalysis_jobs.random, "random", lambda: 0.0)
+    assert backoff_delay(2, 1.0, 10.0) == 2.0
+
+
+@pytest.mark.parametrize("text, driver_tags, calls", [
+    ("我是高栏车", ["高栏"], 0),       # 规则已判定初始标签且完整覆盖对话
+    ("我是高栏车", ["平板"], 1),       # 仍需第一层验证初始标签
+    ("有没有尾板", [], 1),            # 问句需要第二层
+    ("不要平板，要高栏", ["高栏"], 2),  # 含义不确定时规则不代替第一层
+])
+def test_estimate_llm_calls_follows_rule_result(text, driver_tags, calls):
+    assert estimate_llm_calls(text, driver_tags) == calls
+
+
+def test_start_requires_api_key(monkeypatch):
+    monkeypatch.setattr(preanalysis_jobs, "get_glm_api_key", lambda: None)
+    with pytest.raises(ValueError):
+        PreanalysisManager().start(1)
@@ -0,0 +1,61 @@
+"""标签质心模型的判定与持久化（app/services/rag/tag_centroids.py）"""
+import numpy as np
+import pytest
+
+from app.services.rag import tag_centroids
+from app.services.rag.tag_centroids import TagCentroidClassifier
+
+TAGS = ["甲", "乙", "丙"]
+
+
+@pytest.fixture(autouse=True)
+def model_id(monkeypatch):
+    monkeypatch.setattr(tag_centroids, "current_embedding_model_id", lambda: "m@0123456789ab+onnx")
+    monkeypatch.setattr(tag_centroids.settings, "TAG_CENTROID_MIN_EXAMPLES", 2)
+    monkeypatch.setattr(tag_centroids.settings, "TAG_CENTROID_UNCERTAIN_MARGIN", 0.05)
+
+
+def _pages():
+    rng = np.random.default_rng(0)
+    embeddings = []
+    tag_lists = []
+    for i, tags in enumerate([["甲"], ["乙"], ["丙"]]):
+        for _ in range(6):
+            vector = rng.normal(scale=0.05, size=3)
+            vector[i] += 1.0
+            embeddings.append(vector)
+            tag_lists.append(tags)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return lambda: iter([(embeddings, tag_lists)])
+
+
+def test_recommend_reports_tags_just_below_threshold():
+    classifier = TagCentroidClassifier(tags=TAGS)
+    classifier.fit(_pages())
+    classifier.thresholds = np.array([0.4, 0.9, 0.9], dtype=np.float32)
+    classifier.precisions = np.array([1.0, 1.0, 1.0], dtype=np.float32)
+
+    # 与“乙”质心的夹角使得分略低于阈值
+    query = np.array([0.45, 0.87, 0.0], dtype=np.float32)
+    scores = classifier.predict(query[None, :])[0]
+    assert scores[0] >= 0.4 and 0.85 <= scores[1] < 0.9
+
+    result = classifier.recommend(query)
+    assert result["recommendations"] == ["甲"]
+    assert result["confidence"] == 1.0
+    assert result["uncertain_tags"] == ["乙"]
+
+    assert classifier.recommend(np.array([1.0, 0.0, 0.0], dtype=np.float32))["uncertain_tags"] == []
+
+
+def test_model_id_change_requires_retraining(tmp_path, monkeypatch):
+    path = str(tmp_path / "centroids.npz")
+    classifier = TagCentroidClassifier(path=path, tags=TAGS)
+    classifier.fit(_pages())
+    assert classifier.model_name == "m@0123456789ab+onnx"
+
+    assert TagCentroidClassifier(path=path, tags=TAGS).sums is not None
+
+    # 同名模型换成 int8 量化后端，旧质心不再使用
+    monkeypatch.setattr(tag_centroids, "current_embedding_model_id", lambda: "m@0123456789ab+onnx-int8")
+    assert TagCentroidClassifier(path=path, tags=TAGS).sums is None
@@ -0,0 +1,85 @@
+"""分类模型的阈值选取、数据划分与版本发布（app/services/rag/tag_classifier.py）"""
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.rag import tag_classifier
+from app.services.rag.tag_centroids import best_f1_thresholds
+from app.services.rag.tag_classifier import TagClassifier, split_of
+
+
+def test_best_f1_thresholds_per_tag():
+    scores = np.array([
+        [0.9, 0.5, 0.9],
+        [0.8, 0.4, 0.7],
+        [0.3, 0.3, 0.6],
+        [0.2, 0.2, 0.1],
+    ])
+    labels = np.array([
+        [1, 0, 1],
+        [1, 0, 0],
+        [0, 0, 1],
+        [0, 0, 0],
+    ], dtype=np.float32)
+
+    thresholds, precision, recall, f1 = best_f1_thresholds(scores, labels)
+
+    # 可分的标签取最后一个正样本的得分；有噪声的标签在前3名处F1最高（P=2/3, R=1）
+    np.testing.assert_allclose(thresholds[[0, 2]], [0.8, 0.6])
+    np.testing.assert_allclose(precision[[0, 2]], [1.0, 2 / 3], rtol=1e-6)
+    np.testing.assert_allclose(recall[[0, 2]], [1.0, 1.0])
+    np.testing.assert_allclose(f1, [1.0, 0.0, 0.8], rtol=1e-6)
+
+
+MODEL_ID = "m@0123456789ab+onnx"
+
+
+@pytest.fixture(autouse=True)
+def model_id(monkeypatch):
+    monkeypatch.setattr(tag_classifier, "current_embedding_model_id", lambda: MODEL_ID)
+
+
+def _classifier(thresholds):
+    # 单位矩阵权重：第i个标签的logit等于向量的第i维
+    return TagClassifier(
+        tags=["高栏", "平板", "厢货"],
+        weights=np.eye(3, dtype=np.float32),
+        bias=np.zeros(3, dtype=np.float32),
+        thresholds=np.asarray(thresholds, dtype=np.float32),
+        meta={"format": tag_classifier.ARTIFACT_FORMAT, "embedding_model": MODEL_ID}
+    )
+
+
+def test_recommend_applies_each_tag_threshold():
+    classifier = _classifier([0.5, 0.9, 0.6])
+    result = classifier.recommend(np.array([2.0, 1.0, 0.5], dtype=np.float32))
+    # sigmoid: 0.881, 0.731, 0.622
+    assert result["recommendations"] == ["高栏", "厢货"]
+    assert result["confidence"] == pytest.approx(0.622, abs=1e-3)
+
+
+def test_split_depends_only_on_conversation_id():
+    splits = [split_of(conv_id, 10, 10) for conv_id in range(1, 5001)]
+    assert splits == [split_of(conv_id, 10, 10) for conv_id in range(1, 5001)]
+    for split in (tag_classifier.SPLIT_TEST, tag_classifier.SPLIT_CALIBRATION):
+        assert 0.07 < splits.count(split) / len(splits) < 0.13
+    assert all(split_of(conv_id, 0, 0) == tag_classifier.SPLIT_TRAIN for conv_id in range(100))
+
+
+def test_publish_keeps_recent_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TAG_CLASSIFIER_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "TAG_CLASSIFIER_KEEP_VERSIONS", 2)
+
+    versions = [tag_classifier.publish_tag_classifier(_classifier([0.5, 0.6, 0.7])) for _ in range(3)]
+    assert versions == [1, 2, 3]
+    assert tag_classifier._existing_versions() == [2, 3]
+    assert tag_classifier._read_current_version() == 3
+
+    loaded = TagClassifier.load(tag_classifier._model_path(3))
+    assert loaded.version == 3
+    np.testing.assert_allclose(loaded.thresholds, [0.5, 0.6, 0.7])
+
+    # 嵌入模型换成其他推理后端后不再加载
+    monkeypatch.setattr(tag_classifier, "current_embedding_model_id", lambda: MODEL_ID + "-int8")
+    with pytest.raises(ValueError):
+        TagClassifier.load(tag_classifier._model_path(3))
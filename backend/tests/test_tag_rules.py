@@ -0,0 +1,94 @@
+"""规则标签抽取（app/services/tag_rules.py）"""
+import pytest
+
+from app.services.tag_rules import extract_rule_tags, get_tag_rule_matcher
+
+
+@pytest.mark.parametrize("text, tags", [
+    ("我是高栏车", ["高栏"]),
+    ("不是平板，没有说别的", ["非平板"]),
+    ("不是平板和高栏，是厢货", ["厢货"]),
+    ("车上有雨布和绳子", ["雨布", "有绳子"]),
+    ("我车上没雨布和绳子", ["无雨布", "无绳子"]),
+    ("没有雨布、绳子和小推车", ["无小推车", "无雨布", "无绳子"]),
+    ("尾板没问题", ["尾板车"]),
+])
+def test_entity_terms(text, tags):
+    result = extract_rule_tags(text)
+    assert result["tags"] == tags
+    assert set(tags) <= set(result["decided_tags"])
+
+
+@pytest.mark.parametrize("text, tag, value", [
+    ("车厢长9米6", "车厢长X米", "9.6米"),
+    ("4米2的车", "车厢长X米", "4.2米"),
+    ("最多拉3吨", "车载重X吨", "3吨"),
+    ("能装15方", "车容量X方", "15方"),
+    ("可以带两个人", "跟车X人", "跟车2人"),
+    ("不能跟车", "跟车X人", "不能跟车"),
+    ("一装一卸", "X装X卸", "1装1卸"),
+])
+def test_value_rules(text, tag, value):
+    result = extract_rule_tags(text)
+    assert result["values"][tag] == [value]
+    assert tag in result["decided_tags"]
+
+
+def test_refusal_is_not_a_vehicle_negation():
+    """"不要平板" 是需求，不判定平板/非平板"""
+    result = extract_rule_tags("不要平板，要高栏")
+    assert result["tags"] == ["高栏"]
+    assert "平板" not in result["decided_tags"]
+    assert "非平板" not in result["decided_tags"]
+    assert result["uncertain"] == ["不要平板"]
+    assert not result["fully_covered"]
+
+
+def test_copula_negation_of_equipment_is_uncertain():
+    """"不是尾板问题" 不表示没有尾板"""
+    result = extract_rule_tags("这不是尾板问题")
+    assert result["tags"] == []
+    assert result["decided_tags"] == []
+    assert not result["fully_covered"]
+
+
+@pytest.mark.parametrize("text", ["不过有尾板", "我没说平板", "不是9米6"])
+def test_uncaptured_negator_nearby_is_uncertain(text):
+    result = extract_rule_tags(text)
+    assert result["tags"] == []
+    assert result["decided_tags"] == []
+    assert result["uncertain"]
+    assert not result["fully_covered"]
+
+
+def test_negator_in_previous_clause_does_not_leak():
+    result = extract_rule_tags("没问题，有尾板")
+    assert result["tags"] == ["尾板车"]
+    assert result["uncertain"] == []
+
+
+def test_questions_and_conflicts_are_not_decided():
+    question = extract_rule_tags("有没有尾板")
+    assert question["tags"] == [] and question["questions"] and not question["fully_covered"]
+
+    conflict = extract_rule_tags("有雨布，哦不对没有雨布")
+    assert conflict["conflicts"] == ["雨布"]
+    assert "雨布" not in conflict["decided_tags"]
+    assert not conflict["fully_covered"]
+
+
+def test_multiple_values_are_left_to_llm():
+    result = extract_rule_tags("9米6还是6米8的车")
+    assert "车厢长X米" not in result["decided_tags"]
+    assert not result["fully_covered"]
+
+
+def test_dispatch_matches_combined_pattern():
+    matcher = get_tag_rule_matcher()
+    texts = [
+        "不要平板，要高栏", "我车上没雨布跟绳子", "9米6高栏，能拉10吨，带1人，明天早上5点装货",
+        "有没有雨布？没有的话不用来了", "厢式货车 4.2米 一装两卸 过路费另算",
+    ]
+    for text in texts:
+        assert [(m.span(), m.lastgroup) for m in matcher.finditer(text)] == \
+               [(m.span(), m.lastgroup) for m in matcher.pattern.finditer(text)]
@@ -0,0 +1,87 @@
+"""标签词表与近邻标签聚合（app/services/rag/tag_vocabulary.py、tag_aggregation.py）"""
+
+import numpy as np
+import pytest
+
+from app.services.rag.rag_service import RAGRecommender
+from app.services.rag.tag_aggregation import aggregate_tag_votes
+from app.services.rag.tag_vocabulary import TagVocabulary, parse_tag_ids
+from app.services.tag_definitions import ALL_TAGS
+
+
+def _ids(*ids):
+    return np.asarray(ids, dtype=np.int32)
+
+
+def test_vocabulary_round_trip_and_persistence(tmp_path):
+    path = tmp_path / "vocab.json"
+    vocabulary = TagVocabulary(str(path))
+    assert len(vocabulary) == len(ALL_TAGS)
+    assert [vocabulary.decode(i) for i in vocabulary.encode(ALL_TAGS[:3])] == ALL_TAGS[:3]
+
+    new_ids = vocabulary.encode(["自定义标签", "", "自定义标签"])
+    assert new_ids == [len(ALL_TAGS)]
+    assert list(vocabulary.encode_joined(f"{ALL_TAGS[0]},自定义标签")) == [0, len(ALL_TAGS)]
+
+    reloaded = TagVocabulary(str(path))
+    assert reloaded.version == vocabulary.version
+    assert reloaded.encode(["自定义标签"]) == new_ids
+
+
+def test_neighbor_tag_ids_require_matching_version(tmp_path):
+    vocabulary = TagVocabulary(str(tmp_path / "vocab.json"))
+    tag_ids = ",".join(str(i) for i in vocabulary.encode(ALL_TAGS[1:3]))
+    metadata = {"tags": ALL_TAGS[0], "tag_ids": tag_ids, "tag_vocab": vocabulary.version}
+    assert list(RAGRecommender._neighbor_tag_ids(metadata, vocabulary)) == [1, 2]
+
+    # 版本不一致（词表文件被替换）、ID越界或没有ID时按标签名重新编码
+    for stale in (
+        dict(metadata, tag_vocab="other"),
+        dict(metadata, tag_ids=str(len(vocabulary) + 5)),
+        {"tags": ALL_TAGS[0]},
+    ):
+        assert list(RAGRecommender._neighbor_tag_ids(stale, vocabulary)) == [0]
+
+
+def test_parse_tag_ids():
+    assert list(parse_tag_ids("3,17")) == [3, 17]
+    assert parse_tag_ids("").size == 0
+
+
+def test_equal_weight_votes():
+    scores, counts = aggregate_tag_votes(
+        [[_ids(0, 1), _ids(1)]], [[0.9, 0.8]], vocab_size=3, temperature=0, shrinkage=0
+    )
+    np.testing.assert_allclose(scores, [[0.5, 1.0, 0.0]])
+    np.testing.assert_array_equal(counts, [[1, 2, 0]])
+
+
+def test_softmax_favors_closer_neighbors():
+    scores, _ = aggregate_tag_votes(
+        [[_ids(0), _ids(1)]], [[0.9, 0.8]], vocab_size=2, temperature=0.05, shrinkage=0
+    )
+    assert scores[0, 0] == pytest.approx(1 / (1 + np.exp(-2)))
+    assert scores[0].sum() == pytest.approx(1.0)
+
+
+def test_shrinkage_penalizes_few_neighbors():
+    one, _ = aggregate_tag_votes([[_ids(0)]], [[0.9]], vocab_size=1, temperature=0, shrinkage=1.0)
+    four, _ = aggregate_tag_votes([[_ids(0)] * 4], [[0.9] * 4], vocab_size=1, temperature=0, shrinkage=1.0)
+    assert one[0, 0] == pytest.approx(0.5)
+    assert four[0, 0] == pytest.approx(0.8)
+
+
+def test_queries_do_not_leak_into_each_other():
+    scores, counts = aggregate_tag_votes(
+        [[_ids(2)], [], [_ids(), _ids(0)]], [[0.9], [], [0.9, 0.9]],
+        vocab_size=3, temperature=0, shrinkage=0
+    )
+    np.testing.assert_array_equal(counts, [[0, 0, 1], [0, 0, 0], [1, 0, 0]])
+    np.testing.assert_allclose(scores[2], [0.5, 0.0, 0.0])
+
+
+def test_out_of_range_ids_are_rejected():
+    with pytest.raises(ValueError):
+        aggregate_tag_votes([[_ids(3)], [_ids(0)]], [[0.9], [0.9]], vocab_size=3)
+    with pytest.raises(ValueError):
+        aggregate_tag_votes([[_ids(-1)]], [[0.9]], vocab_size=3)